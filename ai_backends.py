@@ -0,0 +1,213 @@
+"""AI backends behind the Guru AI chat and the elevator pitch.
+
+    backend = ai_backends.get_backend()              # chosen by VEDIC_AI_BACKEND
+    backend.reply(prompt, context, key)   -> str
+    backend.stream(prompt, context, key)  -> iterator of text chunks
+
+VEDIC_AI_BACKEND:
+    gemini            Google Gemini through google.generativeai (default)
+    standin           in-process deterministic stand-in: no key, no network
+    http://host:port  the stand-in served over HTTP, started with:
+                          python ai_backends.py serve --port 8765 --latency 0.8 --rpm 30
+
+The stand-in answers the same prompt with the same text, and simulates first-token latency
+(VEDIC_STANDIN_LATENCY), per-chunk streaming delay (VEDIC_STANDIN_TOKEN_DELAY) and Gemini-style 429s,
+either past a requests-per-minute quota (VEDIC_STANDIN_RPM) or on every Nth call (VEDIC_STANDIN_FAIL_EVERY).
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import deque
+
+# --- 1. GEMINI ---
+_WORKING_MODELS = {}  # api key -> model name, only remembered once list_models succeeded
+
+def get_working_model(key):
+    if key in _WORKING_MODELS: return _WORKING_MODELS[key]
+    import google.generativeai as genai
+    genai.configure(api_key=key)
+    try:
+        available = [m.name for m in genai.list_models() if 'generateContent' in m.supported_generation_methods]
+        if available:
+            _WORKING_MODELS[key] = available[0]
+            return available[0]
+    except: pass
+    return "models/gemini-1.5-flash"
+
+class GeminiBackend:
+    name = "gemini"; needs_key = True
+
+    def _chat(self, context, key):
+        import google.generativeai as genai
+        model = genai.GenerativeModel(get_working_model(key))
+        return model.start_chat(history=[{"role": "user", "parts": [context]}, {"role": "model", "parts": ["I am your Vedic Astrologer."]}])
+
+    def reply(self, prompt, context, key):
+        return self._chat(context, key).send_message(prompt).text
+
+    def stream(self, prompt, context, key):
+        for chunk in self._chat(context, key).send_message(prompt, stream=True): yield chunk.text
+
+# --- 2. LOCAL STAND-IN ---
+STANDIN_SENTENCES = (
+    "The Moon placements point to an easy emotional rhythm between you.",
+    "Nadi and Bhakoot deserve attention before any final decision.",
+    "Jupiter's aspect brings patience, teaching and shared growth.",
+    "Mars energy is strong here, so channel it into joint goals.",
+    "Venus favours art, music and a warm home life.",
+    "Saturn asks for commitment; the bond deepens with time.",
+    "Rahu and Ketu hint at karmic ties carried over from the past.",
+    "A simple remedy is reciting the Vishnu Sahasranama together on Thursdays.",
+    "Communication is the key koota to nurture in the first years.",
+)
+
+class StandInQuotaError(RuntimeError):
+    pass
+
+def _env_num(name, default):
+    try: return float(os.environ.get(name, default))
+    except ValueError: return float(default)
+
+class StandInBackend:
+    name = "standin"; needs_key = False
+
+    def __init__(self, latency=None, token_delay=None, rpm=None, fail_every=None, sentences=4, clock=time.monotonic, sleep=time.sleep):
+        self.latency = latency if latency is not None else _env_num("VEDIC_STANDIN_LATENCY", 0.5)
+        self.token_delay = token_delay if token_delay is not None else _env_num("VEDIC_STANDIN_TOKEN_DELAY", 0.02)
+        self.rpm = rpm if rpm is not None else _env_num("VEDIC_STANDIN_RPM", 0)
+        self.fail_every = int(fail_every if fail_every is not None else _env_num("VEDIC_STANDIN_FAIL_EVERY", 0))
+        self.sentences = sentences; self.clock = clock; self.sleep = sleep
+        self._lock = threading.Lock(); self._window = deque(); self.calls = 0
+
+    def answer(self, prompt, context):
+        """The deterministic text for a (prompt, context) pair."""
+        digest = hashlib.sha256(f"{context}\x00{prompt}".encode()).digest()
+        picks = [STANDIN_SENTENCES[b % len(STANDIN_SENTENCES)] for b in digest[:self.sentences]]
+        return f"🔮 (stand-in) On '{prompt.strip()[:60]}': " + " ".join(picks)
+
+    def _admit(self):
+        with self._lock:
+            self.calls += 1; now = self.clock()
+            if self.fail_every and self.calls % self.fail_every == 0:
+                raise StandInQuotaError("429 Resource has been exhausted (stand-in: injected)")
+            if self.rpm:
+                while self._window and now - self._window[0] >= 60: self._window.popleft()
+                if len(self._window) >= self.rpm: raise StandInQuotaError("429 Resource has been exhausted (stand-in: rpm quota)")
+                self._window.append(now)
+
+    def stream(self, prompt, context, key=None):
+        self._admit()
+        if self.latency: self.sleep(self.latency)
+        words = self.answer(prompt, context).split(" ")
+        for i, word in enumerate(words):
+            if i and self.token_delay: self.sleep(self.token_delay)
+            yield word if i == len(words) - 1 else word + " "
+
+    def reply(self, prompt, context, key=None):
+        return "".join(self.stream(prompt, context, key))
+
+# --- 3. STAND-IN OVER HTTP ---
+class HTTPBackend:
+    """Client for `python ai_backends.py serve`; streaming arrives as chunked text."""
+    name = "http"; needs_key = False
+
+    def __init__(self, url, timeout=60):
+        self.url = url.rstrip("/"); self.timeout = timeout
+
+    def _post(self, path, prompt, context):
+        req = urllib.request.Request(self.url + path, data=json.dumps({"prompt": prompt, "context": context}).encode(),
+                                     headers={"Content-Type": "application/json"})
+        try: return urllib.request.urlopen(req, timeout=self.timeout)
+        except urllib.error.HTTPError as e: raise RuntimeError(f"{e.code} {e.read().decode(errors='replace')}") from None
+
+    def reply(self, prompt, context, key=None):
+        with self._post("/v1/reply", prompt, context) as resp: return json.loads(resp.read())["text"]
+
+    def stream(self, prompt, context, key=None):
+        with self._post("/v1/stream", prompt, context) as resp:
+            while True:
+                chunk = resp.read1(4096) if hasattr(resp, "read1") else resp.read(4096)
+                if not chunk: break
+                yield chunk.decode("utf-8", errors="replace")
+
+def make_standin_server(host="127.0.0.1", port=8765, backend=None):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    backend = backend or StandInBackend()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        def log_message(self, *args): pass
+
+        def _send(self, status, body, ctype="application/json"):
+            data = body.encode(); self.send_response(status)
+            self.send_header("Content-Type", ctype); self.send_header("Content-Length", str(len(data))); self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            req = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            prompt, context = req.get("prompt", ""), req.get("context", "")
+            try:
+                if self.path == "/v1/reply": return self._send(200, json.dumps({"text": backend.reply(prompt, context)}))
+                if self.path != "/v1/stream": return self._send(404, json.dumps({"error": "not found"}))
+                chunks = backend.stream(prompt, context)
+                first = next(chunks, "")  # quota errors surface here, before the 200 goes out
+            except StandInQuotaError as e: return self._send(429, json.dumps({"error": str(e)}))
+            self.send_response(200); self.send_header("Content-Type", "text/plain; charset=utf-8")
+            self.send_header("Transfer-Encoding", "chunked"); self.end_headers()
+            for piece in _chain(first, chunks):
+                data = piece.encode(); self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n"); self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+def _chain(first, rest):
+    if first: yield first
+    yield from rest
+
+# --- 4. SELECTION ---
+class _State:
+    backend = None
+
+STATE = _State()
+
+def from_spec(spec):
+    spec = (spec or "gemini").strip()
+    if spec.startswith(("http://", "https://")): return HTTPBackend(spec)
+    if spec == "standin": return StandInBackend()
+    if spec == "gemini": return GeminiBackend()
+    raise ValueError(f"Unknown AI backend: {spec} (use gemini, standin or http://host:port)")
+
+def get_backend():
+    if STATE.backend is None: STATE.backend = from_spec(os.environ.get("VEDIC_AI_BACKEND"))
+    return STATE.backend
+
+def use(backend):
+    """Switches the process-wide backend (an instance or a VEDIC_AI_BACKEND-style spec); returns it."""
+    STATE.backend = from_spec(backend) if isinstance(backend, str) or backend is None else backend
+    return STATE.backend
+
+def main(argv=None):
+    p = argparse.ArgumentParser(prog="ai_backends.py", description="Offline Gemini stand-in for load tests.")
+    sub = p.add_subparsers(dest="command", required=True)
+    sp = sub.add_parser("serve", help="Serve the stand-in over HTTP")
+    sp.add_argument("--host", default="127.0.0.1"); sp.add_argument("--port", type=int, default=8765)
+    sp.add_argument("--latency", type=float, help="Seconds before the first chunk")
+    sp.add_argument("--token-delay", type=float, help="Seconds between streamed chunks")
+    sp.add_argument("--rpm", type=float, help="429 past this many requests per minute (0 = unlimited)")
+    sp.add_argument("--fail-every", type=int, help="429 on every Nth request (0 = never)")
+    args = p.parse_args(argv)
+    backend = StandInBackend(args.latency, args.token_delay, args.rpm, args.fail_every)
+    server = make_standin_server(args.host, args.port, backend)
+    print(f"[STAND-IN] Serving on http://{args.host}:{args.port} (latency {backend.latency}s, rpm {backend.rpm or 'unlimited'})", file=sys.stderr)
+    try: server.serve_forever()
+    except KeyboardInterrupt: pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""Process-wide Gemini request scheduler: per-key rate limits, bounded queueing, retries and coalescing.
+
+Every session in the process shares SCHEDULER, so concurrent users queue against one quota instead of
+stampeding it:
+  * per API key, a requests-per-minute and a tokens-per-minute token bucket (VEDIC_AI_RPM / VEDIC_AI_TPM);
+    a call waits for its slot, or raises QueueFull when the wait would exceed VEDIC_AI_MAX_WAIT seconds;
+  * transient failures (429 / 5xx / timeouts) are retried up to VEDIC_AI_RETRIES times with jittered
+    exponential backoff, each attempt taking a fresh slot;
+  * identical prompts already in flight share one upstream call.
+
+    text = SCHEDULER.run(key, lambda: chat.send_message(prompt).text, dedupe=(context, prompt),
+                         tokens=estimate_tokens(context, prompt))
+    for chunk in SCHEDULER.stream(key, lambda: backend.stream(prompt, context, key)): ...
+"""
+import hashlib
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+import metrics
+
+TRANSIENT_MARKERS = ("429", "500", "502", "503", "504", "ResourceExhausted", "ServiceUnavailable",
+                     "DeadlineExceeded", "InternalServerError", "timed out", "Timeout")
+
+class QueueFull(Exception):
+    """The rate limit cannot admit the call within the allowed wait."""
+    def __init__(self, retry_after):
+        super().__init__(f"AI queue full, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+def estimate_tokens(*texts):
+    # ~4 characters per token is close enough for budgeting
+    return max(1, sum(len(t or "") for t in texts) // 4)
+
+def is_transient(exc):
+    msg = f"{type(exc).__name__} {exc}"
+    return any(m in msg for m in TRANSIENT_MARKERS)
+
+def _env_float(name, default):
+    try: return float(os.environ.get(name, default))
+    except ValueError: return float(default)
+
+class TokenBucket:
+    """`rate` units per second, bursting to `capacity`. Reservations may drive the level negative:
+    that debt is the queue, and its length in seconds is the wait of the next caller."""
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate; self.capacity = capacity; self.clock = clock
+        self.level = capacity; self.t = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self.t) * self.rate); self.t = now
+
+    def wait_for(self, amount):
+        self._refill()
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def take(self, amount):
+        self.level -= amount
+
+class AIScheduler:
+    def __init__(self, rpm=None, tpm=None, max_wait=None, retries=None, backoff=1.0, max_backoff=16.0,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.rpm = rpm if rpm is not None else _env_float("VEDIC_AI_RPM", 15)
+        self.tpm = tpm if tpm is not None else _env_float("VEDIC_AI_TPM", 1_000_000)
+        self.max_wait = max_wait if max_wait is not None else _env_float("VEDIC_AI_MAX_WAIT", 20)
+        self.retries = int(retries if retries is not None else _env_float("VEDIC_AI_RETRIES", 3))
+        self.backoff = backoff; self.max_backoff = max_backoff
+        self.clock = clock; self.sleep = sleep
+        self._lock = threading.Lock()
+        self._buckets = {}; self._inflight = {}
+        self.stats = {"calls": 0, "upstream": 0, "coalesced": 0, "retries": 0, "rejected": 0, "failed": 0, "wait_s": 0.0}
+
+    def _count(self, name, n=1):
+        with self._lock: self.stats[name] += n
+
+    def _buckets_for(self, key):
+        if key not in self._buckets:
+            self._buckets[key] = (TokenBucket(self.rpm / 60.0, max(1.0, self.rpm / 60.0 * 5), self.clock),
+                                  TokenBucket(self.tpm / 60.0, self.tpm / 60.0 * 5, self.clock))
+        return self._buckets[key]
+
+    def admit(self, key, tokens):
+        """Reserves one request + `tokens` for `key`; returns seconds to wait, or raises QueueFull."""
+        with self._lock:
+            req, tok = self._buckets_for(key)
+            wait = max(req.wait_for(1), tok.wait_for(tokens))
+            if wait > self.max_wait:
+                self.stats["rejected"] += 1
+                raise QueueFull(wait)
+            req.take(1); tok.take(tokens)
+            self.stats["wait_s"] += wait
+        return wait
+
+    def _attempts(self, key, call, tokens):
+        attempt = 0
+        while True:
+            wait = self.admit(key, tokens)
+            if wait:
+                if metrics.is_enabled(): metrics.observe("ai_queue_wait", wait)
+                self.sleep(wait)
+            self._count("upstream")
+            try: return call()
+            except Exception as e:
+                if attempt >= self.retries or not is_transient(e):
+                    self._count("failed"); raise
+            delay = min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.5)
+            attempt += 1; self._count("retries")
+            self.sleep(delay)
+
+    @staticmethod
+    def _bucket_key(key):
+        return hashlib.sha256(str(key).encode()).hexdigest()[:16]  # raw API keys are not kept
+
+    def run(self, key, call, dedupe=None, tokens=1):
+        """Runs `call()` under `key`'s limits. Callers passing an equal `dedupe` while one is in flight get its result."""
+        bucket_key = self._bucket_key(key)
+        self._count("calls")
+        if dedupe is None: return self._attempts(bucket_key, call, tokens)
+        flight_key = (bucket_key, dedupe)
+        with self._lock:
+            fut = self._inflight.get(flight_key); leader = fut is None
+            if leader: fut = self._inflight[flight_key] = Future()
+            else: self.stats["coalesced"] += 1
+        if not leader: return fut.result()
+        try:
+            out = self._attempts(bucket_key, call, tokens)
+            fut.set_result(out)
+            return out
+        except BaseException as e:
+            fut.set_exception(e); raise
+        finally:
+            with self._lock: self._inflight.pop(flight_key, None)
+
+    def stream(self, key, open_stream, tokens=1):
+        """run() for a chunk iterator: the slot and retries cover opening the stream up to its first chunk.
+        Streams are not coalesced."""
+        def start():
+            chunks = iter(open_stream())
+            return next(chunks, None), chunks
+        self._count("calls")
+        first, chunks = self._attempts(self._bucket_key(key), start, tokens)
+        if first is not None: yield first
+        yield from chunks
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, wait_s=round(self.stats["wait_s"], 3), in_flight=len(self._inflight),
+                        rpm=self.rpm, tpm=self.tpm, max_wait_s=self.max_wait)
+
+SCHEDULER = AIScheduler()
@@ -1,22 +1,44 @@
 import streamlit as st
 import ephem
+import contextlib
 import datetime
+import functools
 import math
+import os
 import pytz
-from geopy.geocoders import Nominatim
-from timezonefinder import TimezoneFinder
-import pandas as pd
-import plotly.graph_objects as go
-import google.generativeai as genai
+import threading
 import time
-from fpdf import FPDF
+import types
 from io import BytesIO
-
-# --- 1. PAGE CONFIG ---
-st.set_page_config(page_title="Vedic Matcher Pro", page_icon="🕉️", layout="wide")
+import metrics
+import arcsec
+import parallel
+import profiler
+import rules
+import kuja
+import ephem_cache
+import gazetteer
+import ai_scheduler
+import ai_backends
+import session_memory
+import sidereal
+import varga
+
+# --- DEFERRED IMPORTS ---
+# Heavy libraries are imported at first use by the feature that needs them, so a cold start
+# (first visit / worker restart) only pays for streamlit + ephem. bench.py --startup reports the saving.
+DEFERRED_IMPORTS = {
+    "Guru AI / Elevator Pitch": "google.generativeai",
+    "Tables & CSV export": "pandas",
+    "Score gauges": "plotly.graph_objects",
+    "PDF report": "fpdf",
+    "City geocoding": "geopy.geocoders",
+    "Timezone lookup": "timezonefinder",
+    "Sidereal & varga arrays": "numpy",
+}
 
 # --- 2. CSS STYLING (UPDATED TO HIDE TOOLBAR) ---
-st.markdown("""
+APP_CSS = """
 <style>
     /* HIDE STREAMLIT UI ELEMENTS */
     #MainMenu {visibility: hidden;}
@@ -67,39 +89,31 @@ st.markdown("""
         position: relative;
     }
 </style>
-""", unsafe_allow_html=True)
-
-# --- 3. SESSION STATE ---
-if "calculated" not in st.session_state: st.session_state.calculated = False
-if "results" not in st.session_state: st.session_state.results = {}
-if "messages" not in st.session_state: st.session_state.messages = []
-if "input_mode" not in st.session_state: st.session_state.input_mode = "Birth Details"
-if "api_key" not in st.session_state: st.session_state.api_key = ""
-if "ai_pitch" not in st.session_state: st.session_state.ai_pitch = ""
+"""
 
 # --- 4. DATA CONSTANTS ---
-NAKSHATRAS = ["Ashwini", "Bharani", "Krittika", "Rohini", "Mrigashira", "Ardra","Punarvasu", "Pushya", "Ashlesha", "Magha", "Purva Phalguni", "Uttara Phalguni","Hasta", "Chitra", "Swati", "Vishakha", "Anuradha", "Jyeshtha","Mula", "Purva Ashadha", "Uttara Ashadha", "Shravana", "Dhanishta","Shatabhisha", "Purva Bhadrapada", "Uttara Bhadrapada", "Revati"]
-RASHIS = ["Aries (Mesha)", "Taurus (Vrishabha)", "Gemini (Mithuna)", "Cancer (Karka)","Leo (Simha)", "Virgo (Kanya)", "Libra (Tula)", "Scorpio (Vrishchika)","Sagittarius (Dhanu)", "Capricorn (Makara)", "Aquarius (Kumbha)", "Pisces (Meena)"]
-SOUTH_CHART_MAP = {11: 0, 0: 1, 1: 2, 2: 3, 10: 4, 3: 7, 9: 8, 4: 11, 8: 12, 7: 13, 6: 14, 5: 15}
-NAK_TO_RASHI_MAP = {0: [0], 1: [0], 2: [0, 1], 3: [1], 4: [1, 2], 5: [2], 6: [2, 3], 7: [3], 8: [3], 9: [4], 10: [4], 11: [4, 5], 12: [5], 13: [5, 6], 14: [6], 15: [6, 7], 16: [7], 17: [7], 18: [8], 19: [8], 20: [8, 9], 21: [9], 22: [9, 10], 23: [10], 24: [10, 11], 25: [11], 26: [11]}
-MAITRI_TABLE = [[5, 5, 5, 4, 5, 0, 0], [5, 5, 4, 1, 4, 1, 1], [5, 4, 5, 0.5, 5, 3, 0.5],[4, 1, 0.5, 5, 0.5, 5, 4], [5, 4, 5, 0.5, 5, 0.5, 3], [0, 1, 3, 5, 0.5, 5, 5], [0, 1, 0.5, 4, 3, 5, 5]]
-GANA_TYPE = [0, 1, 2, 1, 0, 1, 0, 0, 2, 2, 1, 1, 0, 2, 0, 2, 0, 2, 2, 1, 1, 0, 2, 2, 1, 1, 0]
-GANA_NAMES = ["Deva (Divine)", "Manushya (Human)", "Rakshasa (Demon)"]
-NADI_TYPE = [0, 1, 2, 2, 1, 0, 0, 1, 2, 2, 1, 0, 0, 1, 2, 2, 1, 0, 0, 1, 2, 2, 1, 0, 0, 1, 2]
-NADI_NAMES = ["Adi (Start)", "Madhya (Middle)", "Antya (End)"]
-SAME_NAKSHATRA_ALLOWED = ["Rohini", "Ardra", "Pushya", "Magha", "Vishakha", "Shravana", "Uttara Bhadrapada", "Revati"]
-VARNA_GROUP = [0, 1, 2, 0, 1, 2, 2, 0, 1, 2, 2, 0]
-VASHYA_GROUP = [0, 0, 1, 2, 1, 1, 1, 3, 1, 2, 1, 2]
-YONI_ID = [0, 1, 2, 3, 3, 4, 5, 2, 5, 6, 6, 7, 8, 9, 8, 9, 10, 10, 4, 11, 12, 11, 13, 0, 13, 7, 1]
-YONI_Enemy_Map = {0:8, 1:13, 2:11, 3:12, 4:10, 5:6, 6:5, 7:9, 8:0, 9:7, 10:4, 11:2, 12:3, 13:1}
-RASHI_LORDS = [2, 5, 3, 1, 0, 3, 5, 2, 4, 6, 6, 4] 
+NAKSHATRAS = ("Ashwini", "Bharani", "Krittika", "Rohini", "Mrigashira", "Ardra","Punarvasu", "Pushya", "Ashlesha", "Magha", "Purva Phalguni", "Uttara Phalguni","Hasta", "Chitra", "Swati", "Vishakha", "Anuradha", "Jyeshtha","Mula", "Purva Ashadha", "Uttara Ashadha", "Shravana", "Dhanishta","Shatabhisha", "Purva Bhadrapada", "Uttara Bhadrapada", "Revati")
+RASHIS = ("Aries (Mesha)", "Taurus (Vrishabha)", "Gemini (Mithuna)", "Cancer (Karka)","Leo (Simha)", "Virgo (Kanya)", "Libra (Tula)", "Scorpio (Vrishchika)","Sagittarius (Dhanu)", "Capricorn (Makara)", "Aquarius (Kumbha)", "Pisces (Meena)")
+SOUTH_CHART_MAP = types.MappingProxyType({11: 0, 0: 1, 1: 2, 2: 3, 10: 4, 3: 7, 9: 8, 4: 11, 8: 12, 7: 13, 6: 14, 5: 15})
+NAK_TO_RASHI_MAP = types.MappingProxyType({0: (0,), 1: (0,), 2: (0, 1,), 3: (1,), 4: (1, 2,), 5: (2,), 6: (2, 3,), 7: (3,), 8: (3,), 9: (4,), 10: (4,), 11: (4, 5,), 12: (5,), 13: (5, 6,), 14: (6,), 15: (6, 7,), 16: (7,), 17: (7,), 18: (8,), 19: (8,), 20: (8, 9,), 21: (9,), 22: (9, 10,), 23: (10,), 24: (10, 11,), 25: (11,), 26: (11,)})
+MAITRI_TABLE = ((5, 5, 5, 4, 5, 0, 0), (5, 5, 4, 1, 4, 1, 1), (5, 4, 5, 0.5, 5, 3, 0.5),(4, 1, 0.5, 5, 0.5, 5, 4), (5, 4, 5, 0.5, 5, 0.5, 3), (0, 1, 3, 5, 0.5, 5, 5), (0, 1, 0.5, 4, 3, 5, 5))
+GANA_TYPE = (0, 1, 2, 1, 0, 1, 0, 0, 2, 2, 1, 1, 0, 2, 0, 2, 0, 2, 2, 1, 1, 0, 2, 2, 1, 1, 0)
+GANA_NAMES = ("Deva (Divine)", "Manushya (Human)", "Rakshasa (Demon)")
+NADI_TYPE = (0, 1, 2, 2, 1, 0, 0, 1, 2, 2, 1, 0, 0, 1, 2, 2, 1, 0, 0, 1, 2, 2, 1, 0, 0, 1, 2)
+NADI_NAMES = ("Adi (Start)", "Madhya (Middle)", "Antya (End)")
+SAME_NAKSHATRA_ALLOWED = ("Rohini", "Ardra", "Pushya", "Magha", "Vishakha", "Shravana", "Uttara Bhadrapada", "Revati")
+VARNA_GROUP = (0, 1, 2, 0, 1, 2, 2, 0, 1, 2, 2, 0)
+VASHYA_GROUP = (0, 0, 1, 2, 1, 1, 1, 3, 1, 2, 1, 2)
+YONI_ID = (0, 1, 2, 3, 3, 4, 5, 2, 5, 6, 6, 7, 8, 9, 8, 9, 10, 10, 4, 11, 12, 11, 13, 0, 13, 7, 1)
+YONI_Enemy_Map = types.MappingProxyType({0:8, 1:13, 2:11, 3:12, 4:10, 5:6, 6:5, 7:9, 8:0, 9:7, 10:4, 11:2, 12:3, 13:1})
+RASHI_LORDS = (2, 5, 3, 1, 0, 3, 5, 2, 4, 6, 6, 4) 
 # 0:Sun, 1:Moon, 2:Mars, 3:Merc, 4:Jup, 5:Ven, 6:Sat
-PLANET_NAMES_MAP = {0: "Sun", 1: "Moon", 2: "Mars", 3: "Mercury", 4: "Jupiter", 5: "Venus", 6: "Saturn"}
+PLANET_NAMES_MAP = types.MappingProxyType({0: "Sun", 1: "Moon", 2: "Mars", 3: "Mercury", 4: "Jupiter", 5: "Venus", 6: "Saturn"})
 
-DASHA_ORDER = ["Ketu", "Venus", "Sun", "Moon", "Mars", "Rahu", "Jupiter", "Saturn", "Mercury"]
-DASHA_YEARS = {"Ketu": 7, "Venus": 20, "Sun": 6, "Moon": 10, "Mars": 7, "Rahu": 18, "Jupiter": 16, "Saturn": 19, "Mercury": 17}
-SPECIAL_ASPECTS = {"Mars": [4, 7, 8], "Jupiter": [5, 7, 9], "Saturn": [3, 7, 10], "Rahu": [5, 7, 9], "Ketu": [5, 7, 9]}
-SUN_TRANSIT_DATES = {0: "Apr 14 - May 14", 1: "May 15 - Jun 14", 2: "Jun 15 - Jul 15", 3: "Jul 16 - Aug 16", 4: "Aug 17 - Sep 16", 5: "Sep 17 - Oct 16", 6: "Oct 17 - Nov 15", 7: "Nov 16 - Dec 15", 8: "Dec 16 - Jan 13", 9: "Jan 14 - Feb 12", 10: "Feb 13 - Mar 13", 11: "Mar 14 - Apr 13"}
+DASHA_ORDER = ("Ketu", "Venus", "Sun", "Moon", "Mars", "Rahu", "Jupiter", "Saturn", "Mercury")
+DASHA_YEARS = types.MappingProxyType({"Ketu": 7, "Venus": 20, "Sun": 6, "Moon": 10, "Mars": 7, "Rahu": 18, "Jupiter": 16, "Saturn": 19, "Mercury": 17})
+SPECIAL_ASPECTS = types.MappingProxyType({"Mars": (4, 7, 8), "Jupiter": (5, 7, 9), "Saturn": (3, 7, 10), "Rahu": (5, 7, 9), "Ketu": (5, 7, 9)})
+SUN_TRANSIT_DATES = types.MappingProxyType({0: "Apr 14 - May 14", 1: "May 15 - Jun 14", 2: "Jun 15 - Jul 15", 3: "Jul 16 - Aug 16", 4: "Aug 17 - Sep 16", 5: "Sep 17 - Oct 16", 6: "Oct 17 - Nov 15", 7: "Nov 16 - Dec 15", 8: "Dec 16 - Jan 13", 9: "Jan 14 - Feb 12", 10: "Feb 13 - Mar 13", 11: "Mar 14 - Apr 13"})
 NAK_TRAITS = {0: {"Trait": "Pioneer"}, 1: {"Trait": "Creative"}, 2: {"Trait": "Sharp"}, 3: {"Trait": "Sensual"}, 4: {"Trait": "Curious"}, 5: {"Trait": "Intellectual"}, 6: {"Trait": "Nurturing"}, 7: {"Trait": "Spiritual"}, 8: {"Trait": "Mystical"}, 9: {"Trait": "Royal"}, 10: {"Trait": "Social"}, 11: {"Trait": "Charitable"}, 12: {"Trait": "Skilled"}, 13: {"Trait": "Beautiful"}, 14: {"Trait": "Independent"}, 15: {"Trait": "Focused"}, 16: {"Trait": "Friendship"}, 17: {"Trait": "Protective"}, 18: {"Trait": "Deep"}, 19: {"Trait": "Invincible"}, 20: {"Trait": "Victory"}, 21: {"Trait": "Listener"}, 22: {"Trait": "Musical"}, 23: {"Trait": "Healer"}, 24: {"Trait": "Passionate"}, 25: {"Trait": "Ascetic"}, 26: {"Trait": "Complete"}}
 SYNERGY_MEANINGS = {
     "Sun": "Aligned Egos. You shine in similar ways and understand each other's pride.",
@@ -114,7 +128,7 @@ SYNERGY_MEANINGS = {
 }
 
 # Updated to match your specific assignment
-RAJJU_NAMES = ["Siro (Head)", "Kantha (Neck)", "Madhya (Belly)", "Kati (Waist)", "Pada (Foot)"]
+RAJJU_NAMES = ("Siro (Head)", "Kantha (Neck)", "Madhya (Belly)", "Kati (Waist)", "Pada (Foot)")
 
 # Manually mapped index (0-26) to Rajju ID (0-4) based on your table
 # 0: Siro, 1: Kantha, 2: Madhya, 3: Kati, 4: Pada
@@ -135,28 +149,36 @@ RAJJU_MAPPING[22] = 2 # Dhanishta -> Madhya
 RAJJU_MAPPING[23] = 2 # Shatabhisha -> Madhya
 # Note: Since your Kati list only has 4 primary stars + shared Dhanishta, 
 # we keep index 22/23 as Madhya based on your 'Madhya' list.
+RAJJU_MAPPING = tuple(RAJJU_MAPPING)  # tables are read-only from here on: worker threads share them
+
+# Per-star / per-sign columns, names and tables that rule profiles (rules.py) refer to
+RULE_ATTRIBUTES = {
+    "nak": {"star": tuple(range(27)), "yoni": YONI_ID, "gana": GANA_TYPE, "nadi": NADI_TYPE, "rajju": RAJJU_MAPPING},
+    "rashi": {"sign": tuple(range(12)), "varna": VARNA_GROUP, "vashya": VASHYA_GROUP, "lord": RASHI_LORDS},
+    "names": {"star": NAKSHATRAS, "sign": RASHIS, "gana": GANA_NAMES, "nadi": NADI_NAMES, "rajju": RAJJU_NAMES,
+              "lord": tuple(PLANET_NAMES_MAP[i] for i in range(7))},
+    "tables": {"maitri": MAITRI_TABLE},
+    "pairs": {"yoni_enemies": tuple(YONI_Enemy_Map.items())},
+    "lists": {"same_nakshatra_allowed": SAME_NAKSHATRA_ALLOWED},
+}
 
 # --- 5. HELPER FUNCTIONS ---
 
 import re
 
+# Compiled once: known symbols -> PDF-safe tags. Multi-codepoint emoji ("⚠️", "🛡️", "🕉️") are keyed
+# on their base codepoint; the trailing variation selector is dropped by the ASCII pass like any other non-ASCII char.
+PDF_SAFE_TABLE = str.maketrans({
+    "✅": "[PASS]", "❌": "[FAIL]", "⚠": "[WARN]",
+    "✨": "*", "⭐": "*", "🔥": "[ENERGY]",
+    "🛡": "[PROTECTED]", "🤖": "AI:", "🕉": "OM"
+})
+
 def clean_text(text):
     if not isinstance(text, str): 
         return str(text)
-    
-    # 1. Map known problematic characters to safe text
-    replacements = {
-        "✅": "[PASS]", "❌": "[FAIL]", "⚠️": "[WARN]", 
-        "✨": "*", "⭐": "*", "🔥": "[ENERGY]", 
-        "🛡️": "[PROTECTED]", "🤖": "AI:", "🕉️": "OM"
-    }
-    for k, v in replacements.items():
-        text = text.replace(k, v)
-        
-    # 2. THE CRITICAL STEP: The Force-Filter
-    # We encode to ASCII. If a character is NOT in the ASCII range (like \u2728), 
-    # 'ignore' deletes it. Then we decode back to a string for the PDF.
-    return text.encode('ascii', 'ignore').decode('ascii')
+    # One translate pass for the known symbols, then the ASCII Force-Filter burns everything else (e.g. \u2728)
+    return text.translate(PDF_SAFE_TABLE).encode('ascii', 'ignore').decode('ascii')
 
 def format_chart_for_ai(chart_data):
     if not chart_data: return "Chart not generated."
@@ -185,9 +207,8 @@ def get_shared_positions(b_chart, g_chart):
 
 def get_jupiter_position_for_year(year):
     dt = datetime.date(year, 7, 1); obs = ephem.Observer(); obs.date = dt
-    jupiter = ephem.Jupiter(); jupiter.compute(obs); ecl = ephem.Ecliptic(jupiter)
-    ayanamsa = 23.85 + (year - 2000) * 0.01396
-    return int(((math.degrees(ecl.lon) - ayanamsa) % 360) / 30)
+    jup_sid, = sidereal.compute_sidereal(obs, (ephem.Jupiter(),))
+    return arcsec.to_mas(jup_sid) // arcsec.RASHI_SPAN
 
 def predict_marriage_luck_years(rashi_idx):
     predictions = []
@@ -200,151 +221,174 @@ def predict_marriage_luck_years(rashi_idx):
 
 def predict_wedding_month(rashi_idx): return SUN_TRANSIT_DATES[(rashi_idx + 6) % 12]
 
-def to_csv(df):
+def to_csv(df, index=False):
     output = BytesIO()
-    df.to_csv(output, index=False)
+    df.to_csv(output, index=index)
     return output.getvalue()
 
 # --- PDF GENERATOR ---
 # --- 5. UPDATED PROFESSIONAL PDF GENERATOR (FPDF) ---
-class PDFReport(FPDF):
-    def header(self):
-        # Professional Header with Gold Theme
-        self.set_fill_color(255, 215, 0) # Gold
-        self.rect(0, 0, 210, 15, 'F')
-        self.set_font('Arial', 'B', 12)
-        self.set_text_color(0, 0, 0)
-        self.cell(0, 10, 'OFFICIAL VEDIC COMPATIBILITY REPORT - 2026 Edition', 0, 1, 'C')
-        self.ln(10)
-
-    def footer(self):
-        self.set_y(-15)
-        self.set_font('Arial', 'I', 8)
-        self.set_text_color(128)
-        self.cell(0, 10, f'Page {self.page_no()} | Generated by Vedic Matcher Pro AI | (c) 2026', 0, 0, 'C')
-
-    def chapter_title(self, title, color=(0, 51, 102)):
-        self.set_font('Arial', 'B', 14)
-        self.set_text_color(*color)
-        self.cell(0, 10, title.upper(), 'B', 1, 'L')
-        self.ln(4)
-
-    def chapter_body(self, body):
-        self.set_font('Arial', '', 10)
-        self.set_text_color(50, 50, 50)
-        self.multi_cell(0, 6, body)
-        self.ln()
-
-    def koota_row(self, attr, score, max_pts, logic, area):
-        # Store current Y to draw shapes
-        current_y = self.get_y()
-        
-        # 1. Draw the Attribute & Area
-        self.set_text_color(50, 50, 50)
-        self.cell(40, 8, clean_text(attr), 1)
-        self.cell(35, 8, clean_text(area), 1)
+# Static page furniture, prepared once per process. Everything in here is already PDF-safe,
+# so a report only has to sanitize and fill its own variable cells.
+PDF_TEMPLATE = {
+    "header_fill": (255, 215, 0), # Gold
+    "header_title": "OFFICIAL VEDIC COMPATIBILITY REPORT - 2026 Edition",
+    "footer": "Page {} | Generated by Vedic Matcher Pro AI | (c) 2026",
+    "titles": {k: clean_text(v).upper() for k, v in {
+        "summary": "1. Match Summary", "ai": "2. Guru AI Insights", "table": "3. Detailed Guna Analysis"
+    }.items()},
+    "title_color": (0, 51, 102),
+    "body_color": (50, 50, 50),
+    "ai_fill": (245, 245, 255),
+    "table_cols": (40, 120), "table_row_h": 7,
+    # (min score ratio, fill) checked top-down: Light Green, Light Gold, Light Red
+    "koota_fills": ((0.8, (200, 255, 200)), (0.5, (255, 240, 200)), (0.0, (255, 200, 200))),
+}
+
+@st.cache_resource
+def get_pdf_report_class():
+    # fpdf is only imported the first time someone downloads a report
+    from fpdf import FPDF
+
+    class PDFReport(FPDF):
+        def header(self):
+            # Professional Header with Gold Theme
+            self.set_fill_color(*PDF_TEMPLATE["header_fill"])
+            self.rect(0, 0, 210, 15, 'F')
+            self.set_font('Arial', 'B', 12)
+            self.set_text_color(0, 0, 0)
+            self.cell(0, 10, PDF_TEMPLATE["header_title"], 0, 1, 'C')
+            self.ln(10)
+
+        def footer(self):
+            self.set_y(-15)
+            self.set_font('Arial', 'I', 8)
+            self.set_text_color(128)
+            self.cell(0, 10, PDF_TEMPLATE["footer"].format(self.page_no()), 0, 0, 'C')
+
+        def chapter_title(self, title, color=PDF_TEMPLATE["title_color"]):
+            # Known sections come pre-cleaned from the template; anything else is sanitized here
+            title = PDF_TEMPLATE["titles"].get(title) or clean_text(title).upper()
+            self.set_font('Arial', 'B', 14)
+            self.set_text_color(*color)
+            self.cell(0, 10, title, 'B', 1, 'L')
+            self.ln(4)
+
+        def chapter_body(self, body):
+            self.set_font('Arial', '', 10)
+            self.set_text_color(*PDF_TEMPLATE["body_color"])
+            self.multi_cell(0, 6, body)
+            self.ln()
+
+        def koota_row(self, attr, score, max_pts, logic, area):
+            # 1. Draw the Attribute & Area
+            self.set_text_color(*PDF_TEMPLATE["body_color"])
+            self.cell(40, 8, clean_text(attr), 1)
+            self.cell(35, 8, clean_text(area), 1)
         
-        # 2. Draw the Score with a Background Color (The Visual Indicator)
-        percent = (score / max_pts) if max_pts > 0 else 0
-        if percent >= 0.8: self.set_fill_color(200, 255, 200) # Light Green
-        elif percent >= 0.5: self.set_fill_color(255, 240, 200) # Light Gold
-        else: self.set_fill_color(255, 200, 200) # Light Red
+            # 2. Draw the Score with a Background Color (The Visual Indicator)
+            percent = (score / max_pts) if max_pts > 0 else 0
+            fill = next(f for cutoff, f in PDF_TEMPLATE["koota_fills"] if percent >= cutoff)
+            self.set_fill_color(*fill)
+            self.cell(20, 8, f"{score}/{max_pts}", 1, 0, 'C', 1)
         
-        self.cell(20, 8, f"{score}/{max_pts}", 1, 0, 'C', 1)
+            # 3. Draw the Logic (Cleaned of Emojis), truncated to prevent overflow
+            safe_logic = clean_text(logic)
+            if len(safe_logic) > 55: safe_logic = safe_logic[:52] + "..."
+            self.cell(95, 8, safe_logic, 1)
+            self.ln()
+
+    return PDFReport
+
+@st.cache_data(max_entries=64, show_spinner=False)
+@metrics.cache_miss("generate_pdf")
+def render_pdf_bytes(b_n, g_n, rows, safe_pitch):
+    """Fills the cached template. `rows` are pre-cleaned (attr, reason) pairs, so identical reports are served from cache."""
+    pdf = get_pdf_report_class()()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+
+    # 2. EXECUTIVE SUMMARY
+    pdf.chapter_title("summary")
+    
+    # 3. AI SECTION
+    if safe_pitch:
+        pdf.set_fill_color(*PDF_TEMPLATE["ai_fill"])
+        # Dynamic height calculation
+        lines = pdf.multi_cell(180, 6, safe_pitch, split_only=True)
+        box_height = (len(lines) * 6) + 15
         
-        # 3. Draw the Logic (Cleaned of Emojis)
-        self.set_text_color(50, 50, 50)
-        # Truncate logic to prevent overflow
-        safe_logic = clean_text(logic)
-        if len(safe_logic) > 55: safe_logic = safe_logic[:52] + "..."
-        self.cell(95, 8, safe_logic, 1)
-        self.ln()
-
-def generate_pdf(res):
-    # 1. DEFINE THE SNIPER+GATEKEEPER LOCALLY (To be 100% sure it's used)
-    def force_clean(text):
-        if not isinstance(text, str): return str(text)
-        # The Sniper: Replace known symbols
-        replacements = {"✅": "[PASS]", "❌": "[FAIL]", "⚠️": "[WARN]", "✨": "*", "🤖": "AI:"}
-        for k, v in replacements.items():
-            text = text.replace(k, v)
-        # The Gatekeeper: Burn everything else non-ASCII
-        return text.encode('ascii', 'ignore').decode('ascii')
-
+        pdf.rect(10, pdf.get_y(), 190, box_height, 'F')
+        pdf.chapter_title("ai")
+        pdf.set_font('Arial', 'I', 10)
+        pdf.set_x(15)
+        pdf.multi_cell(180, 6, safe_pitch)
+        pdf.ln(10)
+
+    # 4. KOOTA TABLE: the skeleton is fixed, only the cell text varies
+    pdf.chapter_title("table")
+    w_attr, w_reason = PDF_TEMPLATE["table_cols"]; row_h = PDF_TEMPLATE["table_row_h"]
+    for attr, reason in rows:
+        pdf.cell(w_attr, row_h, attr, 1)
+        pdf.cell(w_reason, row_h, reason, 1)
+        pdf.ln()
+
+    return pdf.output(dest='S').encode('latin-1', 'replace')
+
+@metrics.timed("generate_pdf")
+def generate_pdf(res, pitch=None):
     try:
-        pdf = PDFReport()
-        pdf.set_auto_page_break(auto=True, margin=15)
-        pdf.add_page()
-
-        # --- DEBUG POINT: CONSOLE ---
-        print("\n[PDF DEBUG] Starting Generation for:", res.get('b_n'), "&", res.get('g_n'))
-
-        # 2. EXECUTIVE SUMMARY
-        pdf.chapter_title(force_clean("1. Match Summary"))
-        
-        # 3. AI SECTION (The common crash point)
-        if st.session_state.ai_pitch:
-            # We clean it here and print to terminal to verify
-            safe_pitch = force_clean(st.session_state.ai_pitch)
-            print("[PDF DEBUG] Sanitized AI Pitch Length:", len(safe_pitch))
-            
-            pdf.set_fill_color(245, 245, 255)
-            # Dynamic height calculation
-            lines = pdf.multi_cell(180, 6, safe_pitch, split_only=True)
-            box_height = (len(lines) * 6) + 15
-            
-            pdf.rect(10, pdf.get_y(), 190, box_height, 'F')
-            pdf.chapter_title(force_clean("2. Guru AI Insights"))
-            pdf.set_font('Arial', 'I', 10)
-            pdf.set_x(15)
-            pdf.multi_cell(180, 6, safe_pitch)
-            pdf.ln(10)
-
-        # 4. KOOTA TABLE (Another crash point)
-        pdf.chapter_title(force_clean("3. Detailed Guna Analysis"))
-        for item in res['bd']:
-            attr, raw, final, mx, reason = item
-            # We FORCE CLEAN the attribute and the reason text
-            pdf.cell(40, 7, force_clean(attr), 1)
-            pdf.cell(120, 7, force_clean(reason), 1)
-            pdf.ln()
-
-        print("[PDF DEBUG] PDF Successfully Created in Memory.")
-        return pdf.output(dest='S').encode('latin-1', 'replace')
-
+        # Only the variable cells get sanitized per report (single translate pass each)
+        rows = tuple((clean_text(item[0]), clean_text(item[4])) for item in res['bd'])
+        if pitch is None: pitch = st.session_state.ai_pitch
+        return render_pdf_bytes(res.get('b_n'), res.get('g_n'), rows, clean_text(pitch or ""))
     except Exception as e:
-        print(f"[PDF CRITICAL ERROR] {str(e)}")
         # This shows the error directly in the Streamlit App so you don't have to check terminal
         st.error(f"PDF Generation Failed: {str(e)}")
         return None
     
 @st.cache_resource
-def get_geolocator(): return Nominatim(user_agent="vedic_matcher_v112_final_defaults", timeout=10)
-@st.cache_resource
-def get_tf(): return TimezoneFinder()
+def get_geolocator():
+    from geopy.geocoders import Nominatim
+    return Nominatim(user_agent="vedic_matcher_v112_final_defaults", timeout=10)
+# TimezoneFinder lookups are not meant to share one instance across threads; after the first, an instance is ~10ms
+_THREAD_STATE = threading.local()
+def get_tf():
+    if not hasattr(_THREAD_STATE, "tf"):
+        from timezonefinder import TimezoneFinder
+        _THREAD_STATE.tf = TimezoneFinder()
+    return _THREAD_STATE.tf
+# One Nominatim request at a time per process (its usage policy allows ~1/s anyway); hits never get here
+_GEOCODE_LOCK = threading.Lock()
+@metrics.timed("geocode_online")
 @st.cache_data(ttl=3600)
-def get_cached_coords(city, country):
-    try: return get_geolocator().geocode(f"{city}, {country}")
+@metrics.cache_miss("geocode_online")
+def geocode_online(city, country):
+    try:
+        with _GEOCODE_LOCK: return get_geolocator().geocode(f"{city}, {country}")
     except: return None
 
+# The bundled gazetteer answers most cities (old names included) in microseconds, with the timezone
+# attached; Nominatim is asked about everything else, typos included (the hint offers near misses).
+@metrics.timed("get_cached_coords")
+def get_cached_coords(city, country):
+    return gazetteer.resolve(city, country) or geocode_online(city, country)
+
+@metrics.timed("get_offset_smart")
 def get_offset_smart(city, country, dt, manual_tz):
-    tf = get_tf(); loc = get_cached_coords(city, country)
+    loc = get_cached_coords(city, country)
     try:
         if loc:
-            tz = pytz.timezone(tf.timezone_at(lng=loc.longitude, lat=loc.latitude))
+            tz_name = getattr(loc, "tz", None)
+            if not tz_name:
+                with metrics.stage("timezone_at"): tz_name = get_tf().timezone_at(lng=loc.longitude, lat=loc.latitude)
+            tz = pytz.timezone(tz_name)
             return tz.localize(dt).utcoffset().total_seconds()/3600.0, f"📍 {city}"
         raise ValueError
     except: return manual_tz, f"⚠️ Manual TZ"
 
 def calculate_d9_position(longitude):
-    d1_rashi = int(longitude / 30)
-    rem_deg = longitude % 30
-    nav_num = int(rem_deg / 3.33333333333)
-    if d1_rashi in [0, 4, 8]: start_sign = 0 
-    elif d1_rashi in [1, 5, 9]: start_sign = 9 
-    elif d1_rashi in [2, 6, 10]: start_sign = 6 
-    elif d1_rashi in [3, 7, 11]: start_sign = 3 
-    return (start_sign + nav_num) % 12
+    return varga.varga_sign(longitude, 9)
 
 def calculate_rahu_ketu_mean(jd):
     t = (jd - 2451545.0) / 36525.0
@@ -367,92 +411,74 @@ def get_d9_rashi_from_pada(nak_idx, pada):
     total_padas = (nak_idx * 4) + (pada - 1)
     return total_padas % 12
 
-def get_nak_rashi_pada(long):
-    nak_idx = int(long / 13.33333333333)
-    rashi_idx = int(long / 30)
-    deg_in_nak = long % 13.33333333333
-    pada = int(deg_in_nak / 3.33333333333) + 1
-    return nak_idx, rashi_idx, pada
+def get_rashi_from_pada(nak_idx, pada):
+    # Precise Rashi for a Pada: sign of the point 1 degree into the pada
+    return (arcsec.pada_start(nak_idx, pada) + arcsec.MAS_PER_DEG) // arcsec.RASHI_SPAN
 
-def get_planetary_positions(date_obj, time_obj, city, country, detailed=False):
+def get_nak_rashi_pada(long):
+    return arcsec.nak_rashi_pada(arcsec.to_mas(long))
+
+@metrics.cache_miss("ephemeris_chart")
+def compute_chart(key, detailed=False):
+    """Sidereal (moon, mars, sun, asc, d1, d9) for a normalized ephem_cache key. asc / d1 / d9 only when detailed."""
+    utc, lat, lon = ephem_cache.key_instant(key)
+    with sidereal.EPHEM_LOCK:  # the Observer and bodies are per call; libastro's statics are not
+        obs = ephem.Observer(); obs.date = utc
+        obs.lat, obs.lon = str(lat), str(lon)
+        jd = ephem.julian_date(obs.date)
+        if not detailed:
+            s_moon, s_mars, s_sun = sidereal.compute_sidereal(obs, (ephem.Moon(), ephem.Mars(), ephem.Sun()))
+            return s_moon, s_mars, s_sun, None, None, None
+        # One pass over the bodies; nodes + ascendant ride along in the same sidereal conversion
+        bodies = [ephem.Sun(), ephem.Moon(), ephem.Mars(), ephem.Mercury(), ephem.Jupiter(), ephem.Venus(), ephem.Saturn()]
+        rahu_l, ketu_l = calculate_rahu_ketu_mean(jd)
+        sid = sidereal.compute_sidereal(obs, bodies, (rahu_l, ketu_l, calculate_ascendant(obs, jd)))
+    names = ["Su", "Mo", "Ma", "Me", "Ju", "Ve", "Sa", "Ra", "Ke", "Asc"]
+    d1_signs, d9_signs = varga.varga_signs(sid, (1, 9))
+    return sid[1], sid[2], sid[0], sid[9], varga.chart_from_signs(d1_signs, names), varga.chart_from_signs(d9_signs, names)
+
+@metrics.timed("ephemeris_chart")
+def get_chart(utc_dt, lat, lon, detailed=False, use_cache=True):
+    """compute_chart behind the on-disk ephem_cache (same UTC second + rounded place = same chart)."""
+    key = ephem_cache.normalize(utc_dt, lat, lon)
+    if use_cache:
+        hit = ephem_cache.get(key, detailed)
+        if hit is not None: return hit
+    chart = compute_chart(key, detailed)
+    if use_cache: ephem_cache.put(key, detailed, chart)
+    return chart
+
+@metrics.timed("get_planetary_positions")
+def get_planetary_positions(date_obj, time_obj, city, country, detailed=False, use_cache=True):
     dt = datetime.datetime.combine(date_obj, time_obj)
     offset, msg = get_offset_smart(city, country, dt, 5.5)
-    obs = ephem.Observer(); obs.date = dt - datetime.timedelta(hours=offset)
-    obs.lat, obs.lon = '28.6139', '77.2090' 
+    lat, lon = 28.6139, 77.2090
     if city: 
         loc = get_cached_coords(city, country)
-        if loc: obs.lat, obs.lon = str(loc.latitude), str(loc.longitude)
-    
-    # Base bodies
-    moon = ephem.Moon(); moon.compute(obs)
-    mars = ephem.Mars(); mars.compute(obs)
-    sun = ephem.Sun(); sun.compute(obs)
+        if loc: lat, lon = loc.latitude, loc.longitude
     
-    # Ayanamsa Calculation (Lahiri)
-    # t = (jd - 2451545.0) / 36525
-    jd = ephem.julian_date(obs.date)
-    t = (jd - 2451545.0) / 36525.0
-    ayanamsa = 23.85 + 1.4 * t # Simplified rate
-    
-    s_moon = (math.degrees(ephem.Ecliptic(moon).lon) - ayanamsa) % 360
-    s_mars = (math.degrees(ephem.Ecliptic(mars).lon) - ayanamsa) % 360
-    s_sun = (math.degrees(ephem.Ecliptic(sun).lon) - ayanamsa) % 360
-    
-    d1_chart_data = None
-    d9_chart_data = None
-    
-    if detailed:
-        bodies = [ephem.Sun(), ephem.Moon(), ephem.Mars(), ephem.Mercury(), ephem.Jupiter(), ephem.Venus(), ephem.Saturn()]
-        names = ["Su", "Mo", "Ma", "Me", "Ju", "Ve", "Sa"] 
-        d1_chart_data = {}; d9_chart_data = {}
-        for body, name in zip(bodies, names):
-            body.compute(obs)
-            long = (math.degrees(ephem.Ecliptic(body).lon) - ayanamsa) % 360
-            r_idx_d1 = int(long / 30)
-            if r_idx_d1 not in d1_chart_data: d1_chart_data[r_idx_d1] = []
-            d1_chart_data[r_idx_d1].append(name)
-            r_idx_d9 = calculate_d9_position(long)
-            if r_idx_d9 not in d9_chart_data: d9_chart_data[r_idx_d9] = []
-            d9_chart_data[r_idx_d9].append(name)
-            
-        rahu_l, ketu_l = calculate_rahu_ketu_mean(jd)
-        rahu_sid = (rahu_l - ayanamsa) % 360; ketu_sid = (ketu_l - ayanamsa) % 360
-        r_idx = int(rahu_sid / 30)
-        if r_idx not in d1_chart_data: d1_chart_data[r_idx] = []
-        d1_chart_data[r_idx].append("Ra")
-        r_d9 = calculate_d9_position(rahu_sid)
-        if r_d9 not in d9_chart_data: d9_chart_data[r_d9] = []
-        d9_chart_data[r_d9].append("Ra")
-        k_idx = int(ketu_sid / 30)
-        if k_idx not in d1_chart_data: d1_chart_data[k_idx] = []
-        d1_chart_data[k_idx].append("Ke")
-        k_d9 = calculate_d9_position(ketu_sid)
-        if k_d9 not in d9_chart_data: d9_chart_data[k_d9] = []
-        d9_chart_data[k_d9].append("Ke")
-        
-        asc_trop = calculate_ascendant(obs, jd)
-        asc_sid = (asc_trop - ayanamsa) % 360
-        a_idx = int(asc_sid / 30)
-        if a_idx not in d1_chart_data: d1_chart_data[a_idx] = []
-        d1_chart_data[a_idx].append("Asc")
-        a_d9 = calculate_d9_position(asc_sid)
-        if a_d9 not in d9_chart_data: d9_chart_data[a_d9] = []
-        d9_chart_data[a_d9].append("Asc")
-
+    s_moon, s_mars, s_sun, _, d1_chart_data, d9_chart_data = get_chart(dt - datetime.timedelta(hours=offset), lat, lon, detailed, use_cache)
     return s_moon, s_mars, s_sun, msg, d1_chart_data, d9_chart_data
 
 def check_mars_dosha_smart(moon_rashi, mars_long):
-    mars_rashi = int(mars_long / 30)
-    house_diff = (mars_rashi - moon_rashi) % 12 + 1
-    if house_diff in [2, 4, 7, 8, 12]:
-        if mars_rashi == 0 or mars_rashi == 7: return False, f"✅ Balanced (Mars in Own Sign - House {house_diff})"
-        elif mars_rashi == 9: return False, f"✅ Balanced (Mars Exalted - House {house_diff})"
+    mars_rashi = kuja.mars_rashi_of(mars_long)
+    house_diff = kuja.mars_house(moon_rashi, mars_rashi)
+    status = kuja.KUJA_TABLE[moon_rashi][mars_rashi]
+    if status == kuja.CANCELLED_OWN_SIGN: return False, f"✅ Balanced (Mars in Own Sign - House {house_diff})"
+    if status == kuja.CANCELLED_EXALTED: return False, f"✅ Balanced (Mars Exalted - House {house_diff})"
+    if status == kuja.DOSHA:
         return True, f"🔥 **High Intensity (House {house_diff}):** Mars influences {('Longevity & Intimacy' if house_diff==8 else ('Marriage Partnership' if house_diff==7 else 'Family/Temper'))}. Brings deep passion but requires a strong partner."
     return False, "✨ **Calm:** Mars is placed peacefully. No aggressive energy spikes."
 
 def render_south_indian_chart(positions, title):
+    # Memoized on the placements themselves: reruns and repeat charts reuse the same HTML string
+    placements = tuple(sorted((r_idx, tuple(planets)) for r_idx, planets in positions.items()))
+    return _render_south_indian_chart_html(placements, title)
+
+@functools.lru_cache(maxsize=2048)
+def _render_south_indian_chart_html(placements, title):
     grid_items = [""] * 16
-    for rashi_idx, planets in positions.items():
+    for rashi_idx, planets in placements:
         if rashi_idx in SOUTH_CHART_MAP:
             grid_pos = SOUTH_CHART_MAP[rashi_idx]
             grid_items[grid_pos] = "<br>".join(planets)
@@ -474,10 +500,46 @@ def render_south_indian_chart(positions, title):
         <div class="chart-box" style="grid-column: 4; grid-row: 4;">{grid_items[15]}<br><span style='font-size:8px; color:grey'>Vir</span></div>
     </div>"""
 
+# --- LIGHTWEIGHT RENDERERS (memoized on their inputs) ---
+@functools.lru_cache(maxsize=512)
+def render_gauge_html(value, color, title, title_color="#888", max_val=36):
+    """Static SVG half-dial: same reading as the Plotly Indicator gauge at a fraction of the payload, no Plotly needed."""
+    frac = max(0.0, min(float(value) / max_val, 1.0))
+    ang = math.pi * (1 - frac)
+    x, y = 110 + 90 * math.cos(ang), 100 - 90 * math.sin(ang)
+    arc = f"<path d='M 20 100 A 90 90 0 0 1 {x:.2f} {y:.2f}' fill='none' stroke='{color}' stroke-width='22'/>" if frac > 0 else ""
+    return (f"<div class='gauge-title' style='color:{title_color}; margin-bottom: 0;'>{title}</div>"
+            f"<svg viewBox='0 0 220 120' style='display:block; margin:0 auto; width:100%; max-width:260px; height:150px;'>"
+            f"<path d='M 20 100 A 90 90 0 0 1 200 100' fill='none' stroke='#eeeeee' stroke-width='22'/>{arc}"
+            f"<text x='110' y='98' text-anchor='middle' font-size='34' font-family='sans-serif' fill='#31333F'>{value:g}</text>"
+            f"<text x='20' y='118' text-anchor='middle' font-size='10' fill='#888'>0</text>"
+            f"<text x='200' y='118' text-anchor='middle' font-size='10' fill='#888'>{max_val}</text></svg>")
+
+@functools.lru_cache(maxsize=512)
+def build_gauge_figure(value, color):
+    """Plotly version of the gauge, built once per (value, color)."""
+    import plotly.graph_objects as go
+    fig = go.Figure(go.Indicator(
+        mode = "gauge+number", value = value,
+        gauge = {'axis': {'range': [0, 36]}, 'bar': {'color': color}}
+    ))
+    fig.update_layout(height=180, margin=dict(l=30, r=30, t=10, b=10))
+    return fig
+
+@functools.lru_cache(maxsize=1024)
+def render_quick_scan(bd):
+    """All Quick Scan cards as one HTML block (one websocket delta instead of eight). `bd` is the breakdown as a tuple."""
+    cards = []
+    for attr, raw, final, max_pts, reason in bd:
+        border_class = "border-green" if final == max_pts else ("border-orange" if final > 0 else "border-red")
+        text_class = "text-green" if final == max_pts else ("text-orange" if final > 0 else "text-red")
+        cards.append(f"""<div class="guna-card {border_class}"><div class="guna-header"><span>{attr}</span><span class="guna-score {text_class}">{final} / {max_pts}</span></div><div class="guna-reason">{reason}</div></div>""")
+    return "".join(cards)
+
 def calculate_current_dasha(moon_long, birth_date):
-    nak_idx = int(moon_long / 13.333333)
-    deg_in_nak = moon_long % 13.333333
-    fraction_passed = deg_in_nak / 13.333333
+    moon_mas = arcsec.to_mas(moon_long)
+    nak_idx = moon_mas // arcsec.NAK_SPAN
+    fraction_passed = arcsec.nak_fraction(moon_mas)
     lord_seq_idx = nak_idx % 9
     start_lord = DASHA_ORDER[lord_seq_idx]
     total_years = DASHA_YEARS[start_lord]
@@ -557,236 +619,59 @@ def generate_human_verdict(score, rajju, b_obs, g_obs, b_dasha, g_dasha):
     else: verdict += "The planetary positions are largely neutral, leaving the relationship's success in your own hands."
     return verdict
 
-def calculate_all(b_nak, b_rashi, g_nak, g_rashi, b_d9_rashi=None, g_d9_rashi=None):
-    maitri_raw = MAITRI_TABLE[RASHI_LORDS[b_rashi]][RASHI_LORDS[g_rashi]]
-    friends = maitri_raw >= 4
-    d9_friendly = False
-    
-    b_lord_name = PLANET_NAMES_MAP[RASHI_LORDS[b_rashi]]
-    g_lord_name = PLANET_NAMES_MAP[RASHI_LORDS[g_rashi]]
-    
-    # Navamsa Lord Logic
-    if b_d9_rashi is not None and g_d9_rashi is not None:
-        d9_lord_b = RASHI_LORDS[b_d9_rashi]
-        d9_lord_g = RASHI_LORDS[g_d9_rashi]
-        b_d9_name = PLANET_NAMES_MAP[d9_lord_b]
-        g_d9_name = PLANET_NAMES_MAP[d9_lord_g]
-        
-        if MAITRI_TABLE[d9_lord_b][d9_lord_g] >= 4:
-            d9_friendly = True
-    
-    score = 0; bd = []; logs = []
-    
-    # 1. Varna
-    v_raw = 1 if VARNA_GROUP[b_rashi] <= VARNA_GROUP[g_rashi] else 0
-    v_final = v_raw; reason = "Natural Match" if v_raw == 1 else "Mismatch"
-    fix_msg = None
-    if v_raw == 0:
-        if friends: fix_msg = "Graha Maitri is Friendly"
-        elif d9_friendly: fix_msg = f"Navamsa Lords ({b_d9_name} & {g_d9_name}) are Friendly"
-    if fix_msg:
-        v_final = 1; reason = "Boosted by Support"
-        logs.append({"Attribute": "Varna", "Problem": "Ego Conflict", "Fix": fix_msg, "Source": "Muhurtha Chintamani"})
-    score += v_final; bd.append(("Varna", v_raw, v_final, 1, reason))
-    
-    # 4. Yoni
-    y_raw = 4 if YONI_ID[b_nak] == YONI_ID[g_nak] else (0 if YONI_Enemy_Map.get(YONI_ID[b_nak]) == YONI_ID[g_nak] else 2)
-    y_final = y_raw 
-    
-    # 2. Vashya
-    va_raw = 0
-    if VASHYA_GROUP[b_rashi] == VASHYA_GROUP[g_rashi]: va_raw = 2
-    elif (VASHYA_GROUP[b_rashi] == 0 and VASHYA_GROUP[g_rashi] == 1) or (VASHYA_GROUP[b_rashi] == 1 and VASHYA_GROUP[g_rashi] == 0): va_raw = 1 
-    elif VASHYA_GROUP[b_rashi] != VASHYA_GROUP[g_rashi]: va_raw = 0.5 
-    va_final = va_raw; reason = "Magnetic" if va_raw >= 1 else "Mismatch"
-    fix_msg = None
-    if va_raw < 2:
-        if y_raw == 4: fix_msg = "Yoni is Perfect (4/4)"
-        elif friends: fix_msg = "Graha Maitri is Friendly"
-        elif d9_friendly: fix_msg = f"Navamsa Lords ({b_d9_name} & {g_d9_name}) are Friendly"
-    if fix_msg: 
-        va_final = 2; reason = "Boosted by Support"
-        logs.append({"Attribute": "Vashya", "Problem": f"Attraction Mismatch", "Fix": fix_msg, "Source": "Brihat Parashara"})
-    score += va_final; bd.append(("Vashya", va_raw, va_final, 2, reason))
-    
-    # 3. Tara
-    cnt_b_g = (g_nak - b_nak) % 27 + 1
-    cnt_g_b = (b_nak - g_nak) % 27 + 1
-    t1_bad = cnt_b_g % 9 in [3, 5, 7]
-    t2_bad = cnt_g_b % 9 in [3, 5, 7]
-    t_raw = 3
-    if t1_bad and t2_bad: t_raw = 0
-    elif t1_bad or t2_bad: t_raw = 1.5
-    t_final = t_raw; reason = "Benefic" if t_raw == 3 else ("Mixed" if t_raw == 1.5 else "Malefic")
-    fix_msg = None
-    if t_raw < 3:
-        if friends: fix_msg = "Graha Maitri is Friendly"
-        elif d9_friendly: fix_msg = f"Navamsa Lords ({b_d9_name} & {g_d9_name}) are Friendly"
-    if fix_msg: 
-        t_final = 3; reason = "Boosted by Support"
-        logs.append({"Attribute": "Tara", "Problem": "Malefic Star Position", "Fix": fix_msg, "Source": "Muhurtha Martanda"})
-    score += t_final; bd.append(("Tara", t_raw, t_final, 3, reason))
-    
-    # 7. Bhakoot
-    dist = (b_rashi-g_rashi)%12
-    bh_raw = 7 if dist not in [1, 11, 4, 8, 5, 7] else 0
-    bh_final = bh_raw; reason = "Love Flow" if bh_raw == 7 else "Blocked"
-    fix_msg = None
-    if bh_raw == 0:
-        if friends: fix_msg = "Graha Maitri is Friendly"
-        elif NADI_TYPE[b_nak]!=NADI_TYPE[g_nak]: fix_msg = "Nadi is Different (Healthy)"
-    if fix_msg: 
-        bh_final = 7; reason = "Compensated"
-        logs.append({"Attribute": "Bhakoot", "Problem": f"Bad Position", "Fix": fix_msg, "Source": "Brihat Samhita"})
-    
-    # 4. Yoni Final
-    y_final = y_raw; reason = "Perfect" if y_raw == 4 else "Mismatch"
-    fix_msg = None
-    if y_raw < 4:
-        if friends: fix_msg = "Graha Maitri is Friendly"
-        elif d9_friendly: fix_msg = f"Navamsa Lords ({b_d9_name} & {g_d9_name}) are Friendly"
-        elif bh_final == 7: fix_msg = "Bhakoot is Beneficial"
-        elif va_final >= 1: fix_msg = "Vashya is Magnetic"
-    if fix_msg: 
-        y_final = 4; reason = "Compensated"
-        logs.append({"Attribute": "Yoni", "Problem": "Nature Mismatch", "Fix": fix_msg, "Source": "Jataka Parijata"})
-    score += y_final; bd.append(("Yoni", y_raw, y_final, 4, reason))
-    
-    # 5. Maitri
-    m_final = maitri_raw
-    fix_msg = None
-    if maitri_raw < 5:
-        if d9_friendly: fix_msg = f"Navamsa Lords ({b_d9_name} & {g_d9_name}) are Friendly"
-        elif bh_final == 7: fix_msg = "Bhakoot is Beneficial"
-    if fix_msg:
-        m_final = 5; reason = "Restored"
-        logs.append({"Attribute": "Maitri", "Problem": "Planetary Enemy", "Fix": fix_msg, "Source": "Brihat Parashara"})
-    else:
-        reason = "Friendly" if m_final>=4 else "Enemy"
-    score += m_final; bd.append(("Maitri", maitri_raw, m_final, 5, reason))
-    
-    # 6. Gana
-    gb, gg = GANA_TYPE[b_nak], GANA_TYPE[g_nak]
-    ga_raw = 0
-    if gb == gg: ga_raw = 6
-    elif (gb==0 and gg==1) or (gb==1 and gg==0): ga_raw = 6
-    elif (gb==0 and gg==2) or (gb==2 and gg==0): ga_raw = 1
-    elif (gb==1 and gg==2) or (gb==2 and gg==1): ga_raw = 0
-    
-    # HARDCODED EXCEPTION: Jyeshtha Girl + PB Boy (Aquarius)
-    if NAKSHATRAS[g_nak] == "Jyeshtha" and NAKSHATRAS[b_nak] == "Purva Bhadrapada" and RASHIS[b_rashi].startswith("Aquarius"):
-        ga_raw = 6 # Force Override Raw Score
-    
-    ga_final = ga_raw; reason = "Match" if ga_raw >= 5 else "Mismatch"
-    star_dist = (g_nak - b_nak) % 27 + 1
-    fix_msg = None
-    if ga_raw < 6:
-        if star_dist >= 14: fix_msg = "Star Distance > 14"
-        elif friends: fix_msg = "Graha Maitri is Friendly"
-        elif d9_friendly: fix_msg = f"Navamsa Lords ({b_d9_name} & {g_d9_name}) are Friendly"
-        elif bh_final == 7: fix_msg = "Bhakoot is Beneficial"
-    if fix_msg:
-        ga_final = 6; reason = "Boosted"
-        logs.append({"Attribute": "Gana", "Problem": "Temperament Clash", "Fix": fix_msg, "Source": "Peeyushadhara"})
-    score += ga_final; bd.append(("Gana", ga_raw, ga_final, 6, reason))
-    
-    # 7. Bhakoot Final
-    score += bh_final; bd.append(("Bhakoot", bh_raw, bh_final, 7, "Love Flow" if bh_final == 7 else "Blocked"))
-    
-    # 8. Nadi
-    n_raw = 8; n_final = 8; n_reason = "Healthy"
-    if NADI_TYPE[b_nak] == NADI_TYPE[g_nak]:
-        n_raw = 0; n_final = 0; n_reason = "Same Nadi (Dosha)"
-        problem = f"{NADI_NAMES[NADI_TYPE[b_nak]]} vs {NADI_NAMES[NADI_TYPE[g_nak]]}"
-        if b_nak==g_nak and NAKSHATRAS[b_nak] in SAME_NAKSHATRA_ALLOWED: 
-            n_final=8; n_reason="Exception: Allowed Star"
-            logs.append({"Attribute": "Nadi", "Problem": problem, "Fix": f"Star {NAKSHATRAS[b_nak]} is an Exception.", "Source": "Classical List"})
-        elif b_rashi==g_rashi and b_nak!=g_nak: 
-            n_final=8; n_reason="Exception: Same Rashi"
-            logs.append({"Attribute": "Nadi", "Problem": problem, "Fix": "Same Rashi, Different Star.", "Source": "Muhurtha Martanda"})
-        elif friends: 
-            n_final=8; n_reason="Cancelled: Strong Maitri"
-            logs.append({"Attribute": "Nadi", "Problem": problem, "Fix": "Maitri overrides Nadi.", "Source": "Muhurtha Chintamani"})
-    score += n_final; bd.append(("Nadi", n_raw, n_final, 8, n_reason))
-
-    # South Indian
-    # --- UPDATED RAJJU CALCULATION ---
-   # 1. RAJJU CALCULATION (Using your specific assignment table)
-    # 1. RAJJU CALCULATION
-    rajju_status = "Pass"
-    rajju_reason = "No Rajju Dosha detected."
-    
-    b_rajju_id = RAJJU_MAPPING[b_nak]
-    g_rajju_id = RAJJU_MAPPING[g_nak]
-    b_rajju_name = RAJJU_NAMES[b_rajju_id]
-    g_rajju_name = RAJJU_NAMES[g_rajju_id]
-
-    if b_rajju_id == g_rajju_id:
-        rajju_status = "Fail"
-        rajju_reason = f"Both stars belong to {b_rajju_name}."
-        
-        # CANCELLATION LOGIC
-        if friends or b_rashi == g_rashi:
-            rajju_status = "Cancelled"
-            c_type = "Graha Maitri" if friends else "Same Moon Sign"
-            rajju_reason = f"Initial clash found ({b_rajju_name}), but it is **Cancelled due to {c_type}**."
-            
-            logs.append({
-                "Attribute": "Rajju", 
-                "Problem": f"Same Rajju ({b_rajju_name})", 
-                "Fix": f"Neutralized by {c_type}", 
-                "Source": "Vedic Tradition"
-            })
-
-    # 2. VEDHA CALCULATION (Enemy Stars)
-    vedha_status = "Pass"
-    vedha_pairs = {0: 17, 1: 16, 2: 15, 3: 14, 4: 22, 5: 21, 6: 20, 7: 19, 8: 18, 9: 26, 10: 25, 11: 24, 12: 23, 13: 13}
-    # Create reverse mapping
-    temp_pairs = list(vedha_pairs.items())
-    for k, v in temp_pairs: vedha_pairs[v] = k
-    
-    if vedha_pairs.get(g_nak) == b_nak:
-        vedha_status = "Fail"
-
-    # 3. CRITICAL SAFETY CHECK
-    bhakoot_score = 0; nadi_score = 0
-    for item in bd:
-        if item[0] == "Bhakoot": bhakoot_score = item[2]
-        if item[0] == "Nadi": nadi_score = item[2]
-        
-    final_status_override = None
-    
-    # Check for Double Zero (Bhakoot + Nadi)
-    if score > 18 and bhakoot_score == 0 and nadi_score == 0:
-        final_status_override = "Risky Match (Double Dosha) ❌"
-    
-    # Check for Rajju (This will take priority or add to the warning)
-    if rajju_status == "Fail":
-        final_status_override = "Risky Match (Rajju Dosha) ❌"
-    
-    # Check for Vedha (Optional: Vedha is also a critical forbidden match)
-    if vedha_status == "Fail":
-         final_status_override = "Risky Match (Vedha Dosha) ❌"
-        
-    # 4. FINAL RETURN
-    return score, bd, logs, rajju_status, vedha_status, final_status_override, b_rajju_name, g_rajju_name, rajju_reason
-
-def find_best_matches(source_gender, s_nak, s_rashi, s_pada):
+@functools.lru_cache(maxsize=None)
+def get_rule_profile(name=None):
+    """Compiled rules.py profile: built-in name or .json path, default VEDIC_RULE_PROFILE (north)."""
+    return rules.compile_profile(rules.load_profile(name), RULE_ATTRIBUTES)
+
+RULE_PROFILE = get_rule_profile()
+
+@metrics.timed("calculate_all")
+def calculate_all(b_nak, b_rashi, g_nak, g_rashi, b_d9_rashi=None, g_d9_rashi=None, profile=None):
+    # Koota scores, remedies, Rajju / Vedha and the safety verdict under the active tradition's compiled rules
+    rule_profile = RULE_PROFILE if profile is None else get_rule_profile(profile)
+    return rule_profile.evaluate(b_nak, b_rashi, g_nak, g_rashi, b_d9_rashi, g_d9_rashi)
+
+# --- SCORE DISTRIBUTION (percentile ranks) ---
+@functools.lru_cache(maxsize=None)
+def pada_grid(profile=None):
+    """rules grid() over boy pada x girl pada (108 x 108, slot = nak * 4 + pada - 1)."""
+    import numpy as np
+    rule_profile = RULE_PROFILE if profile is None else get_rule_profile(profile)
+    slots = [divmod(s, 4) for s in range(108)]
+    nak = np.array([n for n, _ in slots]); rashi = np.array([get_rashi_from_pada(n, p + 1) for n, p in slots])
+    d9 = np.array([get_d9_rashi_from_pada(n, p + 1) for n, p in slots])
+    return rule_profile.grid(nak[:, None], rashi[:, None], nak[None, :], rashi[None, :], d9[:, None], d9[None, :])
+
+@functools.lru_cache(maxsize=None)
+def get_score_distribution(profile=None, weights=None):
+    """score_dist.Distribution of the rules over all pada pairings, weighted by the padas of the chart store
+    `weights` (default VEDIC_SCORE_WEIGHTS) or, with none, counting every pairing once."""
+    import chart_store, score_dist
+    weights = weights or os.environ.get("VEDIC_SCORE_WEIGHTS")
+    counts = score_dist.slot_counts(chart_store.attach(weights)) if weights else (None, None)
+    g = pada_grid(profile)
+    return score_dist.Distribution(g["raw"], g["score"], (RULE_PROFILE if profile is None else get_rule_profile(profile)).max_score, *counts)
+
+def match_rank(score, raw_score, b_nak, b_d9_rashi, g_nak, g_d9_rashi, profile=None):
+    # Percentile ranks (remedied / raw) plus, when the padas are known, how many of the 108 partner padas beat this couple
+    import score_dist
+    return get_score_distribution(profile).rank(score, raw_score, score_dist.slot_of(b_nak, b_d9_rashi), score_dist.slot_of(g_nak, g_d9_rashi))
+
+def is_risky(safety):
+    """The Find Matches rule, shared by cli.py and server.py: a Vedha verdict hides a pairing unless risky matches
+    are shown. Rajju / Double Dosha verdicts are listed (and still turn the Match tab red)."""
+    return bool(safety and safety.startswith("Risky Match (Vedha Dosha)"))
+
+def scan_match_slots(source_gender, s_nak, s_rashi, s_pada):
+    """Raw finder scan over all 108 target padas: (target slot, remedied score, raw score, is_risky)
+    for every target scoring above 18, best raw score first. Slot = nak * 4 + (pada - 1)."""
     matches = []
     s_d9_rashi = get_d9_rashi_from_pada(s_nak, s_pada)
     for i in range(27): 
-        target_star_name = NAKSHATRAS[i]
-        
         # Iterate all 4 padas
         for t_pada in range(1, 5):
-            valid_rashis = NAK_TO_RASHI_MAP[i]
-            # Precise Rashi Calculation for Pada
-            star_span = 13.3333333333333
-            pada_span = 3.3333333333333
-            star_start_deg = i * star_span
-            pada_start_deg = star_start_deg + (t_pada - 1) * pada_span
-            mid_pada_deg = pada_start_deg + 1.0 
-            t_rashi_idx = int(mid_pada_deg / 30)
+            t_rashi_idx = get_rashi_from_pada(i, t_pada)
             
             t_d9_rashi = get_d9_rashi_from_pada(i, t_pada)
             
@@ -795,76 +680,341 @@ def find_best_matches(source_gender, s_nak, s_rashi, s_pada):
             else: 
                 score, bd, logs, _, _, safety,b_rajju_label, g_rajju_label,_ = calculate_all(i, t_rashi_idx, s_nak, s_rashi, t_d9_rashi, s_d9_rashi)
             
-            is_risky = (safety == "Risky Match (Double Dosha) ❌")
-            is_risky = (safety == "Risky Match (Rajju Dosha) ❌")
-            is_risky = (safety == "Risky Match (Vedha Dosha) ❌")
-            #is_risky = (safety == "Risky Match (Boy has Kuja Dosha) ❌")
-            #is_risky = (safety == "Risky Match (Girl has Kuja Dosha) ❌")
-            
-            
             if score > 18:
                 raw_score = sum(item[1] for item in bd)
-                rashi_simple = RASHIS[t_rashi_idx].split(" ")[0]
-                risk_icon = "⚠️" if is_risky else ""
-                
-                match_entry = {
-                    "Match Details": f"{risk_icon} {target_star_name} ({rashi_simple}) - Pada {t_pada}",
-                    "Final Remedied Score": score,
-                    "Raw Score": raw_score,
-                    "IsRisky": is_risky
-                }
-                matches.append(match_entry)
+                matches.append((i * 4 + t_pada - 1, score, raw_score, is_risky(safety)))
             
     # Default Sorting: Raw Score (Highest First) as requested
-    return sorted(matches, key=lambda x: x['Raw Score'], reverse=True)
+    return sorted(matches, key=lambda x: x[2], reverse=True)
+
+def _match_label(slot, is_risky):
+    t_nak, t_pada = divmod(slot, 4); t_pada += 1
+    rashi_simple = RASHIS[get_rashi_from_pada(t_nak, t_pada)].split(" ")[0]
+    risk_icon = "⚠️" if is_risky else ""
+    return f"{risk_icon} {NAKSHATRAS[t_nak]} ({rashi_simple}) - Pada {t_pada}"
+
+# "Match Details" text for every (target slot, risky) pair, built once
+MATCH_LABELS = {(slot, risky): _match_label(slot, risky) for slot in range(108) for risky in (False, True)}
+
+def format_match(slot, score, raw_score, is_risky, percentile=None, better_slots=None):
+    return {
+        "Match Details": MATCH_LABELS[(slot, is_risky)],
+        "Final Remedied Score": score,
+        "Raw Score": raw_score,
+        "IsRisky": is_risky,
+        "Percentile": percentile,
+        "Slots Scoring Higher": better_slots
+    }
 
-# --- AUTO-DETECT MODEL ---
-def get_working_model(key):
-    genai.configure(api_key=key)
-    try:
-        available = [m.name for m in genai.list_models() if 'generateContent' in m.supported_generation_methods]
-        if available: return available[0]
-    except: pass
-    return "models/gemini-1.5-flash"
+def format_matches(source_gender, s_nak, s_pada, slots):
+    # Percentile among all couples, and how many of the seeker's 108 possible partner padas would score higher
+    dist = get_score_distribution(); s_slot = s_nak * 4 + s_pada - 1
+    return [format_match(*m, dist.percentile(m[1]), dist.better_slots(source_gender, s_slot, m[1])) for m in slots]
 
+def find_best_matches(source_gender, s_nak, s_rashi, s_pada):
+    return format_matches(source_gender, s_nak, s_pada, scan_match_slots(source_gender, s_nak, s_rashi, s_pada))
+
+# --- PRECOMPUTED FINDER INDEX ---
+# The Find Matches inputs are finite: 2 genders x 27 stars x their 1-2 rashis x 4 padas (288 seekers).
+# Every answer is scanned once per process and kept as compact (slot, score, raw, risky) tuples;
+# filter/sort toggles then only re-filter the cached list instead of rescanning 108 targets.
+FINDER_GENDERS = ("Boy", "Girl")
+
+def finder_seekers():
+    for gender in FINDER_GENDERS:
+        for nak in range(27):
+            for rashi in NAK_TO_RASHI_MAP[nak]:
+                for pada in range(1, 5): yield (gender, nak, rashi, pada)
+
+@st.cache_resource(show_spinner="Building match index...")
+def get_finder_index():
+    return {seeker: tuple(scan_match_slots(*seeker)) for seeker in finder_seekers()}
+
+def lookup_best_matches(source_gender, s_nak, s_rashi, s_pada):
+    """Same answer as find_best_matches, served from the precomputed index (falls back to a scan off-index)."""
+    slots = get_finder_index().get((source_gender, s_nak, s_rashi, s_pada))
+    if slots is None: slots = scan_match_slots(source_gender, s_nak, s_rashi, s_pada)
+    return format_matches(source_gender, s_nak, s_pada, slots)
+
+# --- COMPATIBILITY MATRIX (heatmap view) ---
+HEATMAP_LEVELS = ("Nakshatra (27×27)", "Pada (108×108)")
+HEATMAP_OVERLAYS = ("Rajju", "Vedha", "Double Dosha")
+
+@st.cache_resource(show_spinner="Building compatibility matrix...")
+def get_compat_matrix():
+    """Boy pada x girl pada (108 x 108, slot = nak * 4 + pada - 1) under the active rules, in one vectorized pass.
+    The 27 x 27 star level averages each star pair's 16 pada pairings; an overlay marks a star pair if any pairing has it."""
+    import numpy as np
+    slots = [divmod(s, 4) for s in range(108)]
+    g = pada_grid()
+    double = next((v for v, key in zip(g["verdicts"], RULE_PROFILE.verdict_keys) if key == "double_dosha"), np.zeros_like(g["rajju"]))
+    pada = {"Raw": g["raw"], "Remedied": g["score"], "Rajju": g["rajju"], "Vedha": g["vedha"], "Double Dosha": double}
+    star = {k: (v.reshape(27, 4, 27, 4).any(axis=(1, 3)) if v.dtype == bool else v.reshape(27, 4, 27, 4).mean(axis=(1, 3)).round(1))
+            for k, v in pada.items()}
+    labels = [f"{NAKSHATRAS[n]} {p + 1}" for n, p in slots]
+    return {HEATMAP_LEVELS[0]: (list(NAKSHATRAS), star), HEATMAP_LEVELS[1]: (labels, pada)}
+
+@functools.lru_cache(maxsize=32)
+def build_heatmap_figure(level, score_kind, overlays):
+    """Plotly heatmap (rows: boy, columns: girl) with marker overlays; one figure per toggle combination."""
+    import plotly.graph_objects as go
+    labels, m = get_compat_matrix()[level]
+    fig = go.Figure(go.Heatmap(z=m[score_kind], x=labels, y=labels, zmin=0, zmax=36, colorbar={"title": score_kind},
+                               colorscale=[[0, "#ff4b4b"], [0.5, "#ffa500"], [0.7, "#ffe066"], [1, "#00cc00"]],
+                               hovertemplate="Boy: %{y}<br>Girl: %{x}<br>" + score_kind + ": %{z}<extra></extra>"))
+    markers = {"Rajju": ("x", "#000000"), "Vedha": ("circle-open", "#1f3bff"), "Double Dosha": ("diamond", "#7a00cc")}
+    for name in overlays:
+        rows, cols = m[name].nonzero()
+        symbol, color = markers[name]
+        fig.add_trace(go.Scatter(x=[labels[c] for c in cols], y=[labels[r] for r in rows], mode="markers", name=name,
+                                 marker={"symbol": symbol, "color": color, "size": 9 if len(labels) == 27 else 4},
+                                 hovertemplate="Boy: %{y}<br>Girl: %{x}<br>" + name + "<extra></extra>"))
+    fig.update_layout(height=760 if len(labels) == 27 else 900, margin=dict(l=10, r=10, t=30, b=10),
+                      xaxis={"title": "Girl", "tickangle": -60}, yaxis={"title": "Boy", "autorange": "reversed"},
+                      legend={"orientation": "h", "y": 1.04})
+    return fig
+
+FINDER_SORT_OPTIONS = ("Remedied Score (Highest First)", "Raw Score (Lowest First)", "Raw Score (Highest First)")
+
+def filter_and_sort_matches(matches, show_risky=False, sort_order="Raw Score (Highest First)"):
+    # Same filter/sort the Find Matches tab applies before rendering & CSV export
+    filtered = [m for m in matches if show_risky or not m['IsRisky']]
+    if sort_order == "Raw Score (Lowest First)":
+        return sorted(filtered, key=lambda x: x['Raw Score'])
+    elif sort_order == "Raw Score (Highest First)":
+        return sorted(filtered, key=lambda x: x['Raw Score'], reverse=True)
+    return sorted(filtered, key=lambda x: x['Final Remedied Score'], reverse=True)
+
+# --- AI BACKEND (Gemini, or the offline stand-in via VEDIC_AI_BACKEND) ---
+get_working_model = ai_backends.get_working_model
+
+def _ai_error_text(e):
+    if isinstance(e, ai_scheduler.QueueFull):
+        return f"⏳ **Guru is busy:** Lots of questions right now. Please try again in {max(1, round(e.retry_after))} seconds."
+    if "429" in str(e): return "⚠️ **Quota Exceeded:** You are clicking too fast! Please wait 60 seconds."
+    return f"AI Error: {str(e)}"
+
+@metrics.timed("handle_ai_query")
 def handle_ai_query(prompt, context_str, key):
+    # Shared scheduler: queues under the per-key rate limit, retries transient errors, merges duplicate prompts
+    backend = ai_backends.get_backend()
     try:
-        model_name = get_working_model(key); model = genai.GenerativeModel(model_name)
-        chat = model.start_chat(history=[{"role": "user", "parts": [context_str]}, {"role": "model", "parts": ["I am your Vedic Astrologer."]}])
-        return chat.send_message(prompt).text
-    except Exception as e:
-        if "429" in str(e): return "⚠️ **Quota Exceeded:** You are clicking too fast! Please wait 60 seconds."
-        return f"AI Error: {str(e)}"
-
-# --- UI START ---
-c_title, c_reset = st.columns([4, 1])
-with c_title: st.title("🕉️ Vedic Matcher")
-with c_reset:
-    if st.button("🔄 Reset"):
-        for key in list(st.session_state.keys()): del st.session_state[key]
-        st.rerun()
+        return ai_scheduler.SCHEDULER.run(key, lambda: backend.reply(prompt, context_str, key), dedupe=(backend.name, context_str, prompt),
+                                          tokens=ai_scheduler.estimate_tokens(context_str, prompt))
+    except Exception as e: return _ai_error_text(e)
+
+def stream_ai_query(prompt, context_str, key):
+    """handle_ai_query as text chunks for st.write_stream."""
+    backend = ai_backends.get_backend()
+    with metrics.stage("handle_ai_query"):
+        try:
+            yield from ai_scheduler.SCHEDULER.stream(key, lambda: backend.stream(prompt, context_str, key),
+                                                     tokens=ai_scheduler.estimate_tokens(context_str, prompt))
+        except Exception as e: yield _ai_error_text(e)
+
+# --- MATCH RESULTS (compact session record -> display data) ---
+# Sessions keep only the record below; the full results (charts, logs, verdict text) are rebuilt on
+# demand and shared between sessions through a bounded LRU, as read-only views (dicts become
+# mappingproxies, lists tuples) so no session can change what another one is shown.
+#   ("birth",  pro_mode, (date, time, city, country), (date, time, city, country))
+#   ("direct", pro_mode, (nak, rashi, pada), (nak, rashi, pada))
+def get_match_results(record):
+    if record is None: return {}
+    today = datetime.date.today()  # dashas depend on today's date
+    # A birth place that did not geocode (Nominatim down) falls back to Delhi + manual TZ: rebuild such a
+    # match each time instead of sharing the degraded chart until it is evicted
+    if _has_unresolved_place(record): return _freeze(_build_match_results(record, today))
+    return _cached_match_results(record, today)
+
+def _has_unresolved_place(record):
+    mode, _, b_in, g_in = record
+    return mode == "birth" and any(p[2] and get_cached_coords(p[2], p[3]) is None for p in (b_in, g_in))
+
+def _freeze(value):
+    if isinstance(value, dict): return types.MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)): return tuple(_freeze(v) for v in value)
+    return value
+
+@functools.lru_cache(maxsize=session_memory.RESULTS_CACHE_SIZE)
+def _cached_match_results(record, today):
+    return _freeze(_build_match_results(record, today))
+
+def _build_match_results(record, today):
+    mode, pro_mode, b_in, g_in = record
+    b_planets, g_planets, b_d9, g_d9 = None, None, None, None
+    b_d9_rashi, g_d9_rashi = None, None
+    b_dasha_name, b_dasha_tone = "Unknown", ""
+    g_dasha_name, g_dasha_tone = "Unknown", ""
+    b_mars_result, g_mars_result = ("Skipped", "No Data"), ("Skipped", "No Data")
+
+    if mode == "birth":
+        b_date, b_time, b_city, b_country = b_in; g_date, g_time, g_city, g_country = g_in
+        # The boy's chart runs on the core pool so the two geocode / timezone lookups overlap
+        b_job = parallel.submit(get_planetary_positions, b_date, b_time, b_city, b_country, detailed=pro_mode)
+        g_moon, g_mars_l, _, _, g_chart, g_d9 = get_planetary_positions(g_date, g_time, g_city, g_country, detailed=pro_mode)
+        b_moon, b_mars_l, _, _, b_chart, b_d9 = b_job.result()
+        b_nak, b_rashi, b_pada = get_nak_rashi_pada(b_moon)
+        g_nak, g_rashi, g_pada = get_nak_rashi_pada(g_moon)
+    
+        b_d9_rashi = calculate_d9_position(b_moon)
+        g_d9_rashi = calculate_d9_position(g_moon)
+        b_planets, g_planets = b_chart, g_chart
+        b_mars_result = check_mars_dosha_smart(b_rashi, b_mars_l)
+        g_mars_result = check_mars_dosha_smart(g_rashi, g_mars_l)
+        if pro_mode:
+            b_dasha_name, b_dasha_tone = calculate_current_dasha(b_moon, b_date)
+            g_dasha_name, g_dasha_tone = calculate_current_dasha(g_moon, g_date)
+    else:
+        b_nak, b_rashi, b_pada_sel = b_in; g_nak, g_rashi, g_pada_sel = g_in
+    
+        # Direct Mode D9 Calculation
+        b_d9_rashi = get_d9_rashi_from_pada(b_nak, b_pada_sel)
+        g_d9_rashi = get_d9_rashi_from_pada(g_nak, g_pada_sel)
+    
+        b_mars = (False, "Unknown"); g_mars = (False, "Unknown")
+        # For display in report (direct mode)
+        b_pada = b_pada_sel
+        g_pada = g_pada_sel
+
+    # 1. Run the standard Koota/Rajju calculations
+    score, breakdown, logs, rajju, vedha, safety_override, b_rajju_label, g_rajju_label,rajju_reason = calculate_all(
+        b_nak, b_rashi, g_nak, g_rashi, b_d9_rashi, g_d9_rashi
+    )
+
+    # 2. Flag Kuja Dosha Mismatch (birth details carry both Mars placements; appended to any koota verdict)
+    if mode == "birth":
+        b_kuja, g_kuja = kuja.kuja_status(b_rashi, b_mars_l), kuja.kuja_status(g_rashi, g_mars_l)
+        if not kuja.is_compatible(b_kuja, g_kuja):
+            prefix = f"{safety_override} + " if safety_override else ""
+            safety_override = f"{prefix}Risky Match ({'Boy' if b_kuja == kuja.DOSHA else 'Girl'} has Kuja Dosha) ❌"
+
+    raw_score = sum(row[1] for row in breakdown)
+    rank = match_rank(score, raw_score, b_nak, b_d9_rashi, g_nak, g_d9_rashi)
+
+    b_obs, g_obs = [], []
+    if pro_mode and b_planets:
+        b_obs = analyze_aspects_and_occupation_rich(b_planets, b_rashi)
+        g_obs = analyze_aspects_and_occupation_rich(g_planets, g_rashi)
+
+    human_verdict = generate_human_verdict(score, rajju, b_obs, g_obs, f"{b_dasha_name} ({b_dasha_tone})", f"{g_dasha_name} ({g_dasha_tone})")
+
+    # Store friendly names
+    b_rashi_name = RASHIS[b_rashi].split(" ")[0]
+    g_rashi_name = RASHIS[g_rashi].split(" ")[0]
+
+    return {
+        "score": score, "raw_score": raw_score, "bd": breakdown, "logs": logs, 
+        "b_n": NAKSHATRAS[b_nak], "g_n": NAKSHATRAS[g_nak],
+        "b_info": f"{NAKSHATRAS[b_nak]} ({b_rashi_name}, Pada {b_pada})",
+        "g_info": f"{NAKSHATRAS[g_nak]} ({g_rashi_name}, Pada {g_pada})",
+        "b_mars": b_mars_result, "g_mars": g_mars_result,
+        "rajju": rajju, "vedha": vedha,"rajju_reason": rajju_reason,
+        "b_rajju_label": b_rajju_label,
+        "g_rajju_label": g_rajju_label,
+        "b_planets": b_planets, "g_planets": g_planets,
+        "b_d9": b_d9, "g_d9": g_d9,
+        "verdict": human_verdict, "b_obs": b_obs, "g_obs": g_obs,
+        "b_dasha": f"{b_dasha_name}", "g_dasha": f"{g_dasha_name}",
+        "safety": safety_override, "rank": rank
+    }
 
-tabs = st.tabs(["❤️ Match", "🔍 Find Matches", "💍 Wedding Dates", "🤖 Guru AI"])
 
-# --- TAB 1: MATCH ---
-with tabs[0]:
+# --- ON-DEMAND PROFILING (?profile=cprofile|sample, or armed for one action from the ?debug=1 panel) ---
+# A slow click can be captured as it happens and downloaded (.pstats / speedscope JSON): the wrapped
+# action's engine work (charts, calculate_all, pool threads), its rendering and any AI call it makes.
+def profile_mode():
+    mode = st.query_params.get("profile") or st.session_state.get("profile_next")
+    if mode in ("1", "true"): mode = "cprofile"
+    return mode if mode in profiler.MODES else None
+
+@contextlib.contextmanager
+def profiled(label, carry=False):
+    """Profiles the block when armed, else a no-op. carry=True keeps the capture open across the
+    st.rerun the block ends with; continue_profile() on the next run adds the render and finishes it."""
+    mode = profile_mode()
+    if mode is None or profiler.active() is not None:
+        yield None; return
+    st.session_state.pop("profile_next", None)  # the debug-panel arm covers one action
+    cap = profiler.Capture(label, mode)
+    try:
+        with cap.resume(): yield cap
+    except Exception:
+        cap.finish(); raise
+    finally:  # st.rerun() leaves as a BaseException, so this is where a carried capture is parked
+        if not cap.finished:
+            if carry: st.session_state.profile_open = cap
+            else: cap.finish()
+
+@contextlib.contextmanager
+def continue_profile():
+    cap = st.session_state.pop("profile_open", None)
+    if cap is None or cap.finished:
+        yield None; return
+    try:
+        with cap.resume(): yield cap
+    finally: cap.finish()
+
+def pdf_bytes(res, pitch, mode=None):
+    if mode is None: return generate_pdf(res, pitch=pitch) or b""
+    with profiler.capture("pdf", mode): return generate_pdf(res, pitch=pitch) or b""
+
+def render_profiles():
+    st.caption("Profiles (newest first; open .pstats with snakeviz, .json at speedscope.app)")
+    caps = profiler.recent()
+    if not caps: st.caption("None yet: run an action with profiling armed.")
+    for cap in caps:
+        st.download_button(f"⬇️ {cap.label} · {cap.mode}{' (cProfile busy)' if cap.mode != cap.requested else ''} · {cap.seconds * 1000:.0f} ms", data=cap.data, file_name=cap.filename,
+                           mime=cap.mime, key=f"prof_dl_{cap.id}")
+    if caps: st.code(caps[0].summary or "(no samples)", language="text")
+
+
+# --- CITY AUTOCOMPLETE (offline gazetteer) ---
+def _pick_city(city_key, country_key, place):
+    st.session_state[city_key] = place.name; st.session_state[country_key] = place.country
+
+def render_city_hint(city, country, city_key, country_key):
+    """Shows where a City / Country pair will resolve, with one-click fixes for typos and partial names."""
+    if not city: return
+    place = gazetteer.lookup(city, country)
+    if place is not None:
+        st.caption(f"📍 {place.label} · {place.tz}"); return
+    options = gazetteer.suggest(city, country, limit=3)
+    best = gazetteer.closest(city, country)
+    st.caption("🌐 Not in the offline city list: will be looked up online" + (f" · did you mean {best.label}?" if best else ""))
+    if options:
+        cols = st.columns(len(options))
+        for col, p in zip(cols, options):
+            col.button(p.label, key=f"{city_key}_pick_{p.id}", on_click=_pick_city, args=(city_key, country_key, p))
+
+
+# --- TABS (fragments) ---
+# Each tab is a fragment: a widget inside one tab reruns only that tab, so typing in the Guru chat or
+# re-sorting the finder no longer re-renders the Match tab's gauges, charts and tables. Actions that
+# change what other tabs show (a new match) still trigger a full app rerun. Per-tab cost shows up as
+# tab_* stages in the ?debug=1 panel.
+@st.fragment
+@metrics.timed("tab_match")
+def render_match_tab():
     input_method = st.radio("Mode:", ["Birth Details", "Direct Star Entry"], horizontal=True, key="input_mode")
     pro_mode = st.toggle("✨ Generate Full Horoscopes (Pro Feature)", value=True)
-    
+    lite_gauges = st.toggle("⚡ Lightweight Gauges (faster on mobile)", value=True, key="lite_gauges")
+
     if input_method == "Birth Details":
         c1, c2 = st.columns(2)
         with c1:
             st.markdown("### 🤵 Boy")
             b_date = st.date_input("Date", datetime.date(1995,1,1), key="b_d")
             b_time = st.time_input("Time", datetime.time(10,0), step=60, key="b_t")
-            b_city = st.text_input("City", "Hyderabad", key="b_c")
-            b_country = st.text_input("Country", "India", key="b_co")
+            b_city = st.text_input("City", key="b_c")
+            b_country = st.text_input("Country", key="b_co")
+            render_city_hint(b_city, b_country, "b_c", "b_co")
         with c2:
             st.markdown("### 👰 Girl")
             g_date = st.date_input("Date", datetime.date(1994,11,28), key="g_d")
             g_time = st.time_input("Time", datetime.time(7,35), step=60, key="g_t")
-            g_city = st.text_input("City", "Hyderabad", key="g_c")
-            g_country = st.text_input("Country", "India", key="g_co")
+            g_city = st.text_input("City", key="g_c")
+            g_country = st.text_input("Country", key="g_co")
+            render_city_hint(g_city, g_country, "g_c", "g_co")
         st.markdown("---")
     else:
         st.info("ℹ️ **Note:** Advanced Horoscope features are available only with full Birth Details.")
@@ -884,121 +1034,44 @@ with tabs[0]:
 
     if st.button("Check Compatibility", type="primary", use_container_width=True):
         try:
-            with st.spinner("Analyzing..."):
-                b_planets, g_planets, b_d9, g_d9 = None, None, None, None
-                b_d9_rashi, g_d9_rashi = None, None
-                b_dasha_name, b_dasha_tone = "Unknown", ""
-                g_dasha_name, g_dasha_tone = "Unknown", ""
-                b_mars_result, g_mars_result = ("Skipped", "No Data"), ("Skipped", "No Data")
-                
+            with st.spinner("Analyzing..."), profiled("check_compatibility", carry=True):
                 if input_method == "Birth Details":
-                    b_moon, b_mars_l, _, _, b_chart, b_d9 = get_planetary_positions(b_date, b_time, b_city, b_country, detailed=pro_mode)
-                    g_moon, g_mars_l, _, _, g_chart, g_d9 = get_planetary_positions(g_date, g_time, g_city, g_country, detailed=pro_mode)
-                    b_nak, b_rashi, b_pada = get_nak_rashi_pada(b_moon)
-                    g_nak, g_rashi, g_pada = get_nak_rashi_pada(g_moon)
-                    
-                    b_d9_rashi = calculate_d9_position(b_moon)
-                    g_d9_rashi = calculate_d9_position(g_moon)
-                    b_planets, g_planets = b_chart, g_chart
-                    b_mars_result = check_mars_dosha_smart(b_rashi, b_mars_l)
-                    g_mars_result = check_mars_dosha_smart(g_rashi, g_mars_l)
-                    if pro_mode:
-                        b_dasha_name, b_dasha_tone = calculate_current_dasha(b_moon, b_date)
-                        g_dasha_name, g_dasha_tone = calculate_current_dasha(g_moon, g_date)
+                    record = ("birth", pro_mode, (b_date, b_time, b_city, b_country), (g_date, g_time, g_city, g_country))
                 else:
-                    b_nak = NAKSHATRAS.index(b_star); b_rashi = RASHIS.index(b_rashi_sel)
-                    g_nak = NAKSHATRAS.index(g_star); g_rashi = RASHIS.index(g_rashi_sel)
-                    
-                    # Direct Mode D9 Calculation
-                    b_d9_rashi = get_d9_rashi_from_pada(b_nak, b_pada_sel)
-                    g_d9_rashi = get_d9_rashi_from_pada(g_nak, g_pada_sel)
-                    
-                    b_mars = (False, "Unknown"); g_mars = (False, "Unknown")
-                    # For display in report (direct mode)
-                    b_pada = b_pada_sel
-                    g_pada = g_pada_sel
-
-               # --- Inside the "Check Compatibility" button logic ---
-
-                # 1. Run the standard Koota/Rajju calculations
-                score, breakdown, logs, rajju, vedha, safety_override, b_rajju_label, g_rajju_label,rajju_reason = calculate_all(
-                    b_nak, b_rashi, g_nak, g_rashi, b_d9_rashi, g_d9_rashi
-                )
-                
-                # 2. NEW: Flag Kuja Dosha Mismatch as Risky
-                # 2. Flag Kuja Dosha Mismatch (Appends to safety_override if it exists)
-                #b_has_dosha = b_mars_result[0] if isinstance(b_mars_result, tuple) else False
-                #g_has_dosha = g_mars_result[0] if isinstance(g_mars_result, tuple) else False
-            
-                #if (b_has_dosha and not g_has_dosha):
-                 #   prefix = f"{safety_override} + " if safety_override else ""
-                  #  safety_override = f"{prefix}Risky Match (Boy has Kuja Dosha) ❌"
-                #if (g_has_dosha and not b_has_dosha):
-                 #   prefix = f"{safety_override} + " if safety_override else ""
-                  #  safety_override = f"{prefix}Risky Match (Girl has Kuja Dosha) ❌"
-                
-                raw_score = sum(row[1] for row in breakdown)
-                
-                b_obs, g_obs = [], []
-                if pro_mode and b_planets:
-                    b_obs = analyze_aspects_and_occupation_rich(b_planets, b_rashi)
-                    g_obs = analyze_aspects_and_occupation_rich(g_planets, g_rashi)
-                
-                human_verdict = generate_human_verdict(score, rajju, b_obs, g_obs, f"{b_dasha_name} ({b_dasha_tone})", f"{g_dasha_name} ({g_dasha_tone})")
-                
-                # Store friendly names
-                b_rashi_name = RASHIS[b_rashi].split(" ")[0]
-                g_rashi_name = RASHIS[g_rashi].split(" ")[0]
-
-                st.session_state.results = {
-                    "score": score, "raw_score": raw_score, "bd": breakdown, "logs": logs, 
-                    "b_n": NAKSHATRAS[b_nak], "g_n": NAKSHATRAS[g_nak],
-                    "b_info": f"{NAKSHATRAS[b_nak]} ({b_rashi_name}, Pada {b_pada})",
-                    "g_info": f"{NAKSHATRAS[g_nak]} ({g_rashi_name}, Pada {g_pada})",
-                    "b_mars": b_mars_result, "g_mars": g_mars_result,
-                    "rajju": rajju, "vedha": vedha,"rajju_reason": rajju_reason,
-                    "b_rajju_label": b_rajju_label,
-                    "g_rajju_label": g_rajju_label,
-                    "b_planets": b_planets, "g_planets": g_planets,
-                    "b_d9": b_d9, "g_d9": g_d9,
-                    "verdict": human_verdict, "b_obs": b_obs, "g_obs": g_obs,
-                    "b_dasha": f"{b_dasha_name}", "g_dasha": f"{g_dasha_name}",
-                    "safety": safety_override
-                }
+                    record = ("direct", pro_mode, (NAKSHATRAS.index(b_star), RASHIS.index(b_rashi_sel), b_pada_sel),
+                              (NAKSHATRAS.index(g_star), RASHIS.index(g_rashi_sel), g_pada_sel))
+                get_match_results(record)  # build now so errors show on this click
+                st.session_state.match_record = record
                 st.session_state.calculated = True
                 st.session_state.ai_pitch = ""
+            st.rerun()  # full rerun: the Guru AI tab picks up the new match context
         except Exception as e: st.error(f"Error: {e}")
 
     if st.session_state.calculated:
-        res = st.session_state.results
+        res = get_match_results(st.session_state.match_record)
         st.markdown("---")
         score_val = res['score']; score_color = "#ff4b4b"
         if score_val >= 18: score_color = "#ffa500"
         if score_val >= 25: score_color = "#00cc00"
-        
+
         # Override Color if Risky
         safety_val = res.get('safety')
         if safety_val and safety_val.startswith("Risky Match"):
             score_color = "#ff4b4b" # Force Red
 
+        import pandas as pd
         c1, c2 = st.columns([1, 1])
         with c1:
-             st.markdown(f"<div class='gauge-title' style='color:#888;'>Base Score</div>", unsafe_allow_html=True)
-             fig_base = go.Figure(go.Indicator(
-                mode = "gauge+number", value = res['raw_score'],
-                gauge = {'axis': {'range': [0, 36]}, 'bar': {'color': "#cccccc"}}
-            ))
-             fig_base.update_layout(height=180, margin=dict(l=30, r=30, t=10, b=10)) 
-             st.plotly_chart(fig_base, use_container_width=True)
+            if lite_gauges: st.markdown(render_gauge_html(res['raw_score'], "#cccccc", "Base Score"), unsafe_allow_html=True)
+            else:
+                st.markdown(f"<div class='gauge-title' style='color:#888;'>Base Score</div>", unsafe_allow_html=True)
+                st.plotly_chart(build_gauge_figure(res['raw_score'], "#cccccc"), use_container_width=True)
 
         with c2:
-             st.markdown(f"<div class='gauge-title' style='color:{score_color};'>Remedied Score</div>", unsafe_allow_html=True)
-             fig_rem = go.Figure(go.Indicator(
-                mode = "gauge+number", value = res['score'],
-                gauge = {'axis': {'range': [0, 36]}, 'bar': {'color': score_color}}
-            ))
-             fig_rem.update_layout(height=180, margin=dict(l=30, r=30, t=10, b=10))
-             st.plotly_chart(fig_rem, use_container_width=True)
+            if lite_gauges: st.markdown(render_gauge_html(res['score'], score_color, "Remedied Score", score_color), unsafe_allow_html=True)
+            else:
+                st.markdown(f"<div class='gauge-title' style='color:{score_color};'>Remedied Score</div>", unsafe_allow_html=True)
+                st.plotly_chart(build_gauge_figure(res['score'], score_color), use_container_width=True)
 
         st.markdown("##### 🛡️ Applied Remedies (Dosha Bhanga)")
         if res['logs']:
@@ -1008,46 +1081,53 @@ with tabs[0]:
             st.info("No special cancellations (remedies) were needed. The Base Score is the Final Score.")
 
         status = "Excellent Match ✅" if res['score'] > 24 else ("Good Match ⚠️" if res['score'] > 18 else "Not Recommended ❌")
-        
-        # Override Status if Risky
-        if res.get('safety') == "Risky Match (Double Dosha) ❌":
+
+        # Override Status if Risky (the first verdict wins when a Kuja mismatch was appended to it)
+        first_verdict = (res.get('safety') or "").split(" + ")[0]
+        if first_verdict == "Risky Match (Double Dosha) ❌":
             status = "Risky Match ❌ (Zero Bhakoot + Zero Nadi)"
-        if res.get('safety') == "Risky Match (Rajju Dosha) ❌":
+        if first_verdict == "Risky Match (Rajju Dosha) ❌":
             status = "Risky Match ❌ (Rajju Dosha)"
-        if res.get('safety') == "Risky Match (Vedha Dosha) ❌":
+        if first_verdict == "Risky Match (Vedha Dosha) ❌":
             status = "Risky Match ❌ (Vedha Dosha)"
-        #if res.get('safety') == "Risky Match (Boy has Kuja Dosha) ❌":
-         #   status = "Risky Match ❌ (Boy has Kuja Dosha)"
-        #if res.get('safety') == "Risky Match (Girl has Kuja Dosha) ❌":
-         #   status = "Risky Match ❌ (Girl has Kuja Dosha)"
-            
-        
+        if first_verdict == "Risky Match (Boy has Kuja Dosha) ❌":
+            status = "Risky Match ❌ (Boy has Kuja Dosha)"
+        if first_verdict == "Risky Match (Girl has Kuja Dosha) ❌":
+            status = "Risky Match ❌ (Girl has Kuja Dosha)"
+
+
         st.markdown(f"""
         <div style="background-color: {score_color}20; border: 2px solid {score_color}; padding: 10px; border-radius: 10px; margin-top: 10px; text-align: center;">
             <h3 style="color: {score_color}; margin: 0; font-size: 24px;">{status}</h3>
         </div>
         """, unsafe_allow_html=True)
 
+        rank = res.get("rank")
+        if rank:
+            better = "" if rank["better_for_boy"] is None or rank["better_for_girl"] is None else (
+                f" · {rank['better_for_boy']} of 108 girl padas would score higher with him, {rank['better_for_girl']} of 108 boy padas with her")
+            st.caption(f"📊 Percentile {rank['percentile']:.0f} among all possible couples (base score: {rank['raw_percentile']:.0f}){better}")
+
         share_text = f"Match Report: {res['b_info']} w/ {res['g_info']}. Score: {res['score']}/36. {status}"
         st.code(share_text, language="text")
         st.caption("👆 Copy to share on WhatsApp")
-        
+
         st.markdown(f"""
         <div class="verdict-box">
             <div class="verdict-title">🤖 AI Astrologer's Verdict</div>
             {res['verdict']}
         </div>
         """, unsafe_allow_html=True)
-        
+
         if res.get('b_planets') and res.get('g_planets'):
             st.markdown("### 🌌 Chart Synergy & Elevator Pitch")
             shared_links = get_shared_positions(res['b_planets'], res['g_planets'])
             if shared_links:
                 st.info("🔗 **Cosmic Links Found:**\n" + "\n".join([f"- {s}" for s in shared_links]))
-            
+
             if st.session_state.ai_pitch:
                 st.markdown(f"""<div class="synergy-box"><strong>✨ Karmic Connection (AI Insight):</strong><br>{st.session_state.ai_pitch}</div>""", unsafe_allow_html=True)
-            
+
             if st.session_state.api_key:
                 if st.button("🔮 Reveal Karmic Connection (AI)"):
                     with st.spinner("Channeling cosmic wisdom..."):
@@ -1059,9 +1139,9 @@ with tabs[0]:
                         Girl: {g_str}
                         Write a 3-4 sentence 'elevator pitch' summarizing the core dynamic, spiritual potential, and karmic connection between them. Focus on the 'Why', not just the 'What'.
                         """
-                        pitch = handle_ai_query(prompt, "You are a Vedic Astrologer.", st.session_state.api_key)
+                        with profiled("ai_pitch"): pitch = handle_ai_query(prompt, "You are a Vedic Astrologer.", st.session_state.api_key)
                         st.session_state.ai_pitch = pitch
-                        st.rerun()
+                        st.rerun(scope="fragment")
             else:
                 st.caption("🔒 *Add API Key in 'Guru AI' tab to unlock the detailed spiritual elevator pitch.*")
 
@@ -1080,17 +1160,13 @@ with tabs[0]:
             st.info("💡 Tip: Enable 'Generate Full Horoscopes' to see visual charts.")
 
         st.markdown("### 📋 Quick Scan")
-        for item in res['bd']:
-            attr, raw, final, max_pts, reason = item
-            border_class = "border-green" if final == max_pts else ("border-orange" if final > 0 else "border-red")
-            text_class = "text-green" if final == max_pts else ("text-orange" if final > 0 else "text-red")
-            st.markdown(f"""<div class="guna-card {border_class}"><div class="guna-header"><span>{attr}</span><span class="guna-score {text_class}">{final} / {max_pts}</span></div><div class="guna-reason">{reason}</div></div>""", unsafe_allow_html=True)
-            
+        st.markdown(render_quick_scan(tuple(tuple(item) for item in res['bd'])), unsafe_allow_html=True)
+
         with st.expander("📊 Detailed Transparency Table (Raw vs Final)"):
             df = pd.DataFrame(res['bd'], columns=["Attribute", "Raw Score", "Final Remedied Score", "Max", "Logic"])
             totals = pd.DataFrame([["TOTAL", df["Raw Score"].sum(), df["Final Remedied Score"].sum(), 36, "-"]], columns=df.columns)
             st.table(pd.concat([df, totals], ignore_index=True))
-        
+
         with st.expander("🪐 Mars & Dosha Analysis"):
             # 1. Display Specific Rajju Names
             c_r1, c_r2 = st.columns(2)
@@ -1098,33 +1174,33 @@ with tabs[0]:
                 st.write(f"**Boy Rajju:** {res.get('b_rajju_label', 'N/A')}")
             with c_r2:
                 st.write(f"**Girl Rajju:** {res.get('g_rajju_label', 'N/A')}")
-            
+
             st.divider()
-        
+
             # 2. Show the Overall Rajju Status and Detailed Reason
             status_color = "red" if res['rajju'] == "Fail" else ("orange" if res['rajju'] == "Cancelled" else "green")
-            
+
             st.markdown(f"**Overall Rajju Match:** <span style='color:{status_color}; font-weight:bold;'>{res['rajju']}</span>", unsafe_allow_html=True)
-            
+
             # This info box tells the user WHY it was cancelled (e.g., Graha Maitri)
             st.info(f"💡 {res.get('rajju_reason', 'No Rajju Dosha detected.')}")
-            
+
             # 3. Show Vedha Status
             v_color = "red" if res['vedha'] == "Fail" else "green"
             st.markdown(f"**Vedha (Enemy Check):** <span style='color:{v_color}; font-weight:bold;'>{res['vedha']}</span>", unsafe_allow_html=True)
-            
+
             st.divider()
-        
+
             # 4. Mars (Mangal) Section
             bm = res['b_mars'][1] if isinstance(res['b_mars'], tuple) else res['b_mars']
             gm = res['g_mars'][1] if isinstance(res['g_mars'], tuple) else res['g_mars']
-            
+
             st.write(f"**Boy Mars Analysis:** {bm}")
             st.write(f"**Girl Mars Analysis:** {gm}")
-            
+
             b_is_dosha = res['b_mars'][0] if isinstance(res['b_mars'], tuple) else False
             g_is_dosha = res['g_mars'][0] if isinstance(res['g_mars'], tuple) else False
-            
+
             if b_is_dosha and g_is_dosha: 
                 st.success("🔥➕🔥 **Perfect Match:** Both have high energy (Manglik). Your intensities match perfectly.")
             elif not b_is_dosha and not g_is_dosha: 
@@ -1132,23 +1208,24 @@ with tabs[0]:
             else: 
                 st.warning("🔥⚡✨ **Energy Mismatch:** One is High Intensity, one is Calm. This requires active adjustment.")
 
-    try:
-        if st.button("📄 Download Full Report"):
-            pdf_bytes = generate_pdf(res)
-            st.download_button("Click to Save PDF", data=pdf_bytes, file_name="Vedic_Match_Report.pdf", mime="application/pdf")
-    except Exception as e: st.error(f"PDF Error: {e}")
+        # Built on click (fpdf is imported then, not at page load); the template fill is cheap and cached per report
+        try:
+            pitch_now = st.session_state.ai_pitch
+            st.download_button("📄 Download Full Report", data=lambda mode=profile_mode(): pdf_bytes(res, pitch_now, mode), file_name="Vedic_Match_Report.pdf", mime="application/pdf")
+        except Exception as e: st.error(f"PDF Error: {e}")
 
-# --- OTHER TABS ---
-with tabs[1]:
+@st.fragment
+@metrics.timed("tab_finder")
+def render_finder_tab():
     st.header("🔍 Match Finder"); st.caption("Find the best compatible stars for you.")
-    
+
     # Sort Controls
     c_sort1, c_sort2 = st.columns(2)
     with c_sort1:
         show_risky = st.checkbox("Show Risky Matches (Caution!)", value=False)
     with c_sort2:
-        sort_order = st.radio("Sort Results By:", ["Remedied Score (Highest First)", "Raw Score (Lowest First)", "Raw Score (Highest First)"], index=2, horizontal=True)
-    
+        sort_order = st.radio("Sort Results By:", FINDER_SORT_OPTIONS, index=2, horizontal=True)
+
     col_f1, col_f2 = st.columns(2)
     with col_f1: 
         finder_gender = st.selectbox("I am a", ["Boy", "Girl"], index=1)
@@ -1156,39 +1233,30 @@ with tabs[1]:
         finder_pada = st.selectbox("My Pada", [1, 2, 3, 4], index=2, key="f_p") # Default to 3 (Index 2)
     with col_f2: 
         finder_rashi_opts = [RASHIS[i] for i in NAK_TO_RASHI_MAP[NAKSHATRAS.index(finder_star)]]
-        
+
         # Auto-select Virgo (Kanya) if available, else first
         def_rashi_index = 0
         for i, r in enumerate(finder_rashi_opts):
             if "Virgo" in r:
                 def_rashi_index = i
                 break
-                
+
         finder_rashi = st.selectbox("My Rashi", finder_rashi_opts, index=def_rashi_index)
-        
-    if st.button("Find Best Matches", type="primary"):
-        with st.spinner("Scanning..."):
-            matches = find_best_matches(finder_gender, NAKSHATRAS.index(finder_star), RASHIS.index(finder_rashi), finder_pada)
-            
-            # Filter Risky Matches Logic
-            filtered_matches = []
-            for m in matches:
-                if m['IsRisky'] and not show_risky:
-                    continue # Skip risky unless toggle is on
-                filtered_matches.append(m)
-            
-            # Apply Sorting
-            if sort_order == "Raw Score (Lowest First)":
-                filtered_matches = sorted(filtered_matches, key=lambda x: x['Raw Score'])
-            elif sort_order == "Raw Score (Highest First)":
-                filtered_matches = sorted(filtered_matches, key=lambda x: x['Raw Score'], reverse=True)
-            else: # Remedied Score (Highest First)
-                filtered_matches = sorted(filtered_matches, key=lambda x: x['Final Remedied Score'], reverse=True)
-                
+
+    # Once asked, results follow the inputs/toggles live: each change is an index lookup, not a rescan
+    if find_clicked := st.button("Find Best Matches", type="primary"): st.session_state.finder_active = True
+    if st.session_state.get("finder_active"):
+        with profiled("find_matches") if find_clicked else contextlib.nullcontext():
+            matches = lookup_best_matches(finder_gender, NAKSHATRAS.index(finder_star), RASHIS.index(finder_rashi), finder_pada)
+
+            # Filter Risky Matches + Apply Sorting
+            filtered_matches = filter_and_sort_matches(matches, show_risky, sort_order)
+
             st.success(f"Found {len(filtered_matches)} combinations!"); st.markdown("### Top Matches")
-            
+
             # Export CSV
             if filtered_matches:
+                import pandas as pd
                 df_export = pd.DataFrame(filtered_matches)
                 csv_data = to_csv(df_export)
                 st.download_button(label="📥 Download Results as CSV", data=csv_data, file_name="match_results.csv", mime="text/csv")
@@ -1201,44 +1269,69 @@ with tabs[1]:
                 table_html += "<th style='padding: 10px; text-align: center; width: 20%;'>Raw<br>Score</th>"
                 table_html += "<th style='padding: 10px; text-align: center; width: 20%;'>Remedied<br>Score</th></tr></thead>"
                 table_html += "<tbody>"
-                
+
                 for m in filtered_matches:
                     bg_style = "background-color: #ffe6e6;" if m['IsRisky'] else ""
                     table_html += f"<tr style='border-bottom: 1px solid #eee; {bg_style}'>"
                     table_html += f"<td style='padding: 10px; text-align: left; word-wrap: break-word;'>{m['Match Details']}</td>"
                     table_html += f"<td style='padding: 10px; text-align: center;'>{m['Raw Score']}</td>"
                     table_html += f"<td style='padding: 10px; text-align: center; font-weight: bold;'>{m['Final Remedied Score']}</td></tr>"
-                
+
                 table_html += "</tbody></table>"
                 st.markdown(table_html, unsafe_allow_html=True)
             else:
                 st.warning("No matches found with current filters. Try enabling 'Show Risky Matches'.")
 
-with tabs[2]:
+@st.fragment
+@metrics.timed("tab_heatmap")
+def render_heatmap_tab():
+    st.header("🗺️ Compatibility Heatmap"); st.caption("Every boy star (rows) against every girl star (columns) at a glance.")
+    c1, c2 = st.columns(2)
+    with c1: level = st.radio("Resolution", HEATMAP_LEVELS, horizontal=True, key="hm_level")
+    with c2: score_kind = st.radio("Score", ("Remedied", "Raw"), horizontal=True, key="hm_score")
+    overlays = st.multiselect("Overlays", HEATMAP_OVERLAYS, default=["Rajju", "Vedha"], key="hm_overlays")
+    # Drawn once asked (Plotly stays unloaded until then); after that every toggle is a cached figure
+    if st.button("Show Heatmap", type="primary"): st.session_state.heatmap_active = True
+    if not st.session_state.get("heatmap_active"): return
+    st.plotly_chart(build_heatmap_figure(level, score_kind, tuple(o for o in HEATMAP_OVERLAYS if o in overlays)), use_container_width=True)
+    if level == HEATMAP_LEVELS[0]: st.caption("Star cells average the 16 pada pairings; an overlay marks a star pair if any pairing has it.")
+
+    labels, m = get_compat_matrix()[level]
+    import pandas as pd
+    df = pd.DataFrame(m[score_kind], index=pd.Index(labels, name="Boy \\ Girl"), columns=labels)
+    st.download_button("📥 Download Matrix as CSV", data=to_csv(df, index=True), file_name=f"compatibility_{score_kind.lower()}.csv", mime="text/csv")
+
+@st.fragment
+@metrics.timed("tab_wedding")
+def render_wedding_tab():
     st.header("💍 Wedding Dates"); t_rashi = st.selectbox("Select Moon Sign (Rashi)", RASHIS, key="t_r")
     if st.button("Check Auspicious Dates"):
         r_idx = RASHIS.index(t_rashi); st.subheader("Lucky Years")
         for y, s in predict_marriage_luck_years(r_idx): st.write(f"**{y}:** {s}")
         st.subheader("Lucky Month"); st.info(f"❤️ **{predict_wedding_month(r_idx)}**")
 
-with tabs[3]:
+@st.fragment
+@metrics.timed("tab_guru")
+def render_guru_tab():
     st.header("🤖 Guru AI"); 
-    if st.secrets.get("GEMINI_API_KEY"):
+    if not ai_backends.get_backend().needs_key:
+        st.info(f"🧪 Offline AI stand-in active ({ai_backends.get_backend().name}): no API key needed.")
+    elif st.secrets.get("GEMINI_API_KEY"):
         st.success("✅ API Key Loaded from System Secrets")
         if not st.session_state.api_key: st.session_state.api_key = st.secrets["GEMINI_API_KEY"]
     else:
         user_key = st.text_input("API Key (aistudio.google.com)", type="password", value=st.session_state.api_key)
         if user_key: st.session_state.api_key = user_key
-    
+
     if st.button("🗑️ Clear Chat History"):
         st.session_state.messages = []
-        st.rerun()
-        
+        st.rerun(scope="fragment")
+
     context = "You are a Vedic Astrologer."
     suggestions = ["What are the 8 Kootas?", "Meaning of Nadi Dosha?", "Best wedding colors?"]
-    
+
     if st.session_state.calculated: 
-        r = st.session_state.results
+        r = get_match_results(st.session_state.match_record)
         st.success(f"🧠 **Context Loaded:** {r['b_n']} ❤️ {r['g_n']} (Score: {r['score']})")
         context += f" Match Context: Boy {r['b_n']}, Girl {r['g_n']}. Score: {r['score']}."
         if r.get('b_planets') and r.get('g_planets'):
@@ -1250,31 +1343,96 @@ with tabs[3]:
     for i, s in enumerate(suggestions): 
         if cols[i%3].button(s, use_container_width=True): clicked = s
     if st.session_state.api_key:
-        for m in st.session_state.messages: st.chat_message(m["role"]).write(m["content"])
+        for m in st.session_state.messages:
+            if m.get("compacted"): st.caption(m["content"])
+            else: st.chat_message(m["role"]).write(m["content"])
         if (prompt := st.chat_input("Ask about stars...")) or clicked:
             final_prompt = prompt if prompt else clicked
-            st.session_state.messages.append({"role": "user", "content": final_prompt}); st.chat_message("user").write(final_prompt)
+            session_memory.append_message(st.session_state.messages, "user", final_prompt); st.chat_message("user").write(final_prompt)
             with st.chat_message("assistant"):
-                with st.spinner("Thinking..."):
-                    ans = handle_ai_query(final_prompt, context, st.session_state.api_key)
-                    st.write(ans); st.session_state.messages.append({"role": "assistant", "content": ans})
-
-st.divider()
-with st.expander("ℹ️ How to Read Results & Disclaimer"):
-    st.markdown("""
-    ### **1. The Score (Gunas)**
-    * **18-24:** Good Match.
-    * **25-36:** Excellent Match.
-    * **Below 18:** Not recommended without remedies.
-
-    ### **2. The Critical Checks (Doshas)**
-    * **Rajju (Body):** Must be 'Pass'. Indicates physical safety.
-    * **Vedha (Enemy):** Must be 'Pass'. Indicates conflict.
-    * **Nadi (Genes):** Critical for health/lineage.
-
-    ### **3. Mars (Mangal) Dosha**
-    * Checks if Mars energy is balanced between the couple.
-    * *Note: This app automatically checks for cancellations (e.g., Mars in own house).*
-    """)
-    st.caption("----------------------------------------------------------------")
-    st.caption("⚠️ **Disclaimer:** This tool combines North Indian Ashta Koota and South Indian Das Porutham logic. AI features are powered by Google Gemini. Calculations are based on Lahiri Ayanamsa. This is for informational purposes only; please consult a human astrologer for final marriage decisions.")
+                with profiled("guru_chat"): ans = st.write_stream(stream_ai_query(final_prompt, context, st.session_state.api_key))
+                session_memory.append_message(st.session_state.messages, "assistant", ans if isinstance(ans, str) else "".join(map(str, ans)))
+
+def main():
+    # --- 1. PAGE CONFIG ---
+    st.set_page_config(page_title="Vedic Matcher Pro", page_icon="🕉️", layout="wide")
+
+    # --- 2. CSS STYLING (UPDATED TO HIDE TOOLBAR) ---
+    st.markdown(APP_CSS, unsafe_allow_html=True)
+
+    # --- 3. SESSION STATE ---
+    if "calculated" not in st.session_state: st.session_state.calculated = False
+    if "match_record" not in st.session_state: st.session_state.match_record = None
+    if "messages" not in st.session_state: st.session_state.messages = []
+    if "input_mode" not in st.session_state: st.session_state.input_mode = "Birth Details"
+    if "api_key" not in st.session_state: st.session_state.api_key = "" if ai_backends.get_backend().needs_key else ai_backends.get_backend().name
+    if "ai_pitch" not in st.session_state: st.session_state.ai_pitch = ""
+    for key, default in (("b_c", "Hyderabad"), ("b_co", "India"), ("g_c", "Hyderabad"), ("g_co", "India")):  # set from city suggestions too
+        if key not in st.session_state: st.session_state[key] = default
+
+    # --- UI START ---
+    c_title, c_reset = st.columns([4, 1])
+    with c_title: st.title("🕉️ Vedic Matcher")
+    with c_reset:
+        if st.button("🔄 Reset"):
+            for key in list(st.session_state.keys()): del st.session_state[key]
+            st.rerun()
+
+    tabs = st.tabs(["❤️ Match", "🔍 Find Matches", "🗺️ Heatmap", "💍 Wedding Dates", "🤖 Guru AI"])
+
+    with tabs[0], continue_profile(): render_match_tab()  # the results render after a profiled Check Compatibility
+    with tabs[1]: render_finder_tab()
+    with tabs[2]: render_heatmap_tab()
+    with tabs[3]: render_wedding_tab()
+    with tabs[4]: render_guru_tab()
+
+    st.divider()
+    with st.expander("ℹ️ How to Read Results & Disclaimer"):
+        st.markdown("""
+        ### **1. The Score (Gunas)**
+        * **18-24:** Good Match.
+        * **25-36:** Excellent Match.
+        * **Below 18:** Not recommended without remedies.
+
+        ### **2. The Critical Checks (Doshas)**
+        * **Rajju (Body):** Must be 'Pass'. Indicates physical safety.
+        * **Vedha (Enemy):** Must be 'Pass'. Indicates conflict.
+        * **Nadi (Genes):** Critical for health/lineage.
+
+        ### **3. Mars (Mangal) Dosha**
+        * Checks if Mars energy is balanced between the couple.
+        * *Note: This app automatically checks for cancellations (e.g., Mars in own house).*
+        """)
+        st.caption("----------------------------------------------------------------")
+        st.caption("⚠️ **Disclaimer:** This tool combines North Indian Ashta Koota and South Indian Das Porutham logic. AI features are powered by Google Gemini. Calculations are based on Lahiri Ayanamsa. This is for informational purposes only; please consult a human astrologer for final marriage decisions.")
+
+    if st.query_params.get("profile") and st.query_params.get("debug") != "1":
+        with st.expander(f"🧪 Profiling is on ({profile_mode() or 'unknown mode'})"): render_profiles()
+
+    # --- HIDDEN DEBUG PANEL (?debug=1) ---
+    if st.query_params.get("debug") == "1":
+        with st.expander("🛠️ Debug: Pipeline Timings"):
+            if st.toggle("Record stage timings", value=metrics.is_enabled(), key="dbg_metrics"): metrics.enable()
+            else: metrics.disable()
+            if st.button("Reset counters", key="dbg_reset"): metrics.reset()
+            st.json(metrics.snapshot())
+            st.caption("AI scheduler"); st.json(ai_scheduler.SCHEDULER.snapshot())
+            st.caption(f"Match rules: {RULE_PROFILE.title} (VEDIC_RULE_PROFILE)")
+            c_p1, c_p2 = st.columns(2)
+            if c_p1.button("Profile next action (cProfile)", key="dbg_prof_c"): st.session_state.profile_next = "cprofile"
+            if c_p2.button("Profile next action (sampling)", key="dbg_prof_s"): st.session_state.profile_next = "sample"
+            if st.session_state.get("profile_next"): st.caption(f"Armed: the next Check Compatibility / Find Matches / AI / PDF runs under {st.session_state.profile_next}")
+            render_profiles()
+            st.caption("This session's memory"); st.json(session_memory.session_report(st.session_state))
+            st.caption("Shared results cache"); st.json(_cached_match_results.cache_info()._asdict())
+            prom = metrics.render_prometheus()
+            st.download_button("Download Prometheus text", data=prom, file_name="vedic_metrics.prom", mime="text/plain")
+            st.code(prom, language="text")
+
+# Streamlit executes this script as __main__; plain imports (tests, CLI, workers) only get the engine.
+# Each rerun re-executes __main__ from scratch, so the page is drawn from the imported `app` module:
+# its lru caches, per-thread TimezoneFinders and worker pool then live for the whole process.
+if __name__ == "__main__":
+    try: import app as _engine
+    except ImportError: _engine = None
+    (_engine.main if _engine is not None else main)()
@@ -0,0 +1,56 @@
+"""Fixed-point longitudes: integer milli-arcseconds (mas) with exact zodiac boundaries.
+
+A nakshatra is exactly 48,000" and a pada / navamsa exactly 12,000", so once a longitude is an
+integer every division below is exact. Interactive charts, the finder tables and the bulk paths all
+derive nakshatra, pada, rashi and navamsa from the same integers, so a longitude can never land in
+one pada here and the neighbouring pada there.
+
+    mas = arcsec.to_mas(moon_long)
+    nak, rashi, pada = arcsec.nak_rashi_pada(mas)
+    naks, rashis, padas = arcsec.nak_rashi_pada_array(arcsec.to_mas_array(moons))
+
+Degrees are rounded to the nearest mas (half to even in both forms), so a float that sits on a
+boundary up to rounding noise (e.g. 10 / 3 * 11) counts as the later pada.
+"""
+MAS_PER_DEG = 3_600_000
+FULL_CIRCLE = 360 * MAS_PER_DEG
+RASHI_SPAN = 30 * MAS_PER_DEG
+NAK_SPAN = FULL_CIRCLE // 27      # 13 deg 20'
+PADA_SPAN = NAK_SPAN // 4         # 3 deg 20', also one navamsa
+
+# --- 1. SCALAR ---
+def to_mas(longitude):
+    return round(longitude * MAS_PER_DEG) % FULL_CIRCLE
+
+def to_degrees(mas):
+    return mas / MAS_PER_DEG
+
+def nak_rashi_pada(mas):
+    return mas // NAK_SPAN, mas // RASHI_SPAN, mas % NAK_SPAN // PADA_SPAN + 1
+
+def navamsa(mas):
+    # The n-th pada of the zodiac falls in navamsa sign n % 12 (Aries starts at Aries, Taurus at Capricorn, ...)
+    return mas // PADA_SPAN % 12
+
+def nak_fraction(mas):
+    """Share of the current nakshatra already traversed, 0 <= f < 1."""
+    return mas % NAK_SPAN / NAK_SPAN
+
+def pada_start(nak_idx, pada):
+    return nak_idx * NAK_SPAN + (pada - 1) * PADA_SPAN
+
+# --- 2. VECTORIZED ---
+def to_mas_array(longitudes):
+    import numpy as np
+    return np.rint(np.asarray(longitudes, dtype=float) * MAS_PER_DEG).astype(np.int64) % FULL_CIRCLE
+
+def nak_rashi_pada_array(mas):
+    """Same as nak_rashi_pada over an int64 array; returns three int8 arrays."""
+    import numpy as np
+    mas = np.asarray(mas, dtype=np.int64)
+    return ((mas // NAK_SPAN).astype(np.int8), (mas // RASHI_SPAN).astype(np.int8),
+            (mas % NAK_SPAN // PADA_SPAN + 1).astype(np.int8))
+
+def navamsa_array(mas):
+    import numpy as np
+    return (np.asarray(mas, dtype=np.int64) // PADA_SPAN % 12).astype(np.int8)
@@ -0,0 +1,251 @@
+"""Reproducible benchmark suite for the koota engine, finder, ephemeris and report paths.
+
+Usage:
+    python bench.py                                   # run everything, write bench_results.json
+    python bench.py --only calculate_all finder_all_slots
+    python bench.py --save-baseline                   # also store the run as bench_baseline.json
+    python bench.py --baseline bench_baseline.json    # compare, exit 1 on regressions
+    python bench.py --startup                         # cold-start report: app import vs. deferred features
+
+Each case is warmed up, then timed in samples of `batch` calls until `--seconds` of wall time is used.
+Latency percentiles are per call; ops/sec is calls per second of measured time.
+Geocoding is pre-warmed so the ephemeris cases measure ephem + sidereal math, not Nominatim; they bypass
+the on-disk chart cache except planetary_positions_disk_cached, which runs against a throwaway database.
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+DEFAULT_OUTPUT = "bench_results.json"
+DEFAULT_BASELINE = "bench_baseline.json"
+
+# --- 1. CASES ---
+def build_cases():
+    """name -> (callable, calls per sample). Imports app lazily so app_import can be timed cold."""
+    import app
+
+    couples = [(b, app.get_rashi_from_pada(b, bp), g, app.get_rashi_from_pada(g, gp), app.get_d9_rashi_from_pada(b, bp), app.get_d9_rashi_from_pada(g, gp))
+               for b in range(27) for g in range(27) for bp, gp in ((1, 3), (4, 2))]
+    state = {"i": 0}
+
+    def calc_one():
+        state["i"] = (state["i"] + 1) % len(couples)
+        app.calculate_all(*couples[state["i"]])
+
+    def finder_all_slots():
+        # Every one of the 108 source slots, as the Find Matches tab would scan them
+        for nak in range(27):
+            for pada in range(1, 5):
+                app.find_best_matches("Girl", nak, app.get_rashi_from_pada(nak, pada), pada)
+
+    app.get_finder_index()
+    def finder_lookup():
+        # Same 108 slots answered from the precomputed index
+        for nak in range(27):
+            for pada in range(1, 5):
+                app.lookup_best_matches("Girl", nak, app.get_rashi_from_pada(nak, pada), pada)
+
+    births = [(datetime.date(1970 + i % 40, 1 + i % 12, 1 + i % 28), datetime.time(i % 24, (i * 7) % 60)) for i in range(64)]
+    app.ephem_cache.configure(os.path.join(tempfile.mkdtemp(prefix="vedic-bench-"), "ephemeris.sqlite3"))
+    for d, t in births[:2]: app.get_planetary_positions(d, t, "Hyderabad", "India")  # warm geocode + tz caches
+
+    def ephem_basic():
+        state["i"] = (state["i"] + 1) % len(births)
+        d, t = births[state["i"]]
+        app.get_planetary_positions(d, t, "Hyderabad", "India", detailed=False, use_cache=False)
+
+    def ephem_detailed():
+        state["i"] = (state["i"] + 1) % len(births)
+        d, t = births[state["i"]]
+        app.get_planetary_positions(d, t, "Hyderabad", "India", detailed=True, use_cache=False)
+
+    def ephem_disk_cached():
+        # Re-opened profiles: every chart already in the on-disk ephemeris cache
+        state["i"] = (state["i"] + 1) % len(births)
+        d, t = births[state["i"]]
+        app.get_planetary_positions(d, t, "Hyderabad", "India", detailed=True)
+
+    moons = [(i * 13.7) % 360 for i in range(64)]
+    def dasha():
+        state["i"] = (state["i"] + 1) % len(moons)
+        app.calculate_current_dasha(moons[state["i"]], births[state["i"]][0])
+
+    score, bd, logs, *_ = app.calculate_all(*couples[0])
+    res = {"b_n": "Ashwini", "g_n": "Hasta", "bd": bd}
+    rows = tuple((app.clean_text(item[0]), app.clean_text(item[4])) for item in bd)
+    pitch = "A karmic bond ✨ built on shared values and patient growth. " * 6
+
+    import numpy as np
+    varga_lons = np.random.default_rng(7).uniform(0, 360, size=(1000, 10))  # 1000 people x 10 chart points
+    def varga_all():
+        app.varga.varga_signs(varga_lons)
+
+    # Guru AI chat path end to end against the offline stand-in (no key / network, unthrottled scheduler)
+    app.ai_backends.use(app.ai_backends.StandInBackend(latency=0, token_delay=0))
+    app.ai_scheduler.SCHEDULER = app.ai_scheduler.AIScheduler(rpm=1e9, tpm=1e12)
+    questions = ["What are the 8 Kootas?", "Meaning of Nadi Dosha?", "Remedies?", "Is this good for marriage?"]
+    def ai_chat_standin():
+        state["i"] += 1
+        app.handle_ai_query(questions[state["i"] % 4], f"Match Context: Boy Ashwini, Girl Hasta. Score: {state['i'] % 36}.", "standin")
+
+    def pdf_render():
+        # Uncached template fill: what the first download of a report costs
+        state["i"] += 1
+        app.render_pdf_bytes.__wrapped__(res["b_n"], res["g_n"], rows, app.clean_text(f"{pitch} {state['i']}"))
+
+    def pdf_cached():
+        app.generate_pdf(res, pitch=pitch)
+
+    return {
+        "calculate_all": (calc_one, 200),
+        "finder_all_slots": (finder_all_slots, 1),
+        "finder_lookup": (finder_lookup, 1),
+        "planetary_positions_basic": (ephem_basic, 20),
+        "planetary_positions_detailed": (ephem_detailed, 10),
+        "planetary_positions_disk_cached": (ephem_disk_cached, 10),
+        "current_dasha": (dasha, 200),
+        "varga_all_1000_people": (varga_all, 10),
+        "ai_chat_standin": (ai_chat_standin, 50),
+        "generate_pdf_render": (pdf_render, 10),
+        "generate_pdf_cached": (pdf_cached, 50),
+    }
+
+def time_app_import(samples=5):
+    """Cold `import app` in a fresh interpreter (includes every top-level import)."""
+    code = "import time; t=time.perf_counter(); import app; print(time.perf_counter()-t)"
+    env = dict(os.environ, PYTHONWARNINGS="ignore")
+    out = []
+    for _ in range(samples):
+        r = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)), env=env)
+        if r.returncode != 0: raise RuntimeError(r.stderr.strip().splitlines()[-1])
+        out.append(float(r.stdout.strip().splitlines()[-1]))
+    return out
+
+STARTUP_PROBE = """
+import importlib, json, time
+t0 = time.perf_counter(); import app; t1 = time.perf_counter()
+steps = []
+for feature, module in app.DEFERRED_IMPORTS.items():
+    t = time.perf_counter(); importlib.import_module(module); steps.append([feature, module, time.perf_counter() - t])
+print(json.dumps({"app": t1 - t0, "deferred": steps}))
+"""
+
+def startup_report(samples=5):
+    """Cold `import app` vs. what each deferred feature adds on its first use (median of fresh interpreters).
+    The deferred costs are incremental, so app + sum(deferred) is the old eager-import cold start."""
+    env = dict(os.environ, PYTHONWARNINGS="ignore")
+    runs = []
+    for _ in range(samples):
+        r = subprocess.run([sys.executable, "-c", STARTUP_PROBE], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)), env=env)
+        if r.returncode != 0: raise RuntimeError(r.stderr.strip().splitlines()[-1])
+        runs.append(json.loads(r.stdout.strip().splitlines()[-1]))
+    med = lambda xs: statistics.median(xs) * 1000
+    app_ms = med([r["app"] for r in runs])
+    deferred = [{"feature": f, "module": m, "first_use_ms": round(med([r["deferred"][i][2] for r in runs]), 1)}
+                for i, (f, m, _) in enumerate(runs[0]["deferred"])]
+    eager_ms = app_ms + sum(d["first_use_ms"] for d in deferred)
+    return {"app_import_ms": round(app_ms, 1), "eager_import_ms": round(eager_ms, 1),
+            "saved_ms": round(eager_ms - app_ms, 1), "deferred": deferred}
+
+def print_startup(rep):
+    print(f"Cold start (import app):        {rep['app_import_ms']:>8.1f} ms")
+    print(f"Eager equivalent (all imports): {rep['eager_import_ms']:>8.1f} ms")
+    print(f"Saved at cold start:            {rep['saved_ms']:>8.1f} ms ({rep['saved_ms'] / rep['eager_import_ms']:.0%})")
+    print(f"{'deferred feature':28} {'module':24} {'first use ms':>12}")
+    for d in rep["deferred"]: print(f"{d['feature']:28} {d['module']:24} {d['first_use_ms']:>12.1f}")
+
+# --- 2. MEASUREMENT ---
+def _summary(latencies, total_calls, total_time):
+    lat = sorted(latencies)
+    pct = lambda q: lat[min(len(lat) - 1, int(q * len(lat)))] * 1000
+    return {
+        "ops_per_sec": round(total_calls / total_time, 2) if total_time else 0.0,
+        "mean_ms": round(statistics.fmean(lat) * 1000, 4),
+        "p50_ms": round(pct(0.50), 4), "p95_ms": round(pct(0.95), 4), "p99_ms": round(pct(0.99), 4),
+        "samples": len(lat), "calls": total_calls,
+    }
+
+def measure(fn, batch, seconds, warmup=3):
+    for _ in range(warmup): fn()
+    latencies = []; calls = 0; spent = 0.0
+    while spent < seconds or len(latencies) < 5:
+        t = time.perf_counter()
+        for _ in range(batch): fn()
+        dt = time.perf_counter() - t
+        latencies.append(dt / batch); calls += batch; spent += dt
+    return _summary(latencies, calls, spent)
+
+def run_suite(only=None, seconds=1.0):
+    results = {}
+    if not only or "app_import" in only:
+        samples = time_app_import()
+        results["app_import"] = _summary(samples, len(samples), sum(samples))
+    with contextlib.redirect_stdout(io.StringIO()):  # PDF debug prints
+        cases = build_cases()
+        for name, (fn, batch) in cases.items():
+            if only and name not in only: continue
+            results[name] = measure(fn, batch, seconds)
+    return results
+
+# --- 3. BASELINE COMPARISON ---
+def compare(current, baseline, threshold=0.15):
+    """Returns [(name, baseline ops/s, current ops/s, change)] for cases slower than baseline by > threshold."""
+    regressions = []
+    for name, cur in current.items():
+        base = baseline.get(name)
+        if not base or not base.get("ops_per_sec"): continue
+        change = cur["ops_per_sec"] / base["ops_per_sec"] - 1.0
+        if change < -threshold: regressions.append((name, base["ops_per_sec"], cur["ops_per_sec"], change))
+    return regressions
+
+def _meta():
+    try: rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError: rev = ""
+    return {"timestamp": datetime.datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(),
+            "platform": platform.platform(), "machine": platform.machine(), "git_rev": rev}
+
+def main(argv=None):
+    p = argparse.ArgumentParser(prog="bench.py", description="Vedic Matcher benchmark suite.")
+    p.add_argument("--only", nargs="*", help="Run only these cases")
+    p.add_argument("--seconds", type=float, default=1.0, help="Measured wall time per case")
+    p.add_argument("-o", "--output", default=DEFAULT_OUTPUT)
+    p.add_argument("--baseline", help="Compare against this results file")
+    p.add_argument("--threshold", type=float, default=0.15, help="Allowed ops/sec drop before flagging (0.15 = 15%%)")
+    p.add_argument("--save-baseline", action="store_true", help=f"Also write the run to {DEFAULT_BASELINE}")
+    p.add_argument("--startup", action="store_true", help="Only print the cold-start / deferred-import report")
+    args = p.parse_args(argv)
+
+    if args.startup:
+        print_startup(startup_report())
+        return 0
+
+    results = run_suite(args.only, args.seconds)
+    doc = {"meta": _meta(), "results": results}
+    with open(args.output, "w") as f: json.dump(doc, f, indent=2)
+    if args.save_baseline:
+        with open(DEFAULT_BASELINE, "w") as f: json.dump(doc, f, indent=2)
+
+    print(f"{'case':32} {'ops/s':>12} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for name, r in results.items():
+        print(f"{name:32} {r['ops_per_sec']:>12,.1f} {r['p50_ms']:>10.3f} {r['p95_ms']:>10.3f} {r['p99_ms']:>10.3f}")
+
+    if args.baseline:
+        with open(args.baseline) as f: baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for name, base, cur, change in regressions:
+            print(f"[REGRESSION] {name}: {base:,.1f} -> {cur:,.1f} ops/s ({change:+.1%})")
+        if regressions: return 1
+        print(f"[OK] No case slower than baseline by more than {args.threshold:.0%}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
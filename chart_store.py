@@ -0,0 +1,107 @@
+"""Columnar chart store on memory-mapped files, shared zero-copy by cli.py worker processes.
+
+A store is a directory holding meta.json plus one raw .bin file per column (nakshatra, rashi, pada,
+D9, Moon / Mars longitudes, Kuja code, D1 placements), and the row ids as an offsets + bytes heap.
+It is built once from CSV / Parquet / JSONL; afterwards every worker maps the same files read-only,
+so the OS page cache holds one copy for all of them and tasks are just (start, stop) row ranges.
+
+    python cli.py store couples.csv -o couples.vstore            # resolve charts once
+    python cli.py match couples.vstore --workers 8 --kuja strict  # workers attach, receive ranges
+
+    store = chart_store.attach("couples.vstore")
+    store["b_nak"][start:stop], store.ids(start, stop)
+
+meta.json is written last, so a half-built store is never attached.
+"""
+import json
+import os
+
+import numpy as np
+
+FORMAT_VERSION = 1
+PLANETS = ("Su", "Mo", "Ma", "Me", "Ju", "Ve", "Sa", "Ra", "Ke", "Asc")
+GENDERS = ("Boy", "Girl")
+KINDS = ("match", "finder")
+
+# (name, dtype, trailing shape); unknown longitudes are NaN, unknown placements -1
+PERSON_COLUMNS = (
+    ("nak", "i1", ()), ("rashi", "i1", ()), ("pada", "i1", ()), ("d9", "i1", ()),
+    ("moon", "<f8", ()), ("mars", "<f8", ()), ("kuja", "i1", ()), ("planets", "i1", (len(PLANETS),)),
+)
+
+def columns_for(kind):
+    if kind == "match": return [(f"{side}{name}", dt, shape) for side in ("b_", "g_") for name, dt, shape in PERSON_COLUMNS]
+    if kind == "finder": return [("gender", "i1", ())] + list(PERSON_COLUMNS)
+    raise ValueError(f"Unknown store kind: {kind} (use {' or '.join(KINDS)})")
+
+def is_store(path):
+    return os.path.isfile(os.path.join(path, "meta.json"))
+
+# --- 1. BUILDING ---
+class StoreWriter:
+    """Appends batches of row dicts column by column; also usable as the cli.py run() writer."""
+    def __init__(self, path, kind):
+        os.makedirs(path, exist_ok=True)
+        meta = os.path.join(path, "meta.json")
+        if os.path.exists(meta): os.remove(meta)
+        self.path = path; self.kind = kind; self.columns = columns_for(kind); self.rows = 0
+        self._files = {name: open(os.path.join(path, f"{name}.bin"), "wb") for name, _, _ in self.columns}
+        self._heap = open(os.path.join(path, "ids.bin"), "wb"); self._offsets = open(os.path.join(path, "id_offsets.bin"), "wb")
+        self._heap_size = 0
+        np.zeros(1, dtype="<i8").tofile(self._offsets)
+
+    def write(self, rows):
+        if not rows: return
+        for name, dt, shape in self.columns:
+            np.asarray([r[name] for r in rows], dtype=dt).reshape((len(rows),) + shape).tofile(self._files[name])
+        encoded = [str(r["id"]).encode("utf-8") for r in rows]
+        self._heap.write(b"".join(encoded))
+        ends = self._heap_size + np.cumsum([len(e) for e in encoded], dtype="<i8")
+        ends.tofile(self._offsets); self._heap_size = int(ends[-1])
+        self.rows += len(rows)
+
+    def close(self):
+        for fh in (*self._files.values(), self._heap, self._offsets): fh.close()
+        meta = {"version": FORMAT_VERSION, "kind": self.kind, "rows": self.rows,
+                "columns": [[name, dt, list(shape)] for name, dt, shape in self.columns]}
+        tmp = os.path.join(self.path, "meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as fh: json.dump(meta, fh)
+        os.replace(tmp, os.path.join(self.path, "meta.json"))
+
+    def __enter__(self): return self
+    def __exit__(self, *exc): self.close()
+
+# --- 2. ATTACHING ---
+def _map(path, dtype, shape):
+    if not shape[0]: return np.empty(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=shape)
+
+class ChartStore:
+    def __init__(self, path):
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as fh: meta = json.load(fh)
+        if meta["version"] != FORMAT_VERSION: raise ValueError(f"{path}: store format {meta['version']}, expected {FORMAT_VERSION}; rebuild it")
+        self.path = path; self.kind = meta["kind"]; self.rows = meta["rows"]
+        self.columns = {name: _map(os.path.join(path, f"{name}.bin"), dt, (self.rows,) + tuple(shape)) for name, dt, shape in meta["columns"]}
+        self._offsets = _map(os.path.join(path, "id_offsets.bin"), "<i8", (self.rows + 1,))
+        heap = os.path.join(path, "ids.bin")
+        self._heap = _map(heap, "u1", (os.path.getsize(heap),))
+
+    def __len__(self): return self.rows
+    def __getitem__(self, name): return self.columns[name]
+
+    def ids(self, start, stop):
+        offsets = self._offsets[start:stop + 1]
+        raw = bytes(self._heap[offsets[0]:offsets[-1]]) if len(offsets) > 1 else b""
+        return [raw[a - offsets[0]:b - offsets[0]].decode("utf-8") for a, b in zip(offsets[:-1], offsets[1:])]
+
+    def ranges(self, size):
+        """(start, stop) tasks covering the store in `size`-row steps."""
+        return ((start, min(start + size, self.rows)) for start in range(0, self.rows, size))
+
+_ATTACHED = {}
+
+def attach(path):
+    """The process-wide ChartStore for `path`; forked workers inherit or map it once."""
+    key = (os.path.abspath(path), os.stat(os.path.join(path, "meta.json")).st_mtime_ns)  # a rebuilt store is re-mapped
+    if key not in _ATTACHED: _ATTACHED[key] = ChartStore(path)
+    return _ATTACHED[key]
@@ -0,0 +1,377 @@
+"""Bulk matcher CLI: streams couples (or finder profiles) through the koota engine outside Streamlit.
+
+Usage:
+    python cli.py match couples.csv -o results.csv
+    python cli.py match couples.csv -o results.csv --kuja compatible
+    python cli.py finder profiles.parquet -o matches.parquet --show-risky --workers 8
+    python cli.py store couples.csv -o couples.vstore && python cli.py match couples.vstore --workers 8
+    python cli.py distribution -o scores.csv --weights profiles.vstore
+
+Input (CSV / Parquet / JSONL, read in chunks):
+    match  -> b_star, b_pada, g_star, g_pada (+ optional b_rashi / g_rashi)
+              or b_date, b_time, b_city, b_country, g_date, g_time, g_city, g_country
+              (+ optional b_mars / g_mars sidereal longitudes or b_manglik / g_manglik yes/no for --kuja)
+    finder -> gender (Boy/Girl), star, pada (+ optional rashi)
+Stars and rashis may be names ("Hasta", "Virgo", "Kanya") or 0-based indexes.
+Output uses the Find Matches CSV export columns, prefixed with the row id ("Slots Scoring Higher" is
+per seeker, so it stays empty for match rows). `distribution` writes the score distribution table
+behind the Percentile column (see score_dist.py), optionally weighted by the padas of a chart store.
+`store` resolves the charts once into a memory-mapped columnar store (see chart_store.py); match / finder
+on a store send workers row ranges instead of pickled records.
+"""
+import argparse
+import datetime
+import multiprocessing as mp
+import os
+import sys
+import time
+from collections import deque
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+import chart_store
+import kuja
+
+from app import (
+    NAKSHATRAS, RASHIS, FINDER_SORT_OPTIONS,
+    calculate_all, is_risky, lookup_best_matches, get_finder_index, filter_and_sort_matches, get_score_distribution,
+    get_d9_rashi_from_pada, get_rashi_from_pada,
+    get_planetary_positions, get_nak_rashi_pada, calculate_d9_position
+)
+
+# Same columns as the Find Matches `to_csv` export
+EXPORT_COLUMNS = ["Match Details", "Final Remedied Score", "Raw Score", "IsRisky", "Percentile", "Slots Scoring Higher"]
+
+STAR_LOOKUP = {n.lower(): i for i, n in enumerate(NAKSHATRAS)}
+RASHI_LOOKUP = {}
+for _i, _r in enumerate(RASHIS):
+    # "Virgo (Kanya)" -> "virgo (kanya)", "virgo", "kanya"
+    _en, _sa = _r.split(" (")
+    RASHI_LOOKUP.update({_r.lower(): _i, _en.lower(): _i, _sa.rstrip(")").lower(): _i})
+
+MANGLIK_YES = {"yes", "y", "true", "1", "manglik"}
+MANGLIK_NO = {"no", "n", "false", "0"}
+
+# --- 1. ROW PARSING ---
+def _is_missing(v):
+    return v is None or (isinstance(v, float) and pd.isna(v)) or (isinstance(v, str) and not v.strip())
+
+def parse_star(v):
+    if isinstance(v, str) and not v.strip().isdigit():
+        return STAR_LOOKUP[v.strip().lower()]
+    idx = int(v)
+    if not 0 <= idx < 27: raise ValueError(f"star index out of range: {v}")
+    return idx
+
+def parse_pada(v):
+    pada = int(v)
+    if not 1 <= pada <= 4: raise ValueError(f"pada must be 1-4: {v}")
+    return pada
+
+def parse_rashi(v, nak, pada):
+    if _is_missing(v): return get_rashi_from_pada(nak, pada)
+    if isinstance(v, str) and not v.strip().isdigit():
+        return RASHI_LOOKUP[v.strip().lower()]
+    return int(v) % 12
+
+def _birth_details(rec, prefix):
+    """(date, time, city, country) when the row has a `<prefix>date`, else None."""
+    if _is_missing(rec.get(f"{prefix}date")): return None
+    time_val = rec.get(f"{prefix}time")
+    time_obj = datetime.time(0, 0) if _is_missing(time_val) else pd.Timestamp(str(time_val)).time()
+    return pd.Timestamp(rec[f"{prefix}date"]).date(), time_obj, rec.get(f"{prefix}city") or "", rec.get(f"{prefix}country") or ""
+
+def resolve_chart(rec, prefix):
+    """Returns (nak, rashi, pada, d9_rashi, moon_long, mars_long) for one side of a couple row. Longitudes are
+    NaN unless the row has birth details; a `<prefix>mars` column supplies Mars for star-only rows."""
+    birth = _birth_details(rec, prefix)
+    if birth:
+        moon, mars, _, _, _, _ = get_planetary_positions(*birth)
+        nak, rashi, pada = get_nak_rashi_pada(moon)
+        return nak, rashi, pada, calculate_d9_position(moon), moon, mars
+    nak = parse_star(rec[f"{prefix}star"]); pada = parse_pada(rec[f"{prefix}pada"])
+    mars = rec.get(f"{prefix}mars")
+    return (nak, parse_rashi(rec.get(f"{prefix}rashi"), nak, pada), pada, get_d9_rashi_from_pada(nak, pada),
+            float("nan"), float("nan") if _is_missing(mars) else float(mars))
+
+def resolve_person(rec, prefix):
+    """Returns (nak, rashi, pada, d9_rashi) for one side of a couple row."""
+    return resolve_chart(rec, prefix)[:4]
+
+def parse_manglik(v):
+    """Explicit `<prefix>manglik` column: yes/no style values -> Kuja code, blank -> None."""
+    if _is_missing(v): return None
+    text = str(v).strip().lower()
+    if text in MANGLIK_YES: return kuja.DOSHA
+    if text in MANGLIK_NO: return kuja.NO_DOSHA
+    raise ValueError(f"manglik must be yes/no: {v}")
+
+def person_label(nak, rashi, pada):
+    return f"{NAKSHATRAS[nak]} ({RASHIS[rashi].split(' ')[0]}, Pada {pada})"
+
+# --- 2. WORKER TASKS (top level so the pool can pickle them) ---
+def kuja_screen(persons, policy):
+    """Boolean keep-mask over resolved couples [(boy, girl, boy_manglik, girl_manglik)], one vectorized pass."""
+    if policy == "any": return np.ones(len(persons), dtype=bool)
+    codes = []
+    for side in (0, 1):
+        charts = [p[side] for p in persons]
+        side_codes = kuja.kuja_status_array([c[1] for c in charts], [c[5] for c in charts])
+        explicit = np.array([kuja.UNKNOWN if p[2 + side] is None else p[2 + side] for p in persons], dtype=np.int8)
+        codes.append(np.where(explicit != kuja.UNKNOWN, explicit, side_codes))
+    return kuja.compatible_mask(codes[0], codes[1], policy)
+
+def score_couples(task, id_column, kuja_policy="any"):
+    start, records = task
+    rows, errors, persons, keys = [], [], [], []
+    for n, rec in enumerate(records):
+        key = rec.get(id_column, start + n)
+        try:
+            persons.append((resolve_chart(rec, "b_"), resolve_chart(rec, "g_"),
+                            parse_manglik(rec.get("b_manglik")), parse_manglik(rec.get("g_manglik"))))
+            keys.append(key)
+        except Exception as e:
+            errors.append((key, repr(e)))
+    # Kuja screening first: couples it drops never reach koota scoring
+    keep = kuja_screen(persons, kuja_policy)
+    for key, person, kept in zip(keys, persons, keep):
+        if not kept: continue
+        try: rows.append(couple_row(id_column, key, person[0][:4], person[1][:4]))
+        except Exception as e: errors.append((key, repr(e)))
+    return rows, errors, len(records)
+
+def couple_row(id_column, key, boy, girl):
+    """One export row for resolved (nak, rashi, pada, d9) sides."""
+    (b_nak, b_rashi, b_pada, b_d9), (g_nak, g_rashi, g_pada, g_d9) = boy, girl
+    score, bd, _, _, _, safety, _, _, _ = calculate_all(b_nak, b_rashi, g_nak, g_rashi, b_d9, g_d9)
+    risky = is_risky(safety)
+    risk_icon = "⚠️ " if risky else ""
+    return {
+        id_column: key,
+        "Match Details": f"{risk_icon}{person_label(b_nak, b_rashi, b_pada)} w/ {person_label(g_nak, g_rashi, g_pada)}",
+        "Final Remedied Score": score,
+        "Raw Score": sum(item[1] for item in bd),
+        "IsRisky": risky,
+        "Percentile": get_score_distribution().percentile(score),
+        "Slots Scoring Higher": None
+    }
+
+def scan_profiles(task, id_column, show_risky, sort_order):
+    start, records = task
+    rows, errors = [], []
+    for n, rec in enumerate(records):
+        key = rec.get(id_column, start + n)
+        try:
+            gender = str(rec["gender"]).strip().capitalize()
+            if gender not in ("Boy", "Girl"): raise ValueError(f"gender must be Boy/Girl: {rec['gender']}")
+            nak = parse_star(rec["star"]); pada = parse_pada(rec["pada"])
+            matches = lookup_best_matches(gender, nak, parse_rashi(rec.get("rashi"), nak, pada), pada)
+        except Exception as e:
+            errors.append((key, repr(e))); continue
+        for m in filter_and_sort_matches(matches, show_risky, sort_order):
+            rows.append({id_column: key, **m})
+    return rows, errors, len(records)
+
+# --- 2b. CHART STORE TASKS (tasks are row ranges; workers map the store themselves) ---
+def store_person(rec, prefix, charts):
+    """Chart store columns for one person: resolve_chart, the Kuja code and, with `charts`, D1 placements."""
+    nak, rashi, pada, d9, moon, mars = resolve_chart(rec, prefix)
+    planets = [-1] * len(chart_store.PLANETS)
+    birth = _birth_details(rec, prefix)
+    if charts and birth:
+        _, _, _, _, d1, _ = get_planetary_positions(*birth, detailed=True)
+        for sign, names in d1.items():
+            for name in names: planets[chart_store.PLANETS.index(name)] = sign
+    code = parse_manglik(rec.get(f"{prefix}manglik"))
+    if code is None: code = kuja.UNKNOWN if np.isnan(mars) else kuja.kuja_status(rashi, mars)
+    return {f"{prefix}nak": nak, f"{prefix}rashi": rashi, f"{prefix}pada": pada, f"{prefix}d9": d9,
+            f"{prefix}moon": moon, f"{prefix}mars": mars, f"{prefix}kuja": code, f"{prefix}planets": planets}
+
+def store_rows(task, kind, id_column, charts=False):
+    start, records = task
+    rows, errors = [], []
+    for n, rec in enumerate(records):
+        key = rec.get(id_column, start + n)
+        try:
+            if kind == "match": row = {**store_person(rec, "b_", charts), **store_person(rec, "g_", charts)}
+            else:
+                gender = str(rec["gender"]).strip().capitalize()
+                if gender not in chart_store.GENDERS: raise ValueError(f"gender must be Boy/Girl: {rec['gender']}")
+                row = {"gender": chart_store.GENDERS.index(gender), **store_person(rec, "", charts)}
+        except Exception as e:
+            errors.append((key, repr(e))); continue
+        rows.append({"id": key, **row})
+    return rows, errors, len(records)
+
+def _person_columns(store, prefix, start, stop):
+    return [store[f"{prefix}{c}"][start:stop].tolist() for c in ("nak", "rashi", "pada", "d9")]
+
+def score_store(task, path, id_column, kuja_policy="any"):
+    start, stop = task
+    store = chart_store.attach(path)
+    keep = kuja.compatible_mask(store["b_kuja"][start:stop], store["g_kuja"][start:stop], kuja_policy)
+    boys = list(zip(*_person_columns(store, "b_", start, stop))); girls = list(zip(*_person_columns(store, "g_", start, stop)))
+    rows, errors = [], []
+    for i, key in enumerate(store.ids(start, stop)):
+        if not keep[i]: continue
+        try: rows.append(couple_row(id_column, key, boys[i], girls[i]))
+        except Exception as e: errors.append((key, repr(e)))
+    return rows, errors, stop - start
+
+def scan_store(task, path, id_column, show_risky, sort_order):
+    start, stop = task
+    store = chart_store.attach(path)
+    genders = store["gender"][start:stop].tolist(); naks, rashis, padas, _ = _person_columns(store, "", start, stop)
+    rows = []
+    for i, key in enumerate(store.ids(start, stop)):
+        matches = lookup_best_matches(chart_store.GENDERS[genders[i]], naks[i], rashis[i], padas[i])
+        for m in filter_and_sort_matches(matches, show_risky, sort_order):
+            rows.append({id_column: key, **m})
+    return rows, [], stop - start
+
+# --- 3. STREAMING I/O ---
+def _fmt(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv" or path == "-": return "csv"
+    if ext in (".jsonl", ".ndjson", ".json"): return "jsonl"
+    if ext in (".parquet", ".pq"): return "parquet"
+    raise SystemExit(f"Unsupported file format: {path} (use .csv, .parquet or .jsonl)")
+
+def read_chunks(path, chunksize):
+    """Yields (row offset, list of records) without loading the whole file."""
+    fmt = _fmt(path); offset = 0
+    if fmt == "csv": frames = pd.read_csv(sys.stdin if path == "-" else path, chunksize=chunksize)
+    elif fmt == "jsonl": frames = pd.read_json(path, lines=True, chunksize=chunksize)
+    else:
+        import pyarrow.parquet as pq
+        frames = (b.to_pandas() for b in pq.ParquetFile(path).iter_batches(batch_size=chunksize))
+    for df in frames:
+        records = df.to_dict("records")
+        yield offset, records
+        offset += len(records)
+
+class ChunkWriter:
+    def __init__(self, path, id_column):
+        self.path = path; self.fmt = _fmt(path)
+        self.columns = [id_column] + EXPORT_COLUMNS
+        self._pq = None; self._header = True
+        if self.fmt == "parquet": self._fh = None
+        else: self._fh = sys.stdout if path == "-" else open(path, "w", encoding="utf-8", newline="")
+
+    def write(self, rows):
+        if not rows: return
+        df = pd.DataFrame(rows, columns=self.columns)
+        if self.fmt == "csv":
+            df.to_csv(self._fh, header=self._header, index=False); self._header = False
+        elif self.fmt == "jsonl":
+            df.to_json(self._fh, orient="records", lines=True, force_ascii=False); self._fh.write("\n")
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            # Fixed schema: half-point scores make chunk dtypes flip between int and float
+            df[self.columns[0]] = df[self.columns[0]].astype(str)
+            df = df.astype({"Final Remedied Score": float, "Raw Score": float, "IsRisky": bool, "Percentile": float, "Slots Scoring Higher": "Int64"})
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._pq is None: self._pq = pq.ParquetWriter(self.path, table.schema)
+            self._pq.write_table(table)
+
+    def close(self):
+        if self._pq is not None: self._pq.close()
+        if self._fh is not None and self._fh is not sys.stdout: self._fh.close()
+        elif self._fh is sys.stdout: self._fh.flush()
+
+# --- 4. DRIVER ---
+def run(task_fn, chunks, writer, workers, quiet=False):
+    """Feeds chunks to a process pool with a bounded in-flight window, so memory stays flat for any input size."""
+    t0 = time.perf_counter(); stats = {"rows_in": 0, "rows_out": 0, "errors": 0}
+
+    def emit(result):
+        rows, errors, n_in = result
+        writer.write(rows)
+        stats["rows_in"] += n_in; stats["rows_out"] += len(rows); stats["errors"] += len(errors)
+        for key, err in errors: print(f"[SKIP] row {key}: {err}", file=sys.stderr)
+        if not quiet:
+            rate = stats["rows_in"] / max(time.perf_counter() - t0, 1e-9)
+            print(f"\r[PROGRESS] {stats['rows_in']} in | {stats['rows_out']} out | {stats['errors']} errors | {rate:,.0f} rows/s", end="", file=sys.stderr, flush=True)
+
+    if workers <= 1:
+        for chunk in chunks: emit(task_fn(chunk))
+    else:
+        with mp.Pool(workers) as pool:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(pool.apply_async(task_fn, (chunk,)))
+                if len(pending) >= workers * 2: emit(pending.popleft().get())
+            while pending: emit(pending.popleft().get())
+    writer.close()
+
+    stats["seconds"] = time.perf_counter() - t0
+    if not quiet:
+        print(f"\n[DONE] {stats['rows_in']} rows -> {stats['rows_out']} results in {stats['seconds']:.2f}s "
+              f"({stats['rows_in'] / max(stats['seconds'], 1e-9):,.0f} rows/s, {stats['errors']} skipped)", file=sys.stderr)
+    return stats
+
+def build_parser():
+    p = argparse.ArgumentParser(prog="cli.py", description="Bulk Vedic matching outside the Streamlit UI.")
+    sub = p.add_subparsers(dest="command", required=True)
+    for name, help_txt in (("match", "Score couples (one row per couple)"), ("finder", "Run Find Matches for each profile"),
+                           ("store", "Resolve charts once into a memory-mapped chart store for match / finder")):
+        sp = sub.add_parser(name, help=help_txt)
+        if name == "store":
+            sp.add_argument("input", help="CSV / Parquet / JSONL file ('-' reads CSV from stdin)")
+            sp.add_argument("-o", "--output", required=True, help="Store directory, e.g. couples.vstore")
+            sp.add_argument("--kind", choices=chart_store.KINDS, default="match", help="Couple rows (match) or profiles (finder)")
+            sp.add_argument("--charts", action="store_true", help="Also keep D1 planet placements (full charts for birth-detail rows)")
+        else:
+            sp.add_argument("input", help="CSV / Parquet / JSONL file ('-' reads CSV from stdin) or a chart store directory")
+            sp.add_argument("-o", "--output", default="-", help="CSV / Parquet / JSONL file (default: CSV on stdout)")
+        sp.add_argument("--id-column", default="id", help="Column copied to the output to identify rows (default: id, else row number)")
+        sp.add_argument("--chunksize", type=int, default=1000, help="Rows per read chunk / worker task")
+        sp.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes (1 = run inline)")
+        sp.add_argument("-q", "--quiet", action="store_true", help="No progress reporting")
+        if name == "match":
+            sp.add_argument("--kuja", choices=kuja.POLICIES, default="any",
+                            help="Drop Mars-incompatible couples before scoring (compatible: both manglik or both not)")
+        if name == "finder":
+            sp.add_argument("--show-risky", action="store_true", help="Keep risky matches (the UI hides them by default)")
+            sp.add_argument("--sort", choices=FINDER_SORT_OPTIONS, default="Raw Score (Highest First)")
+    sp = sub.add_parser("distribution", help="Export the raw / remedied score distribution over all pada pairings")
+    sp.add_argument("-o", "--output", default="-", help="CSV / Parquet / JSONL file (default: CSV on stdout)")
+    sp.add_argument("--weights", help="Chart store whose padas weight the pairings (default: every pairing counts once)")
+    return p
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == "store":
+        writer = chart_store.StoreWriter(args.output, args.kind)
+        task_fn = partial(store_rows, kind=args.kind, id_column=args.id_column, charts=args.charts)
+        run(task_fn, read_chunks(args.input, args.chunksize), writer, args.workers, args.quiet)
+        return 0
+    if args.command == "distribution":
+        df = pd.DataFrame(get_score_distribution(weights=args.weights).table())
+        fmt = _fmt(args.output)
+        if fmt == "csv": df.to_csv(sys.stdout if args.output == "-" else args.output, index=False)
+        elif fmt == "jsonl": df.to_json(args.output, orient="records", lines=True)
+        else: df.to_parquet(args.output, index=False)
+        return 0
+    get_score_distribution()  # like the finder index: built once here, inherited by forked workers
+    store = chart_store.attach(args.input) if args.input != "-" and chart_store.is_store(args.input) else None
+    if store is not None and store.kind != args.command:
+        raise SystemExit(f"{args.input} is a {store.kind} store; use `cli.py {store.kind}`")
+    if args.command == "match":
+        task_fn = (partial(score_store, path=args.input, id_column=args.id_column, kuja_policy=args.kuja) if store
+                   else partial(score_couples, id_column=args.id_column, kuja_policy=args.kuja))
+    else:
+        get_finder_index()  # built once here, inherited by forked workers
+        task_fn = (partial(scan_store, path=args.input, id_column=args.id_column, show_risky=args.show_risky, sort_order=args.sort) if store
+                   else partial(scan_profiles, id_column=args.id_column, show_risky=args.show_risky, sort_order=args.sort))
+    writer = ChunkWriter(args.output, args.id_column)
+    # With a store, tasks are (start, stop) ranges and workers map the columns instead of unpickling records
+    chunks = store.ranges(args.chunksize) if store else read_chunks(args.input, args.chunksize)
+    run(task_fn, chunks, writer, args.workers, args.quiet)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""Disk-backed chart cache: sidereal Moon/Mars/Sun, ascendant and D1/D9 placements per UTC instant and place.
+
+A chart only depends on the UTC instant and the coordinates, so it is computed once and kept in SQLite
+across restarts, shared by the app, cli.py workers and server.py. Keys are normalized first: UTC to whole
+seconds, latitude / longitude to COORD_DECIMALS places (~11 m); charts are computed at the normalized key,
+so a cached chart and a fresh one are identical.
+
+The database records ALGORITHM_VERSION (schema, ayanamsa constants, fixed-point scale, ALGORITHM_REV);
+when it differs the cached charts are dropped. Bump ALGORITHM_REV whenever chart math changes.
+
+Location: $VEDIC_EPHEM_CACHE (set it to "off" to disable), else ~/.cache/vedic-matcher/ephemeris.sqlite3.
+Any SQLite / filesystem error just falls back to computing the chart.
+"""
+import datetime
+import json
+import os
+import sqlite3
+import threading
+
+import arcsec
+import sidereal
+
+SCHEMA_VERSION = 1
+ALGORITHM_REV = 1
+ALGORITHM_VERSION = (f"schema={SCHEMA_VERSION};rev={ALGORITHM_REV};lahiri={sidereal.AYANAMSA_J2000}+{sidereal.AYANAMSA_RATE}/cy;"
+                     f"mas={arcsec.MAS_PER_DEG}")
+COORD_DECIMALS = 4
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "vedic-matcher", "ephemeris.sqlite3")
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+class _State:
+    path = os.environ.get("VEDIC_EPHEM_CACHE", DEFAULT_PATH)
+
+STATE = _State()
+_local = threading.local()
+
+def configure(path):
+    """Points the cache at another file (None or "off" disables it); reopens this thread's connection."""
+    STATE.path = path
+    for conn in _local.__dict__.pop("conns", {}).values():
+        if conn is not None: conn.close()
+
+def is_enabled():
+    return bool(STATE.path) and STATE.path != "off"
+
+# --- 1. KEYS ---
+def normalize(utc_dt, lat, lon):
+    """(UTC epoch seconds, lat * 10^4, lon * 10^4) as integers."""
+    scale = 10 ** COORD_DECIMALS
+    return round((utc_dt - _EPOCH).total_seconds()), round(lat * scale), round(lon * scale)
+
+def key_instant(key):
+    """Inverse of normalize: (naive UTC datetime, lat, lon) the chart is computed for."""
+    scale = 10 ** COORD_DECIMALS
+    return _EPOCH + datetime.timedelta(seconds=key[0]), key[1] / scale, key[2] / scale
+
+# --- 2. STORAGE ---
+def _open(path):
+    if os.path.dirname(path): os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL"); conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (k TEXT PRIMARY KEY, v TEXT)")
+    row = conn.execute("SELECT v FROM meta WHERE k = 'version'").fetchone()
+    if row is None or row[0] != ALGORITHM_VERSION:
+        conn.execute("DROP TABLE IF EXISTS charts")
+        conn.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (ALGORITHM_VERSION,))
+    conn.execute("""CREATE TABLE IF NOT EXISTS charts (
+        utc INTEGER, lat INTEGER, lon INTEGER, detailed INTEGER,
+        moon REAL, mars REAL, sun REAL, asc REAL, d1 TEXT, d9 TEXT,
+        PRIMARY KEY (utc, lat, lon, detailed))""")
+    return conn
+
+def _conn():
+    # One connection per thread and process (forked cli.py workers must not share the parent's)
+    if not is_enabled(): return None
+    key = (os.getpid(), STATE.path)
+    conns = _local.__dict__.setdefault("conns", {})
+    if key not in conns:
+        try: conns[key] = _open(STATE.path)
+        except (sqlite3.Error, OSError): conns[key] = None
+    return conns[key]
+
+def _dump_chart(chart):
+    return None if chart is None else json.dumps(list(chart.items()))
+
+def _load_chart(text):
+    return None if text is None else {sign: names for sign, names in json.loads(text)}
+
+def get(key, detailed):
+    """(moon, mars, sun, asc, d1, d9) or None. A detailed entry also answers a basic request."""
+    conn = _conn()
+    if conn is None: return None
+    try:
+        row = conn.execute("SELECT moon, mars, sun, asc, d1, d9, detailed FROM charts WHERE utc = ? AND lat = ? AND lon = ? "
+                           "AND detailed >= ? ORDER BY detailed DESC LIMIT 1", (*key, int(detailed))).fetchone()
+    except sqlite3.Error: return None
+    if row is None: return None
+    moon, mars, sun, asc, d1, d9, row_detailed = row
+    if row_detailed and not detailed: return moon, mars, sun, None, None, None
+    return moon, mars, sun, asc, _load_chart(d1), _load_chart(d9)
+
+def put(key, detailed, chart):
+    conn = _conn()
+    if conn is None: return
+    moon, mars, sun, asc, d1, d9 = chart
+    try:
+        conn.execute("INSERT OR REPLACE INTO charts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                     (*key, int(detailed), moon, mars, sun, asc, _dump_chart(d1), _dump_chart(d9)))
+    except sqlite3.Error: pass
+
+def clear():
+    conn = _conn()
+    if conn is not None: conn.execute("DELETE FROM charts")
+
+def size():
+    conn = _conn()
+    return 0 if conn is None else conn.execute("SELECT COUNT(*) FROM charts").fetchone()[0]
@@ -0,0 +1,165 @@
+"""Offline place index: city names -> coordinates + IANA timezone, without a network round trip.
+
+cities.csv (bundled next to this file) lists ~400 places: every Indian city of note plus the cities
+the diaspora is usually born in, each with its common aliases (Bombay, Madras, Bangalore, ...).
+Names are matched case- / accent- / punctuation-insensitively: an exact name or alias is a dict hit,
+a prefix is a bisect over the sorted keys, and typos are caught by trigram similarity.
+
+    place = gazetteer.resolve("Bombay", "India")     # Place(name='Mumbai', ..., tz='Asia/Kolkata')
+    place.latitude, place.longitude, place.tz, place.label
+    gazetteer.closest("Hyderbad", "India")           # Hyderabad: a "did you mean", never used on its own
+    gazetteer.suggest("ban", "India")                 # [Bengaluru (via Bangalore), Varanasi (via Banaras), ...]
+
+app.get_cached_coords asks resolve() first and only goes to Nominatim for places it does not know.
+Only exact names / aliases resolve: a town missing from the list often looks like a listed one
+(Naperville ~ Nashville, Guntakal ~ Guntur), so near misses are offered to the user, not assumed.
+To add places, append rows with a blank tz column and run `python gazetteer.py` to fill it in
+(needs timezonefinder, which the app already uses).
+"""
+import bisect
+import csv
+import functools
+import os
+import re
+import unicodedata
+from collections import namedtuple
+
+PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cities.csv")
+MIN_SIMILARITY = 0.5  # trigram Dice score below which a typo is not trusted to mean a place
+
+COUNTRY_ALIASES = {
+    "United States": ("USA", "US", "U.S.", "U.S.A.", "United States of America", "America"),
+    "United Kingdom": ("UK", "U.K.", "Great Britain", "Britain", "England", "Scotland", "Wales", "GB"),
+    "United Arab Emirates": ("UAE", "U.A.E.", "Emirates"),
+    "India": ("Bharat", "IN"),
+    "Czech Republic": ("Czechia",),
+    "South Korea": ("Korea", "Republic of Korea"),
+    "Netherlands": ("Holland", "The Netherlands"),
+    "Myanmar": ("Burma",),
+    "Sri Lanka": ("Ceylon",),
+    "Turkey": ("Turkiye",),
+}
+
+class Place(namedtuple("Place", "id name admin country lat lon tz population aliases")):
+    __slots__ = ()
+    # geopy Location-compatible, so callers of get_cached_coords need not care where a hit came from
+    @property
+    def latitude(self): return self.lat
+    @property
+    def longitude(self): return self.lon
+    @property
+    def label(self): return f"{self.name}, {self.admin}, {self.country}" if self.admin and self.admin != self.name else f"{self.name}, {self.country}"
+
+def normalize(text):
+    text = unicodedata.normalize("NFKD", str(text or "")).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]+", " ", text.casefold()).strip()
+
+def trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+# --- 1. INDEX ---
+class Index:
+    def __init__(self, places):
+        self.places = tuple(places)
+        self.exact = {}       # normalized name / alias -> place ids, most populous first
+        self.grams = {}       # trigram -> normalized keys containing it
+        for p in sorted(self.places, key=lambda p: -p.population):
+            for key in {normalize(n) for n in (p.name, *p.aliases)} - {""}:
+                self.exact.setdefault(key, []).append(p.id)
+        self.sizes = {}       # normalized key -> its trigram count
+        for key in self.exact:
+            grams = trigrams(key); self.sizes[key] = len(grams)
+            for g in grams: self.grams.setdefault(g, []).append(key)
+        self.keys = sorted(self.exact)
+        self.countries = {}   # normalized country / alias -> canonical country
+        for country in {p.country for p in self.places}:
+            for alias in (country, *COUNTRY_ALIASES.get(country, ())): self.countries[normalize(alias)] = country
+
+    def country(self, text):
+        """Canonical country for free text (aliases and typos allowed), or None when it is blank / unknown."""
+        key = normalize(text)
+        if not key: return None
+        if key in self.countries: return self.countries[key]
+        best = max(self.countries, key=lambda c: similarity(key, c))
+        return self.countries[best] if similarity(key, best) >= MIN_SIMILARITY else None
+
+    def _in(self, ids, country):
+        return [self.places[i] for i in ids if country is None or self.places[i].country == country]
+
+    def lookup(self, city, country=None):
+        """Exact name / alias hit (in the given country when one is recognized), else None."""
+        hits = self._in(self.exact.get(normalize(city), ()), self.country(country))
+        return hits[0] if hits else None
+
+    def similar(self, city, country=None, limit=5):
+        """[(score, place)] for names sharing trigrams with `city`, best first."""
+        key, country = normalize(city), self.country(country)
+        if not key: return []
+        grams = trigrams(key); shared = {}
+        for g in grams:
+            for k in self.grams.get(g, ()): shared[k] = shared.get(k, 0) + 1
+        scored = sorted(((2 * n / (len(grams) + self.sizes[k]), k) for k, n in shared.items()), key=lambda sk: (-sk[0], sk[1]))
+        out, seen = [], set()
+        for score, k in scored:
+            for p in self._in(self.exact[k], country):
+                if p.id not in seen: seen.add(p.id); out.append((score, p))
+            if len(out) >= limit: break
+        return out[:limit]
+
+    def resolve(self, city, country=None):
+        """Exact name / alias hit; None means ask the network."""
+        return self.lookup(city, country)
+
+    def closest(self, city, country=None):
+        """The nearest name when it is close enough to be a typo, for a "did you mean" (may be another town)."""
+        best = self.similar(city, country, limit=1)
+        return best[0][1] if best and best[0][0] >= MIN_SIMILARITY else None
+
+    def suggest(self, text, country=None, limit=8):
+        """Autocomplete: names / aliases starting with `text` (most populous first), then near misses."""
+        key, canon = normalize(text), self.country(country)
+        if not key: return []
+        start = bisect.bisect_left(self.keys, key)
+        ids = set()
+        for k in self.keys[start:]:
+            if not k.startswith(key): break
+            ids.update(self.exact[k])
+        out = sorted(self._in(ids, canon), key=lambda p: -p.population)[:limit]
+        if len(out) < limit:
+            out += [p for score, p in self.similar(text, country, limit) if score >= MIN_SIMILARITY and p not in out]
+        return out[:limit]
+
+def similarity(a, b):
+    ga, gb = trigrams(a), trigrams(b)
+    return 2 * len(ga & gb) / (len(ga) + len(gb))
+
+def read_places(path=PATH):
+    with open(path, encoding="utf-8", newline="") as fh:
+        return [Place(i, r["name"], r["admin"], r["country"], float(r["lat"]), float(r["lon"]), r["tz"], int(r["population"] or 0),
+                      tuple(a for a in r["aliases"].split(";") if a)) for i, r in enumerate(csv.DictReader(fh))]
+
+@functools.lru_cache(maxsize=None)
+def get_index(path=PATH):
+    return Index(read_places(path))
+
+def lookup(city, country=None): return get_index().lookup(city, country)
+def resolve(city, country=None): return get_index().resolve(city, country)
+def closest(city, country=None): return get_index().closest(city, country)
+def suggest(text, country=None, limit=8): return get_index().suggest(text, country, limit)
+
+# --- 2. MAINTENANCE ---
+def fill_timezones(path=PATH):
+    """Fills blank tz cells from the coordinates; returns how many rows were filled."""
+    from timezonefinder import TimezoneFinder
+    tf = TimezoneFinder()
+    with open(path, encoding="utf-8", newline="") as fh:
+        reader = csv.DictReader(fh); fields = reader.fieldnames; rows = list(reader)
+    blank = [r for r in rows if not r["tz"]]
+    for r in blank: r["tz"] = tf.timezone_at(lng=float(r["lon"]), lat=float(r["lat"])) or ""
+    with open(path, "w", encoding="utf-8", newline="") as fh:
+        writer = csv.DictWriter(fh, fields, lineterminator="\n"); writer.writeheader(); writer.writerows(rows)
+    return len(blank)
+
+if __name__ == "__main__":
+    print(f"filled {fill_timezones()} timezone(s) in {PATH}")
@@ -0,0 +1,76 @@
+"""Kuja (Mars / Manglik) dosha as small integer codes, for one chart or whole arrays of them.
+
+Mars in the 2nd, 4th, 7th, 8th or 12th house from the Moon is Kuja dosha, cancelled when Mars sits in
+its own sign (Aries / Scorpio) or is exalted (Capricorn). The status only depends on (moon rashi,
+mars rashi), so it is one lookup in the 12 x 12 KUJA_TABLE; the array form classifies a million
+charts in a few numpy operations.
+
+    code = kuja.kuja_status(moon_rashi, mars_long)
+    codes = kuja.kuja_status_array(moon_rashis, mars_longs)        # NaN Mars -> UNKNOWN
+    keep = kuja.compatible_mask(boy_codes, girl_codes, "compatible")  # screen couples before koota scoring
+    kuja.is_compatible(boy_code, girl_code)                           # one couple (the Match tab's Kuja verdict)
+
+Compatibility policies:
+    any          no screening
+    compatible   both manglik or both not; a side without Mars data is kept
+    strict       as compatible, but both sides must have Mars data
+    no-dosha     neither side manglik (unknown kept)
+"""
+import arcsec
+
+UNKNOWN, NO_DOSHA, DOSHA, CANCELLED_OWN_SIGN, CANCELLED_EXALTED = -1, 0, 1, 2, 3
+CODES = (UNKNOWN, NO_DOSHA, DOSHA, CANCELLED_OWN_SIGN, CANCELLED_EXALTED)
+CODE_NAMES = {UNKNOWN: "Unknown", NO_DOSHA: "Calm", DOSHA: "Manglik", CANCELLED_OWN_SIGN: "Cancelled (own sign)",
+              CANCELLED_EXALTED: "Cancelled (exalted)"}
+DOSHA_HOUSES = (2, 4, 7, 8, 12)
+OWN_SIGNS = (0, 7)   # Aries, Scorpio
+EXALTED_SIGN = 9     # Capricorn
+POLICIES = ("any", "compatible", "strict", "no-dosha")
+
+def mars_house(moon_rashi, mars_rashi):
+    return (mars_rashi - moon_rashi) % 12 + 1
+
+def _status(moon_rashi, mars_rashi):
+    if mars_house(moon_rashi, mars_rashi) not in DOSHA_HOUSES: return NO_DOSHA
+    if mars_rashi in OWN_SIGNS: return CANCELLED_OWN_SIGN
+    if mars_rashi == EXALTED_SIGN: return CANCELLED_EXALTED
+    return DOSHA
+
+# KUJA_TABLE[moon_rashi][mars_rashi]
+KUJA_TABLE = tuple(tuple(_status(moon, mars) for mars in range(12)) for moon in range(12))
+
+# --- 1. SCALAR ---
+def mars_rashi_of(mars_long):
+    return arcsec.to_mas(mars_long) // arcsec.RASHI_SPAN
+
+def kuja_status(moon_rashi, mars_long):
+    if mars_long is None: return UNKNOWN
+    return KUJA_TABLE[moon_rashi % 12][mars_rashi_of(mars_long)]
+
+def is_compatible(a, b, policy="compatible"):
+    if policy == "any": return True
+    if policy == "no-dosha": return a != DOSHA and b != DOSHA
+    if UNKNOWN in (a, b): return policy != "strict"
+    return (a == DOSHA) == (b == DOSHA)
+
+# --- 2. VECTORIZED ---
+def kuja_status_array(moon_rashis, mars_longs):
+    """kuja_status over arrays; NaN Mars longitudes give UNKNOWN. Returns int8."""
+    import numpy as np
+    table = np.array(KUJA_TABLE, dtype=np.int8)
+    mars = np.asarray(mars_longs, dtype=float)
+    known = ~np.isnan(mars)
+    mars_rashis = arcsec.to_mas_array(np.where(known, mars, 0.0)) // arcsec.RASHI_SPAN
+    codes = table[np.asarray(moon_rashis, dtype=np.int64) % 12, mars_rashis]
+    return np.where(known, codes, np.int8(UNKNOWN)).astype(np.int8)
+
+def compatible_mask(a_codes, b_codes, policy="compatible"):
+    """is_compatible element-wise over two code arrays (broadcasting)."""
+    import numpy as np
+    if policy not in POLICIES: raise ValueError(f"Unknown Kuja policy: {policy} (use {', '.join(POLICIES)})")
+    a = np.asarray(a_codes, dtype=np.int8); b = np.asarray(b_codes, dtype=np.int8)
+    if policy == "any": return np.ones(np.broadcast(a, b).shape, dtype=bool)
+    if policy == "no-dosha": return (a != DOSHA) & (b != DOSHA)
+    same = (a == DOSHA) == (b == DOSHA)
+    unknown = (a == UNKNOWN) | (b == UNKNOWN)
+    return same & ~unknown if policy == "strict" else same | unknown
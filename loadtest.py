@@ -0,0 +1,279 @@
+"""Concurrent-session load test: N simulated users drive app.py through Streamlit's AppTest.
+
+Usage:
+    python loadtest.py                                     # 1, 4 and 8 sessions, every flow, 2 rounds each
+    python loadtest.py --sessions 1 8 16 32 --iterations 5
+    python loadtest.py --flows direct finder chat --ai-latency 0.8 -o loadtest_results.json
+
+Every session is its own AppTest (its own session_state), run on its own thread of this process, the
+way one Streamlit replica serves all of its browser sessions: the engine modules, caches and the AI
+scheduler are shared, scripts run concurrently. Each session repeats the selected flows:
+
+    birth_pro   Birth Details with full horoscopes (pro mode), then Check Compatibility
+    direct      Direct Star Entry with random stars, then Check Compatibility
+    finder      Find Best Matches, then the "Show Risky" toggle and a sort change
+    pdf         the Download Full Report payload for the session's current match
+    chat        one Guru AI question, answered by the offline stand-in backend
+
+Reported per session count: steps and flows per second, p50 / p95 / p99 step latency (overall and per
+step), errors, process RSS after the level, peak RSS and RSS added per session.
+The AI backend defaults to the stand-in (VEDIC_STANDIN_LATENCY from --ai-latency) with the request
+scheduler unthrottled, so chat measures the app rather than the quota. Birth flows rotate through a few
+cities, so geocoding hits the network at most once per city.
+"""
+import argparse
+import datetime
+import gc
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import traceback
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+FLOWS = ("birth_pro", "direct", "finder", "pdf", "chat")
+CITIES = (("Hyderabad", "India"), ("Chennai", "India"), ("Mumbai", "India"), ("New York", "USA"))
+QUESTIONS = ("Is this good for marriage?", "Remedies?", "What about Nadi dosha?", "Career prospects together?")
+DEFAULT_OUTPUT = "loadtest_results.json"
+
+# --- 1. PROCESS STATS ---
+def _status_kb(field):
+    try:
+        with open("/proc/self/status") as fh:
+            for line in fh:
+                if line.startswith(field + ":"): return int(line.split()[1])
+    except OSError: pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # Linux reports KiB; peak only
+
+def rss_mb(): return _status_kb("VmRSS") / 1024
+def peak_rss_mb(): return _status_kb("VmHWM") / 1024
+
+def summarize(latencies):
+    lat = sorted(latencies)
+    if not lat: return {"count": 0}
+    pct = lambda q: lat[min(len(lat) - 1, int(q * len(lat)))] * 1000
+    return {"count": len(lat), "mean_ms": round(statistics.fmean(lat) * 1000, 2),
+            "p50_ms": round(pct(0.50), 2), "p95_ms": round(pct(0.95), 2), "p99_ms": round(pct(0.99), 2)}
+
+# --- 2. SIMULATED SESSION ---
+# share_runtime() mirrors AppTest's mock runtime as of this release (the app alone needs only 1.52)
+MIN_STREAMLIT = (1, 61)
+
+def streamlit_version():
+    import streamlit as st
+    return tuple(int(part) for part in st.__version__.split(".")[:2])
+
+def share_runtime():
+    """AppTest compiles app.py into a fresh ScriptCache and builds a fresh mock Runtime for every run, then
+    clears the Runtime singleton when the run ends, under any run still going on another thread. A server
+    process has one of each for all sessions, so give every simulated session the same script cache and
+    runtime (media files, cache storage, components). Compiling once also keeps concurrent runs out of
+    CPython 3.11's parser, which is not safe to call from several threads at once. Secrets and the
+    global.appTest option are set once too: AppTest swaps both globally around each of its runs.
+    Returns restore(), which puts every patched Streamlit global back (a no-op if already shared).
+
+    All of this rebuilds private AppTest internals (its ScriptCache / Runtime wiring, the component and
+    dataframe-source managers, config._set_option), which change between Streamlit releases: it is
+    checked against MIN_STREAMLIT and may need updating when Streamlit is upgraded."""
+    from unittest.mock import MagicMock
+    import streamlit as st
+    if streamlit_version() < MIN_STREAMLIT:
+        raise RuntimeError(f"loadtest.py needs streamlit>={'.'.join(map(str, MIN_STREAMLIT))} (found {st.__version__}); the app itself does not")
+    from streamlit import config
+    from streamlit.runtime import Runtime
+    from streamlit.testing.v1 import app_test, local_script_runner
+    if getattr(app_test.Runtime, "shared_for_load", False): return lambda: None
+    option = config.get_config_options()["global.appTest"]
+    # concurrent runs patch config.get_option out of order and can leave one run's mock installed: keep the real one
+    saved = (app_test.ScriptCache, local_script_runner.ScriptCache, app_test.Runtime, Runtime._instance, st.secrets,
+             config.get_option, option.value, option.where_defined)
+    cache = app_test.ScriptCache()
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: cache
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = app_test.MediaFileManager(app_test.MemoryMediaFileStorage("/mock/media"))
+    runtime.dataframe_source_mgr = app_test.DataframeSourceManager()
+    runtime.cache_storage_manager = app_test.MemoryCacheStorageManager()
+    runtime.bidi_component_registry = app_test.BidiComponentManager()
+    runtime.bidi_component_registry.discover_and_register_components(start_file_watching=False)
+
+    class SharedRuntime(Runtime):
+        shared_for_load = True  # AppTest's per-run set / clear lands here; Runtime.instance() keeps ours
+    app_test.Runtime = SharedRuntime
+    Runtime._instance = runtime
+    st.secrets = app_test.Secrets(); st.secrets._secrets = {"GEMINI_API_KEY": ""}
+    config._set_option("global.appTest", True, "loadtest.py")  # each run restores the value it found: keep it on
+
+    def restore():
+        (app_test.ScriptCache, local_script_runner.ScriptCache, app_test.Runtime, Runtime._instance, st.secrets,
+         config.get_option, value, where) = saved
+        config._set_option("global.appTest", value, where)
+    return restore
+
+class Session:
+    """One simulated user: an AppTest plus the timings of every interaction it made."""
+    def __init__(self, sid, seed, timeout=120):
+        from streamlit.testing.v1 import AppTest
+        self.sid = sid; self.rng = random.Random(seed)
+        self.at = AppTest.from_file(APP_PATH, default_timeout=timeout)  # secrets come from share_runtime()
+        self.steps = []; self.errors = []; self.flows_done = 0
+
+    def step(self, name, action):
+        t = time.perf_counter()
+        try:
+            action()
+            if len(self.at.exception): raise RuntimeError(self.at.exception[0].message)
+        except Exception as e:
+            self.errors.append((name, f"{type(e).__name__}: {e}"))
+            ok = False
+        else: ok = True
+        self.steps.append((name, time.perf_counter() - t, ok))
+        return ok
+
+    def _button(self, label): return next(b for b in self.at.button if b.label == label)
+    def _selectbox(self, label): return next(s for s in self.at.selectbox if s.label == label)
+
+    # Flows
+    def load(self):
+        self.step("page_load", self.at.run)
+
+    def birth_pro(self):
+        at, rng = self.at, self.rng
+        if at.radio(key="input_mode").value != "Birth Details":
+            self.step("switch_mode", lambda: at.radio(key="input_mode").set_value("Birth Details").run())
+        city, country = rng.choice(CITIES)
+        at.toggle[0].set_value(True)
+        at.date_input(key="b_d").set_value(datetime.date(1980, 1, 1) + datetime.timedelta(days=rng.randrange(7300)))
+        at.time_input(key="b_t").set_value(datetime.time(rng.randrange(24), rng.randrange(60)))
+        at.text_input(key="b_c").set_value(city); at.text_input(key="b_co").set_value(country)
+        at.date_input(key="g_d").set_value(datetime.date(1980, 1, 1) + datetime.timedelta(days=rng.randrange(7300)))
+        self.step("match_birth_pro", lambda: self._button("Check Compatibility").click().run())
+
+    def direct(self):
+        at, rng = self.at, self.rng
+        if at.radio(key="input_mode").value != "Direct Star Entry":
+            self.step("switch_mode", lambda: at.radio(key="input_mode").set_value("Direct Star Entry").run())
+        import app
+        at.selectbox(key="b_s").set_value(rng.choice(app.NAKSHATRAS)); at.selectbox(key="g_s").set_value(rng.choice(app.NAKSHATRAS))
+        self.step("select_stars", at.run)
+        at.selectbox(key="b_p").set_value(rng.randint(1, 4)); at.selectbox(key="g_p").set_value(rng.randint(1, 4))
+        self.step("match_direct", lambda: self._button("Check Compatibility").click().run())
+
+    def finder(self):
+        at, rng = self.at, self.rng
+        import app
+        self._selectbox("I am a").set_value(rng.choice(("Boy", "Girl"))); self._selectbox("My Star").set_value(rng.choice(app.NAKSHATRAS))
+        self.step("finder_search", lambda: self._button("Find Best Matches").click().run())
+        box = next(c for c in at.checkbox if c.label.startswith("Show Risky"))
+        self.step("finder_toggle_risky", lambda: box.set_value(not box.value).run())
+        sort = next(r for r in at.radio if r.label == "Sort Results By:")
+        self.step("finder_sort", lambda: sort.set_value(rng.choice(app.FINDER_SORT_OPTIONS)).run())
+
+    def pdf(self):
+        # The download button serves generate_pdf lazily; AppTest cannot click it, so build the same payload
+        import app
+        if "match_record" not in self.at.session_state or self.at.session_state["match_record"] is None: self.direct()
+        record = self.at.session_state["match_record"]
+        pitch = self.at.session_state["ai_pitch"] if "ai_pitch" in self.at.session_state else ""
+        def build():
+            if not app.generate_pdf(app.get_match_results(record), pitch=pitch): raise RuntimeError("empty PDF")
+        self.step("pdf", build)
+
+    def chat(self):
+        if "match_record" not in self.at.session_state or self.at.session_state["match_record"] is None: self.direct()
+        question = self.rng.choice(QUESTIONS)
+        self.step("chat", lambda: self.at.chat_input[0].set_value(question).run())
+
+    def play(self, flows, iterations):
+        self.load()
+        for _ in range(iterations):
+            for flow in flows:
+                try: getattr(self, flow)(); self.flows_done += 1
+                except Exception as e: self.errors.append((flow, f"{type(e).__name__}: {e}"))
+
+# --- 3. DRIVER ---
+def run_level(n, flows, iterations, seed=0, timeout=120):
+    """Runs n sessions concurrently; returns the level's report."""
+    gc.collect(); rss_before = rss_mb()
+    sessions = [Session(i, seed * 1000 + i, timeout) for i in range(n)]
+    gate = threading.Barrier(n + 1)
+
+    def worker(s):
+        gate.wait()
+        try: s.play(flows, iterations)
+        except Exception: s.errors.append(("session", traceback.format_exc(limit=3)))
+
+    threads = [threading.Thread(target=worker, args=(s,), daemon=True) for s in sessions]
+    for t in threads: t.start()
+    gate.wait(); t0 = time.perf_counter()
+    for t in threads: t.join()
+    wall = time.perf_counter() - t0
+    rss_after = rss_mb()
+
+    steps = [st for s in sessions for st in s.steps]
+    by_step = {}
+    for name, dt, _ in steps: by_step.setdefault(name, []).append(dt)
+    errors = [(s.sid, *e) for s in sessions for e in s.errors]
+    report = {
+        "sessions": n, "seconds": round(wall, 3),
+        "steps": len(steps), "flows": sum(s.flows_done for s in sessions), "errors": len(errors),
+        "steps_per_sec": round(len(steps) / wall, 2) if wall else 0.0,
+        "flows_per_sec": round(sum(s.flows_done for s in sessions) / wall, 2) if wall else 0.0,
+        "latency": summarize([dt for _, dt, _ in steps]),
+        "per_step": {name: summarize(v) for name, v in sorted(by_step.items())},
+        "rss_mb": round(rss_after, 1), "peak_rss_mb": round(peak_rss_mb(), 1),
+        "rss_per_session_mb": round((rss_after - rss_before) / n, 2),
+        "error_samples": [list(e) for e in errors[:5]],
+    }
+    del sessions; gc.collect()
+    return report
+
+def print_report(reports):
+    print(f"{'sessions':>8} {'steps/s':>9} {'flows/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7} {'RSS MB':>8} {'MB/sess':>8}")
+    for r in reports:
+        lat = r["latency"]
+        print(f"{r['sessions']:>8} {r['steps_per_sec']:>9.2f} {r['flows_per_sec']:>8.2f} {lat.get('p50_ms', 0):>9.1f} "
+              f"{lat.get('p95_ms', 0):>9.1f} {lat.get('p99_ms', 0):>9.1f} {r['errors']:>7} {r['rss_mb']:>8.1f} {r['rss_per_session_mb']:>8.2f}")
+    last = reports[-1]
+    print(f"\nPer step at {last['sessions']} sessions:")
+    for name, s in last["per_step"].items():
+        print(f"  {name:22} n={s['count']:<5} p50 {s['p50_ms']:>8.1f}  p95 {s['p95_ms']:>8.1f}  p99 {s['p99_ms']:>8.1f} ms")
+    for r in reports:
+        for e in r["error_samples"]: print(f"[ERROR] {r['sessions']} sessions, session {e[0]} {e[1]}: {e[2]}", file=sys.stderr)
+
+def main(argv=None):
+    p = argparse.ArgumentParser(prog="loadtest.py", description="Concurrent-session load test for the Streamlit app.")
+    p.add_argument("--sessions", type=int, nargs="+", default=[1, 4, 8], help="Concurrent session counts to run, one level each")
+    p.add_argument("--flows", nargs="+", choices=FLOWS, default=list(FLOWS))
+    p.add_argument("--iterations", type=int, default=2, help="Times each session repeats its flows")
+    p.add_argument("--ai-latency", type=float, default=0.5, help="Stand-in seconds before the first AI chunk")
+    p.add_argument("--ai-backend", help="VEDIC_AI_BACKEND for the run (default: standin)")
+    p.add_argument("--throttle-ai", action="store_true", help="Keep the AI scheduler's VEDIC_AI_RPM limits")
+    p.add_argument("--timeout", type=float, default=120, help="Seconds one script run may take")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("-o", "--output", default=DEFAULT_OUTPUT)
+    args = p.parse_args(argv)
+
+    # Must be set before the app (and its scheduler / backend singletons) is first imported
+    os.environ["VEDIC_AI_BACKEND"] = args.ai_backend or os.environ.get("VEDIC_AI_BACKEND", "standin")
+    os.environ["VEDIC_STANDIN_LATENCY"] = str(args.ai_latency)
+    if not args.throttle_ai: os.environ["VEDIC_AI_RPM"] = os.environ["VEDIC_AI_TPM"] = "1000000000"
+    os.environ.setdefault("VEDIC_AI_MAX_WAIT", "600")
+
+    import streamlit.logger
+    streamlit.logger.set_log_level("error")  # AppTest's bare-mode and deprecation warnings, once per run
+    share_runtime()
+    reports = []
+    for n in args.sessions:
+        print(f"[LOAD] {n} session(s) x {args.iterations} x {', '.join(args.flows)} ...", file=sys.stderr, flush=True)
+        reports.append(run_level(n, args.flows, args.iterations, args.seed, args.timeout))
+    print_report(reports)
+    with open(args.output, "w") as fh:
+        json.dump({"flows": args.flows, "iterations": args.iterations, "ai_latency_s": args.ai_latency, "levels": reports}, fh, indent=2)
+    return 1 if any(r["errors"] for r in reports) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""Optional hot-path instrumentation: per-stage durations, call counts and cache hit/miss counts.
+
+Off by default. Turn on with VEDIC_METRICS=1 (or metrics.enable() / the ?debug=1 panel in the app).
+While disabled every instrumented call pays a single flag check and nothing else.
+
+    @metrics.timed("get_planetary_positions")
+    def get_planetary_positions(...): ...
+
+    @metrics.timed("geocode_online")      # outer: every call
+    @st.cache_data(ttl=3600)
+    @metrics.cache_miss("geocode_online") # inner: only runs when the cache misses
+    def geocode_online(...): ...
+
+Exposed as a JSON-able snapshot() or Prometheus text via render_prometheus().
+"""
+import functools
+import os
+import threading
+import time
+
+# Latency buckets (seconds) for the Prometheus histogram
+BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+
+class _State:
+    enabled = os.environ.get("VEDIC_METRICS", "").lower() in ("1", "true", "yes", "on")
+
+STATE = _State()
+_lock = threading.Lock()
+_stages = {}
+
+def enable(): STATE.enabled = True
+def disable(): STATE.enabled = False
+def is_enabled(): return STATE.enabled
+
+def reset():
+    with _lock: _stages.clear()
+
+def _stage(name):
+    st = _stages.get(name)
+    if st is None:
+        st = _stages.setdefault(name, {"calls": 0, "errors": 0, "misses": 0, "cached": False,
+                                       "sum": 0.0, "max": 0.0, "buckets": [0] * len(BUCKETS)})
+    return st
+
+def observe(name, seconds, error=False):
+    with _lock:
+        st = _stage(name)
+        st["calls"] += 1; st["sum"] += seconds
+        if error: st["errors"] += 1
+        if seconds > st["max"]: st["max"] = seconds
+        for i, edge in enumerate(BUCKETS):
+            if seconds <= edge: st["buckets"][i] += 1; break
+
+def timed(name):
+    """Records duration, call count and error count for every call while enabled."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not STATE.enabled: return fn(*args, **kwargs)
+            t = time.perf_counter(); ok = False
+            try:
+                out = fn(*args, **kwargs); ok = True
+                return out
+            finally: observe(name, time.perf_counter() - t, error=not ok)
+        return wrapper
+    return deco
+
+def cache_miss(name):
+    """Goes *inside* a cache decorator: counts the calls the cache could not answer."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if STATE.enabled:
+                with _lock:
+                    st = _stage(name); st["misses"] += 1; st["cached"] = True
+            return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+class _NullTimer:
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+
+_NULL_TIMER = _NullTimer()
+
+class _Timer:
+    def __init__(self, name): self.name = name
+    def __enter__(self): self.t = time.perf_counter(); return self
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.name, time.perf_counter() - self.t, error=exc_type is not None); return False
+
+def stage(name):
+    """Context-manager form for code blocks: `with metrics.stage("render_pdf"): ...`"""
+    return _Timer(name) if STATE.enabled else _NULL_TIMER
+
+def snapshot():
+    with _lock:
+        out = {}
+        for name, st in sorted(_stages.items()):
+            row = {"calls": st["calls"], "errors": st["errors"], "total_ms": round(st["sum"] * 1000, 3),
+                   "mean_ms": round(st["sum"] / st["calls"] * 1000, 3) if st["calls"] else 0.0,
+                   "max_ms": round(st["max"] * 1000, 3)}
+            if st["cached"]:
+                row["cache_misses"] = st["misses"]; row["cache_hits"] = max(st["calls"] - st["misses"], 0)
+            out[name] = row
+        return {"enabled": STATE.enabled, "stages": out}
+
+def render_prometheus(prefix="vedic"):
+    lines = [f"# HELP {prefix}_stage_seconds Time spent per pipeline stage.", f"# TYPE {prefix}_stage_seconds histogram"]
+    with _lock:
+        items = sorted((n, dict(st, buckets=list(st["buckets"]))) for n, st in _stages.items())
+    for name, st in items:
+        cum = 0
+        for edge, count in zip(BUCKETS, st["buckets"]):
+            cum += count
+            lines.append(f'{prefix}_stage_seconds_bucket{{stage="{name}",le="{edge}"}} {cum}')
+        lines.append(f'{prefix}_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {st["calls"]}')
+        lines.append(f'{prefix}_stage_seconds_sum{{stage="{name}"}} {st["sum"]:.6f}')
+        lines.append(f'{prefix}_stage_seconds_count{{stage="{name}"}} {st["calls"]}')
+    lines += [f"# HELP {prefix}_stage_errors_total Calls that raised.", f"# TYPE {prefix}_stage_errors_total counter"]
+    lines += [f'{prefix}_stage_errors_total{{stage="{n}"}} {st["errors"]}' for n, st in items]
+    cached = [(n, st) for n, st in items if st["cached"]]
+    if cached:
+        lines += [f"# HELP {prefix}_cache_requests_total Cache lookups by result.", f"# TYPE {prefix}_cache_requests_total counter"]
+        for n, st in cached:
+            lines.append(f'{prefix}_cache_requests_total{{stage="{n}",result="hit"}} {max(st["calls"] - st["misses"], 0)}')
+            lines.append(f'{prefix}_cache_requests_total{{stage="{n}",result="miss"}} {st["misses"]}')
+    return "\n".join(lines) + "\n"
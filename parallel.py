@@ -0,0 +1,72 @@
+"""Shared thread pool for chart and match computation.
+
+The engine in app.py is safe to call from several threads at once: the astronomy tables are read-only
+tuples / mappings, every chart builds its own ephem Observer, libastro itself (which keeps C statics)
+is entered under sidereal.EPHEM_LOCK, each thread gets its own TimezoneFinder, and Nominatim calls
+are serialized. ephem holds the GIL while it computes, so threads pay off by overlapping the I/O
+around it (geocoding, the ephemeris cache) rather than by running ephem itself in parallel.
+
+    charts = parallel.map_charts([(date, time, city, country), ...])       # get_planetary_positions rows
+    results = parallel.map_matches([(b_nak, b_rashi, g_nak, g_rashi), ...])  # calculate_all rows
+    fut = parallel.submit(app.get_planetary_positions, date, time, city, country)
+
+Pool size (env): VEDIC_CORE_THREADS (min(32, CPUs + 4)).
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import profiler
+
+def _pool_size():
+    try: return max(1, int(os.environ["VEDIC_CORE_THREADS"]))
+    except (KeyError, ValueError): return min(32, (os.cpu_count() or 1) + 4)
+
+_lock = threading.Lock()
+_pool = None
+
+def get_pool():
+    global _pool
+    with _lock:
+        if _pool is None: _pool = ThreadPoolExecutor(max_workers=_pool_size(), thread_name_prefix="vedic-core")
+        return _pool
+
+def _script_ctx():
+    try: from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError: return None
+    return get_script_run_ctx(suppress_warning=True)
+
+def _run_in_ctx(ctx, fn, args, kwargs):
+    # Lends the submitting session's ScriptRunContext to the pool thread for this one call, so cached
+    # functions behave as they would inline; the thread is handed back to the pool without it.
+    from streamlit.runtime.scriptrunner import add_script_run_ctx
+    from streamlit.runtime.scriptrunner_utils.script_run_context import SCRIPT_RUN_CONTEXT_ATTR_NAME
+    thread = threading.current_thread()
+    add_script_run_ctx(thread, ctx)
+    try: return fn(*args, **kwargs)
+    finally:
+        if hasattr(thread, SCRIPT_RUN_CONTEXT_ATTR_NAME): delattr(thread, SCRIPT_RUN_CONTEXT_ATTR_NAME)
+
+def submit(fn, *args, **kwargs):
+    """Runs fn(*args, **kwargs) on the pool; called from a Streamlit script, the call keeps its session context
+    (and is recorded into the caller's profiler capture, if one is running)."""
+    fn = profiler.propagate(fn)
+    ctx = _script_ctx()
+    if ctx is None: return get_pool().submit(fn, *args, **kwargs)
+    return get_pool().submit(_run_in_ctx, ctx, fn, args, kwargs)
+
+def map_charts(births, detailed=False, use_cache=True):
+    """get_planetary_positions for each (date, time, city, country), in input order."""
+    import app
+    return list(get_pool().map(lambda b: app.get_planetary_positions(*b, detailed=detailed, use_cache=use_cache), births))
+
+def map_matches(couples):
+    """calculate_all for each (b_nak, b_rashi, g_nak, g_rashi[, b_d9, g_d9]) tuple, in input order."""
+    import app
+    return list(get_pool().map(lambda c: app.calculate_all(*c), couples))
+
+def shutdown(wait=True):
+    global _pool
+    with _lock:
+        pool, _pool = _pool, None
+    if pool is not None: pool.shutdown(wait=wait)
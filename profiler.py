@@ -0,0 +1,219 @@
+"""On-demand profiles of single requests: deterministic (cProfile -> .pstats) or sampling (-> speedscope JSON).
+
+Armed per request with ?profile=cprofile / ?profile=sample (or from the ?debug=1 panel), the app runs
+Check Compatibility, Find Matches, the AI pitch and PDF generation under capture(); finished captures
+are kept process-wide (newest VEDIC_PROFILE_KEEP, default 5) for download from the same pages.
+
+    with profiler.capture("check_compatibility", "sample") as cap:
+        get_match_results(record)
+    with cap.resume(): render_results()       # a later stretch of the same request (e.g. after st.rerun)
+    cap.finish()
+    cap.filename, cap.data, cap.summary
+
+Work the block hands to the core pool (parallel.submit) is profiled too: propagate(fn) carries the
+active capture over to the worker thread. Open the .pstats with snakeviz / python -m pstats and the
+.speedscope.json at https://www.speedscope.app.
+
+cProfile is one per process on Python 3.12+ (it takes the interpreter's sys.monitoring profiler slot
+and records every thread), so one thread at a time holds it: stretches that cannot get it (pool
+workers, a second session profiling at the same time) are recorded by the sampler instead and folded
+into the .pstats as estimated times. A cprofile capture that never got the slot is saved as a sample one.
+"""
+import cProfile
+import contextlib
+import io
+import itertools
+import json
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import deque
+
+MODES = ("cprofile", "sample")
+SAMPLE_INTERVAL = 0.002  # seconds between stack samples
+KEEP = int(os.environ.get("VEDIC_PROFILE_KEEP", 5))
+ALL_THREADS = sys.version_info >= (3, 12)  # an enabled cProfile.Profile sees every thread, not just its own
+
+RECENT = deque(maxlen=KEEP)
+_lock = threading.Lock()
+_ids = itertools.count(1)
+_local = threading.local()
+_cprofile_slot = threading.Lock()
+_cprofile_owner = None
+
+def recent():
+    with _lock: return list(RECENT)[::-1]
+
+def active():
+    return getattr(_local, "capture", None)
+
+class Capture:
+    def __init__(self, label, mode="cprofile", interval=SAMPLE_INTERVAL):
+        if mode not in MODES: raise ValueError(f"Unknown profile mode: {mode} (use {' or '.join(MODES)})")
+        self.id = next(_ids); self.label = label; self.mode = mode; self.requested = mode; self.interval = interval
+        self.started = time.time(); self.seconds = 0.0; self.finished = False
+        self.data = b""; self.summary = ""
+        self._lock = threading.Lock()
+        self._stats = None                        # cprofile: merged pstats.Stats
+        self._threads = {}; self._stacks = {}     # sample: watched thread ident -> name; name -> [(stack, weight)]
+        self._sampler = None
+
+    # -- recording --
+    @contextlib.contextmanager
+    def resume(self):
+        """Profiles the block on the current thread as part of this capture."""
+        if self.finished: raise RuntimeError(f"profile {self.id} is already finished")
+        outer = active(); _local.capture = self
+        t = time.perf_counter()
+        prof = self._claim_cprofile() if self.mode == "cprofile" else None
+        covered = prof is None and ALL_THREADS and _cprofile_owner is self  # our own profile already sees this thread
+        if prof is None and not covered: self._watch(threading.get_ident(), threading.current_thread().name)
+        try: yield self
+        finally:
+            if prof:
+                prof.disable(); self._release_cprofile()
+                self._add_stats(pstats.Stats(prof))
+            elif not covered: self._unwatch(threading.get_ident())
+            with self._lock: self.seconds += time.perf_counter() - t
+            _local.capture = outer
+
+    def _claim_cprofile(self):
+        global _cprofile_owner
+        if not _cprofile_slot.acquire(blocking=False): return None
+        prof = cProfile.Profile()
+        try: prof.enable()
+        except ValueError:  # another tool (a debugger, coverage) holds the interpreter's profiler
+            _cprofile_slot.release(); return None
+        _cprofile_owner = self
+        return prof
+
+    def _release_cprofile(self):
+        global _cprofile_owner
+        _cprofile_owner = None; _cprofile_slot.release()
+
+    def _add_stats(self, stats):
+        with self._lock:
+            if self._stats is None: self._stats = stats
+            else: self._stats.add(stats)
+
+    def _watch(self, ident, name):
+        with self._lock:
+            self._threads[ident] = name
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample_loop, name=f"profiler-{self.id}", daemon=True)
+                self._sampler.start()
+
+    def _unwatch(self, ident):
+        with self._lock: self._threads.pop(ident, None)
+
+    def _sample_loop(self):
+        last = time.perf_counter()
+        while not self.finished:
+            time.sleep(self.interval)
+            now = time.perf_counter(); weight = now - last; last = now
+            with self._lock: watched = dict(self._threads)
+            if not watched: continue
+            frames = sys._current_frames()
+            for ident, name in watched.items():
+                frame = frames.get(ident)
+                if frame is None: continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_name, code.co_filename, code.co_firstlineno)); frame = frame.f_back
+                with self._lock: self._stacks.setdefault(name, []).append((tuple(reversed(stack)), weight))
+
+    # -- output --
+    def finish(self):
+        """Stops recording, renders the downloadable profile and publishes it to recent()."""
+        if self.finished: return self
+        self.finished = True
+        if self._sampler is not None: self._sampler.join()
+        if self.mode == "cprofile" and self._stats is None and self._stacks: self.mode = "sample"  # never got the slot
+        if self.mode == "cprofile": self._render_pstats()
+        else: self._render_speedscope()
+        with _lock: RECENT.append(self)
+        return self
+
+    @property
+    def filename(self):
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started))
+        ext = "pstats" if self.mode == "cprofile" else "speedscope.json"
+        return f"vedic-{self.label}-{stamp}-{self.id}.{ext}"
+
+    @property
+    def mime(self):
+        return "application/octet-stream" if self.mode == "cprofile" else "application/json"
+
+    def _render_pstats(self):
+        if self._stacks: self._add_stats(pstats.Stats(_SampledStats(self._stacks)))
+        if self._stats is None: return
+        self.data = marshal.dumps(self._stats.stats)   # the format pstats.Stats(path) / snakeviz load
+        out = io.StringIO()
+        self._stats.stream = out
+        self._stats.sort_stats("cumulative").print_stats(25)
+        self.summary = out.getvalue()
+
+    def _render_speedscope(self):
+        frames, index = [], {}
+        def frame_id(f):
+            if f not in index:
+                index[f] = len(frames); frames.append({"name": f[0], "file": f[1], "line": f[2]})
+            return index[f]
+        profiles = []; self_time = {}
+        for name, samples in self._stacks.items():
+            total = sum(w for _, w in samples)
+            profiles.append({"type": "sampled", "name": f"{self.label} ({name})", "unit": "seconds", "startValue": 0, "endValue": total,
+                             "samples": [[frame_id(f) for f in stack] for stack, _ in samples], "weights": [w for _, w in samples]})
+            for stack, w in samples:
+                if stack: self_time[stack[-1]] = self_time.get(stack[-1], 0.0) + w
+        doc = {"$schema": "https://www.speedscope.app/file-format-schema.json", "name": self.label, "exporter": "vedic-matcher profiler",
+               "activeProfileIndex": 0, "shared": {"frames": frames}, "profiles": profiles}
+        self.data = json.dumps(doc).encode("utf-8")
+        top = sorted(self_time.items(), key=lambda kv: -kv[1])[:25]
+        self.summary = "\n".join(f"{w * 1000:9.1f} ms  {f[0]}  {os.path.basename(f[1])}:{f[2]}" for f, w in top)
+
+    def info(self):
+        return {"id": self.id, "label": self.label, "mode": self.mode, "requested": self.requested, "seconds": round(self.seconds, 4),
+                "bytes": len(self.data), "file": self.filename}
+
+class _SampledStats:
+    """Sampled stacks in the shape pstats.Stats loads from a profiler: sample counts as calls, sampled seconds as times."""
+    def __init__(self, stacks):
+        self.stacks = stacks
+
+    def create_stats(self):
+        stats = {}
+        def entry(func): return stats.setdefault(func, [0, 0, 0.0, 0.0, {}])
+        for samples in self.stacks.values():
+            for stack, w in samples:
+                funcs = [(f[1], f[2], f[0]) for f in stack]
+                if not funcs: continue
+                entry(funcs[-1])[2] += w
+                for caller, func in zip([None] + funcs, funcs):
+                    e = entry(func)
+                    if caller is not None:
+                        n, _, tt, ct = e[4].get(caller, (0, 0, 0.0, 0.0)); e[4][caller] = (n + 1, n + 1, tt, ct + w)
+                for func in set(funcs):
+                    e = entry(func); e[0] += 1; e[1] += 1; e[3] += w
+        self.stats = {func: (cc, nc, tt, ct, callers) for func, (cc, nc, tt, ct, callers) in stats.items()}
+
+@contextlib.contextmanager
+def capture(label, mode="cprofile", interval=SAMPLE_INTERVAL, finish=True):
+    """Profiles the block; with finish=False the capture stays open for resume() until finish()."""
+    cap = Capture(label, mode, interval)
+    try:
+        with cap.resume(): yield cap
+    finally:
+        if finish: cap.finish()
+
+def propagate(fn):
+    """fn bound to the caller's active capture, so a worker thread running it is profiled into the same file."""
+    cap = active()
+    if cap is None or cap.finished: return fn
+    def run(*args, **kwargs):
+        with cap.resume(): return fn(*args, **kwargs)
+    return run
@@ -0,0 +1,514 @@
+"""Declarative match-rule profiles, compiled once into lookup tables and remedy-precedence masks.
+
+A profile is plain data (a dict here, or a JSON file): the kootas in display order, each with a raw
+score rule, reason labels and an ordered remedy list, plus the Rajju / Vedha checks and the safety
+verdicts. compile_profile() turns it into 27 x 27 / 12 x 12 tables of (raw score, condition bits) and
+per-remedy (required, forbidden) bit masks, so scoring a couple is a few lookups and mask tests
+whichever tradition is active. app.calculate_all runs the active one.
+
+    profile = rules.compile_profile(rules.load_profile("south"), app.RULE_ATTRIBUTES)
+    score, bd, logs, rajju, vedha, safety, b_rajju, g_rajju, rajju_reason = profile.evaluate(b_nak, b_rashi, g_nak, g_rashi)
+
+    VEDIC_RULE_PROFILE=south streamlit run app.py        # or the path of a profile .json
+
+Raw score rules ("nak" / "rashi" columns come from app.RULE_ATTRIBUTES):
+    {"kind": "matrix", "attr": "rashi.lord", "matrix": "maitri" | [[...]]}      matrix[boy value][girl value]
+    {"kind": "same", "attr": "nak.yoni", "same": 4, "pairs": "yoni_enemies" | [[0, 8], ...], "pair_score": 0, "default": 2}
+    {"kind": "count", "over": "nak", "from": "boy", "cycle": 9, "bad": [3, 5, 7], "both": true, "scores": [3, 1.5, 0]}
+        count = places from one side to the other (1 = same), taken mod `cycle`; scores[number of bad
+        counts]; "good": [...] instead of "bad" lists the counts that pass
+Conditions (remedies, Rajju cancellation, safety) join literals with "&"; "!" negates one:
+    friends, d9_friends        the profile "friendship" holds for the Moon signs / the navamsa signs
+    same:<nak|rashi>.<attr>    both sides have the same value
+    count:<nak|rashi><op>N     count from the boy's index to the girl's
+    boy_star_in:<list>         the boy's star is in profile["star_lists"] (or app.RULE_ATTRIBUTES) <list>
+    <Koota>.<raw|final><op>N   another koota's points; a "final" reference resolves that koota first
+    rajju, vedha, score<op>N   Rajju dosha not cancelled / Vedha pair / total (safety verdicts only)
+Remedies are tried in order and the first that holds lifts the koota to full points. Koota points must
+total 36, the scale of the verdict thresholds and gauges. A safety verdict may carry a "key" (e.g.
+"double_dosha") so views can pick it out of grid()'s per-verdict masks.
+
+    g = profile.grid(naks[:, None], rashis[:, None], naks[None, :], rashis[None, :])   # whole matrices at once
+"""
+import json
+import operator
+import os
+import re
+
+OPS = {">=": operator.ge, "<=": operator.le, "==": operator.eq, "!=": operator.ne, ">": operator.gt, "<": operator.lt}
+DOMAINS = {"nak": 27, "rashi": 12}
+TOTAL_POINTS = 36
+DEFAULT = os.environ.get("VEDIC_RULE_PROFILE", "north")
+
+NAVAMSA_FIX = "Navamsa Lords ({b_d9_lord} & {g_d9_lord}) are Friendly"
+VEDHA_PAIRS = ((0, 17), (1, 16), (2, 15), (3, 14), (4, 22), (5, 21), (6, 20), (7, 19), (8, 18),
+               (9, 26), (10, 25), (11, 24), (12, 23), (13, 13))
+
+# --- 1. PROFILES ---
+NORTH = {
+    "name": "north", "title": "North Indian Ashta Koota",
+    "friendship": {"attr": "rashi.lord", "matrix": "maitri", "min": 4},
+    "kootas": [
+        {"name": "Varna", "max": 1, "raw": {"kind": "matrix", "attr": "rashi.varna", "matrix": [[1, 1, 1], [0, 1, 1], [0, 0, 1]]},
+         "reasons": [[1, "Natural Match"], [0, "Mismatch"]],
+         "problem": "Ego Conflict", "source": "Muhurtha Chintamani", "remedied": "Boosted by Support",
+         "remedies": [{"when": "friends", "fix": "Graha Maitri is Friendly"}, {"when": "d9_friends", "fix": NAVAMSA_FIX}]},
+        {"name": "Vashya", "max": 2,
+         "raw": {"kind": "matrix", "attr": "rashi.vashya", "matrix": [[2, 1, 0.5, 0.5], [1, 2, 0.5, 0.5], [0.5, 0.5, 2, 0.5], [0.5, 0.5, 0.5, 2]]},
+         "reasons": [[1, "Magnetic"], [0, "Mismatch"]],
+         "problem": "Attraction Mismatch", "source": "Brihat Parashara", "remedied": "Boosted by Support",
+         "remedies": [{"when": "Yoni.raw==4", "fix": "Yoni is Perfect (4/4)"}, {"when": "friends", "fix": "Graha Maitri is Friendly"},
+                      {"when": "d9_friends", "fix": NAVAMSA_FIX}]},
+        {"name": "Tara", "max": 3, "raw": {"kind": "count", "over": "nak", "from": "boy", "cycle": 9, "bad": [3, 5, 7], "both": True, "scores": [3, 1.5, 0]},
+         "reasons": [[3, "Benefic"], [1.5, "Mixed"], [0, "Malefic"]],
+         "problem": "Malefic Star Position", "source": "Muhurtha Martanda", "remedied": "Boosted by Support",
+         "remedies": [{"when": "friends", "fix": "Graha Maitri is Friendly"}, {"when": "d9_friends", "fix": NAVAMSA_FIX}]},
+        {"name": "Yoni", "max": 4, "raw": {"kind": "same", "attr": "nak.yoni", "same": 4, "pairs": "yoni_enemies", "pair_score": 0, "default": 2},
+         "reasons": [[4, "Perfect"], [0, "Mismatch"]],
+         "problem": "Nature Mismatch", "source": "Jataka Parijata", "remedied": "Compensated",
+         "remedies": [{"when": "friends", "fix": "Graha Maitri is Friendly"}, {"when": "d9_friends", "fix": NAVAMSA_FIX},
+                      {"when": "Bhakoot.final==7", "fix": "Bhakoot is Beneficial"}, {"when": "Vashya.final>=1", "fix": "Vashya is Magnetic"}]},
+        {"name": "Maitri", "max": 5, "raw": {"kind": "matrix", "attr": "rashi.lord", "matrix": "maitri"},
+         "reasons": [[4, "Friendly"], [0, "Enemy"]],
+         "problem": "Planetary Enemy", "source": "Brihat Parashara", "remedied": "Restored",
+         "remedies": [{"when": "d9_friends", "fix": NAVAMSA_FIX}, {"when": "Bhakoot.final==7", "fix": "Bhakoot is Beneficial"}]},
+        {"name": "Gana", "max": 6, "raw": {"kind": "matrix", "attr": "nak.gana", "matrix": [[6, 6, 1], [6, 6, 0], [1, 0, 6]]},
+         # Jyeshtha girl with a Purva Bhadrapada (Aquarius) boy counts as a Gana match
+         "overrides": [{"b_star": "Purva Bhadrapada", "g_star": "Jyeshtha", "b_rashi": "Aquarius", "raw": 6}],
+         "reasons": [[5, "Match"], [0, "Mismatch"]],
+         "problem": "Temperament Clash", "source": "Peeyushadhara", "remedied": "Boosted",
+         "remedies": [{"when": "count:nak>=14", "fix": "Star Distance > 14"}, {"when": "friends", "fix": "Graha Maitri is Friendly"},
+                      {"when": "d9_friends", "fix": NAVAMSA_FIX}, {"when": "Bhakoot.final==7", "fix": "Bhakoot is Beneficial"}]},
+        {"name": "Bhakoot", "max": 7, "raw": {"kind": "count", "over": "rashi", "from": "girl", "bad": [2, 12, 5, 9, 6, 8], "scores": [7, 0]},
+         "reasons": [[7, "Love Flow"], [0, "Blocked"]], "reasons_on": "final",
+         "problem": "Bad Position", "source": "Brihat Samhita", "remedied": "Compensated",
+         "remedies": [{"when": "friends", "fix": "Graha Maitri is Friendly"}, {"when": "!same:nak.nadi", "fix": "Nadi is Different (Healthy)"}]},
+        {"name": "Nadi", "max": 8, "raw": {"kind": "same", "attr": "nak.nadi", "same": 0, "default": 8},
+         "reasons": [[8, "Healthy"], [0, "Same Nadi (Dosha)"]],
+         "problem": "{b_nadi} vs {g_nadi}",
+         "remedies": [{"when": "same:nak.star & boy_star_in:same_nakshatra_allowed", "fix": "Star {b_star} is an Exception.",
+                       "reason": "Exception: Allowed Star", "source": "Classical List"},
+                      {"when": "same:rashi.sign & !same:nak.star", "fix": "Same Rashi, Different Star.",
+                       "reason": "Exception: Same Rashi", "source": "Muhurtha Martanda"},
+                      {"when": "friends", "fix": "Maitri overrides Nadi.", "reason": "Cancelled: Strong Maitri", "source": "Muhurtha Chintamani"}]},
+    ],
+    "rajju": {"attr": "nak.rajju", "source": "Vedic Tradition",
+              "cancel": [{"when": "friends", "label": "Graha Maitri"}, {"when": "same:rashi.sign", "label": "Same Moon Sign"}]},
+    "vedha": {"pairs": VEDHA_PAIRS},
+    # First verdict that holds wins
+    "safety": [{"when": "vedha", "label": "Risky Match (Vedha Dosha) ❌"},
+               {"when": "rajju", "label": "Risky Match (Rajju Dosha) ❌"},
+               {"when": "Bhakoot.final==0 & Nadi.final==0 & score>18", "label": "Risky Match (Double Dosha) ❌", "key": "double_dosha"}],
+}
+
+# Das Porutham: ten agreements counted from the girl's star / sign, weighted to the same 36 points
+SOUTH = {
+    "name": "south", "title": "South Indian Das Porutham",
+    "friendship": {"attr": "rashi.lord", "matrix": "maitri", "min": 4},
+    "kootas": [
+        {"name": "Dina", "max": 3, "raw": {"kind": "count", "over": "nak", "from": "girl", "cycle": 9, "good": [2, 4, 6, 8, 0], "scores": [3, 0]},
+         "reasons": [[3, "Auspicious"], [0, "Inauspicious"]],
+         "problem": "Malefic Star Count", "source": "South Indian Tradition", "remedied": "Compensated",
+         "remedies": [{"when": "Mahendra.raw==2", "fix": "Mahendra is Present"}]},
+        {"name": "Gana", "max": 4, "raw": {"kind": "matrix", "attr": "nak.gana", "matrix": [[4, 3, 1], [3, 4, 0], [1, 0, 4]]},
+         "reasons": [[3, "Match"], [0, "Mismatch"]],
+         "problem": "Temperament Clash", "source": "South Indian Tradition", "remedied": "Boosted",
+         "remedies": [{"when": "count:nak>=14", "fix": "Star Distance > 14"}, {"when": "friends", "fix": "Graha Maitri is Friendly"}]},
+        {"name": "Mahendra", "max": 2, "raw": {"kind": "count", "over": "nak", "from": "girl", "good": [4, 7, 10, 13, 16, 19, 22, 25], "scores": [2, 0]},
+         "reasons": [[2, "Prosperity"], [0, "Absent"]], "remedies": []},
+        {"name": "Stree Deergha", "max": 2, "raw": {"kind": "count", "over": "nak", "from": "girl", "good": list(range(14, 28)), "scores": [2, 0]},
+         "reasons": [[2, "Long Wellbeing"], [0, "Too Close"]], "remedies": []},
+        {"name": "Yoni", "max": 4, "raw": {"kind": "same", "attr": "nak.yoni", "same": 4, "pairs": "yoni_enemies", "pair_score": 0, "default": 2},
+         "reasons": [[4, "Perfect"], [2, "Neutral"], [0, "Enemy"]],
+         "problem": "Nature Mismatch", "source": "South Indian Tradition", "remedied": "Compensated",
+         "remedies": [{"when": "Yoni.raw>=2 & friends", "fix": "Graha Maitri is Friendly"}]},
+        {"name": "Rasi", "max": 7, "raw": {"kind": "count", "over": "rashi", "from": "girl", "bad": [2, 3, 4, 5, 6], "scores": [7, 0]},
+         "reasons": [[7, "Agreeable"], [0, "Adverse"]],
+         "problem": "Adverse Sign Position", "source": "South Indian Tradition", "remedied": "Compensated",
+         "remedies": [{"when": "friends", "fix": "Rasi Lords are Friendly"}, {"when": "d9_friends", "fix": NAVAMSA_FIX}]},
+        {"name": "Rasi Adhipathi", "max": 5, "raw": {"kind": "matrix", "attr": "rashi.lord", "matrix": "maitri"},
+         "reasons": [[4, "Friendly"], [0, "Enemy"]],
+         "problem": "Planetary Enemy", "source": "South Indian Tradition", "remedied": "Restored",
+         "remedies": [{"when": "d9_friends", "fix": NAVAMSA_FIX}]},
+        {"name": "Vasya", "max": 2,
+         "raw": {"kind": "matrix", "attr": "rashi.vashya", "matrix": [[2, 1, 0.5, 0.5], [1, 2, 0.5, 0.5], [0.5, 0.5, 2, 0.5], [0.5, 0.5, 0.5, 2]]},
+         "reasons": [[1, "Magnetic"], [0, "Mismatch"]], "remedies": []},
+        {"name": "Rajju", "max": 5, "raw": {"kind": "same", "attr": "nak.rajju", "same": 0, "default": 5},
+         "reasons": [[5, "Different Rajju"], [0, "Same Rajju"]],
+         "problem": "Same Rajju ({b_rajju})", "source": "Vedic Tradition", "remedied": "Cancelled",
+         "remedies": [{"when": "friends", "fix": "Neutralized by Graha Maitri"}, {"when": "same:rashi.sign", "fix": "Neutralized by Same Moon Sign"}]},
+        {"name": "Vedha", "max": 2, "raw": {"kind": "same", "attr": "nak.star", "pairs": VEDHA_PAIRS, "pair_score": 0, "default": 2},
+         "reasons": [[2, "No Affliction"], [0, "Afflicted"]], "remedies": []},
+    ],
+    "rajju": {"attr": "nak.rajju", "source": "Vedic Tradition",
+              "cancel": [{"when": "friends", "label": "Graha Maitri"}, {"when": "same:rashi.sign", "label": "Same Moon Sign"}]},
+    "vedha": {"pairs": VEDHA_PAIRS},
+    "safety": [{"when": "vedha", "label": "Risky Match (Vedha Dosha) ❌"},
+               {"when": "rajju", "label": "Risky Match (Rajju Dosha) ❌"}],
+}
+
+PROFILES = {"north": NORTH, "south": SOUTH}
+
+def load_profile(name=None):
+    """A built-in profile by name, or a profile from a .json file path."""
+    name = name or DEFAULT
+    if name in PROFILES: return PROFILES[name]
+    if os.path.isfile(name):
+        with open(name, encoding="utf-8") as fh: return json.load(fh)
+    raise ValueError(f"Unknown rule profile: {name} (use {', '.join(PROFILES)} or a .json path)")
+
+# --- 2. COMPILER ---
+_KOOTA_LITERAL = re.compile(r"^(.+)\.(raw|final)\s*(>=|<=|==|!=|>|<)\s*(-?[\d.]+)$")
+_COUNT_LITERAL = re.compile(r"^count:(nak|rashi)\s*(>=|<=|==|!=|>|<)\s*(\d+)$")
+_SCORE_LITERAL = re.compile(r"^score\s*(>=|<=|==|!=|>|<)\s*(-?[\d.]+)$")
+
+def _number(text):
+    value = float(text)
+    return int(value) if value.is_integer() else value
+
+class _Koota:
+    __slots__ = ("name", "max", "on_nak", "table", "overrides", "reasons", "on_final", "problem", "remedies", "final_checks", "deps")
+
+def _label(reasons, points):
+    return next(label for floor, label in reasons if points >= floor)
+
+def _template(text):
+    return (text, "{" in text)
+
+class Profile:
+    """A compiled profile; evaluate() has calculate_all's signature and return value."""
+    def __init__(self, spec, attributes):
+        self.spec = spec; self.name = spec.get("name", "custom"); self.title = spec.get("title", self.name)
+        self.attributes = attributes
+        self._bits = {}
+        self.nak_bits = [[0] * 27 for _ in range(27)]
+        self.rashi_bits = [[0] * 12 for _ in range(12)]
+        self.d9_bits = [[0] * 12 for _ in range(12)]
+        names = [k["name"] for k in spec["kootas"]]
+        if len(set(names)) != len(names): raise ValueError(f"{self.name}: duplicate koota names")
+        self.koota_names = tuple(names)
+        self.max_score = sum(k["max"] for k in spec["kootas"])
+        if self.max_score != TOTAL_POINTS: raise ValueError(f"{self.name}: koota points total {self.max_score}, expected {TOTAL_POINTS}")
+        self._raw_checks = {n: [] for n in names}; self._final_checks = {n: [] for n in names}
+        # Conditions first: they register the koota checks the raw tables carry
+        compiled = [[(self._condition(r["when"], owner=k["name"]), r) for r in k.get("remedies", ())] for k in spec["kootas"]]
+        self._vedha = self._bit("vedha"); self._rajju_fail = self._bit("rajju")
+        rajju = spec["rajju"]
+        self.rajju_cancel = tuple((self._condition(c["when"]), c["label"]) for c in rajju["cancel"])
+        self.rajju_source = rajju.get("source", "")
+        self.safety = tuple((self._condition(s["when"], safety=True), s["label"]) for s in spec["safety"])
+        self.verdict_keys = tuple(s.get("key") for s in spec["safety"])
+        self._rajju_col = self._column(rajju["attr"])[1]
+        self._rajju_same = self._bit("same:" + rajju["attr"])
+        self._rajju_names = attributes["names"][rajju["attr"].partition(".")[2]]
+        self.kootas = tuple(self._koota(k, c) for k, c in zip(spec["kootas"], compiled))
+        self.nak_bits = tuple(map(tuple, self.nak_bits)); self.rashi_bits = tuple(map(tuple, self.rashi_bits)); self.d9_bits = tuple(map(tuple, self.d9_bits))
+        self.order = self._resolve_order()
+        self._classes = {"nak": {}, "rashi": {}}; self._class_raws = {"nak": [], "rashi": []}
+        self.nak_pairs = self._pair_table("nak"); self.rashi_pairs = self._pair_table("rashi")
+        for b_nak, g_nak in {key for k in self.kootas for key in k.overrides}:   # intern override classes up front
+            for b_rashi in range(12):
+                for g_rashi in range(12): self._overridden(b_nak, g_nak, b_rashi, g_rashi)
+        self._outcomes = {}
+
+    # -- attributes --
+    def _column(self, spec):
+        domain, _, col = spec.partition(".")
+        if domain not in DOMAINS or col not in self.attributes[domain]: raise ValueError(f"{self.name}: unknown attribute {spec}")
+        return domain, self.attributes[domain][col]
+
+    def _named(self, section, value):
+        # Tables / pair lists may be inline or named entries of the attributes
+        return self.attributes[section][value] if isinstance(value, str) else value
+
+    def _star(self, name): return self.attributes["names"]["star"].index(name)
+
+    def _sign(self, name): return next(i for i, s in enumerate(self.attributes["names"]["sign"]) if s.startswith(name))
+
+    # -- condition bits --
+    def _bit(self, literal):
+        if literal in self._bits: return self._bits[literal]
+        bit = self._bits[literal] = 1 << len(self._bits)
+        m = _KOOTA_LITERAL.match(literal)
+        if m:
+            name, stage, op, value = m.groups()
+            if name not in self._raw_checks: raise ValueError(f"{self.name}: unknown koota in {literal!r}")
+            (self._raw_checks if stage == "raw" else self._final_checks)[name].append((bit, OPS[op], _number(value)))
+            return bit
+        if literal in ("rajju", "vedha"):
+            if literal == "vedha":
+                pairs = {(a, b) for a, b in self.spec["vedha"]["pairs"]} | {(b, a) for a, b in self.spec["vedha"]["pairs"]}
+                self._fill(self.nak_bits, bit, lambda b, g: (b, g) in pairs)
+            return bit
+        if literal in ("friends", "d9_friends"):
+            f = self.spec["friendship"]; _, col = self._column(f["attr"]); matrix = self._named("tables", f["matrix"])
+            self._fill(self.rashi_bits if literal == "friends" else self.d9_bits, bit, lambda b, g: matrix[col[b]][col[g]] >= f["min"])
+            return bit
+        if literal.startswith("same:"):
+            domain, col = self._column(literal[5:])
+            self._fill(self.nak_bits if domain == "nak" else self.rashi_bits, bit, lambda b, g: col[b] == col[g])
+            return bit
+        m = _COUNT_LITERAL.match(literal)
+        if m:
+            domain, op, value = m.groups(); n = DOMAINS[domain]
+            self._fill(self.nak_bits if domain == "nak" else self.rashi_bits, bit, lambda b, g: OPS[op]((g - b) % n + 1, int(value)))
+            return bit
+        if literal.startswith("boy_star_in:"):
+            key = literal[12:]
+            stars = self.spec.get("star_lists", {}).get(key) or self.attributes.get("lists", {}).get(key)
+            if stars is None: raise ValueError(f"{self.name}: unknown star list {key}")
+            listed = {self._star(s) for s in stars}
+            self._fill(self.nak_bits, bit, lambda b, g: b in listed)
+            return bit
+        raise ValueError(f"{self.name}: unknown condition {literal!r}")
+
+    @staticmethod
+    def _fill(table, bit, test):
+        for b in range(len(table)):
+            for g in range(len(table)):
+                if test(b, g): table[b][g] |= bit
+
+    def _condition(self, text, owner=None, safety=False):
+        """'a & !b' -> (required mask, forbidden mask, score checks)"""
+        required = forbidden = 0; score_checks = []
+        for literal in (part.strip() for part in text.split("&")):
+            negated = literal.startswith("!"); literal = literal.lstrip("!").strip()
+            m = _SCORE_LITERAL.match(literal)
+            if m:
+                if not safety or negated: raise ValueError(f"{self.name}: {literal!r} only fits a safety verdict")
+                score_checks.append((OPS[m.group(1)], _number(m.group(2)))); continue
+            if literal == "rajju" and not safety: raise ValueError(f"{self.name}: 'rajju' only fits a safety verdict")
+            if owner and literal.startswith(f"{owner}.final"): raise ValueError(f"{self.name}: {owner} cannot depend on its own final points")
+            bit = self._bit(literal)
+            if negated: forbidden |= bit
+            else: required |= bit
+        return required, forbidden, tuple(score_checks)
+
+    # -- kootas --
+    def _raw_score(self, rule):
+        kind = rule["kind"]
+        if kind == "matrix":
+            domain, col = self._column(rule["attr"]); matrix = self._named("tables", rule["matrix"])
+            return domain, lambda b, g: matrix[col[b]][col[g]]
+        if kind == "same":
+            domain, col = self._column(rule["attr"])
+            pairs = self._named("pairs", rule.get("pairs", ()))
+            hit = {(a, b) for a, b in pairs} | {(b, a) for a, b in pairs}
+            same = rule.get("same")
+            def score(b, g):
+                if (col[b], col[g]) in hit: return rule["pair_score"]
+                return same if same is not None and col[b] == col[g] else rule["default"]
+            return domain, score
+        if kind == "count":
+            domain = rule["over"]; n = DOMAINS[domain]; cycle = rule.get("cycle")
+            good = rule.get("good"); bad = set(rule.get("bad", ()))
+            def is_bad(count):
+                if cycle: count %= cycle
+                return count not in good if good is not None else count in bad
+            def score(b, g):
+                forward = (g - b) % n + 1; backward = (b - g) % n + 1
+                counts = (forward, backward) if rule.get("both") else ((forward,) if rule.get("from", "boy") == "boy" else (backward,))
+                return rule["scores"][sum(is_bad(c) for c in counts)]
+            return domain, score
+        raise ValueError(f"{self.name}: unknown raw rule kind {kind}")
+
+    def _raw_entry(self, name, raw):
+        bits = 0
+        for bit, op, value in self._raw_checks[name]:
+            if op(raw, value): bits |= bit
+        return raw, bits
+
+    def _koota(self, k, remedies):
+        out = _Koota()
+        out.name = k["name"]; out.max = k["max"]
+        domain, score = self._raw_score(k["raw"]); n = DOMAINS[domain]
+        out.on_nak = domain == "nak"
+        out.table = tuple(tuple(self._raw_entry(out.name, score(b, g)) for g in range(n)) for b in range(n))
+        out.overrides = {}
+        for o in k.get("overrides", ()):
+            key = (self._star(o["b_star"]), self._star(o["g_star"]))
+            b_rashi = self._sign(o["b_rashi"]) if "b_rashi" in o else None
+            g_rashi = self._sign(o["g_rashi"]) if "g_rashi" in o else None
+            out.overrides.setdefault(key, []).append((b_rashi, g_rashi, self._raw_entry(out.name, o["raw"])))
+        out.reasons = tuple((floor, label) for floor, label in sorted(k["reasons"], key=lambda r: -r[0]))
+        out.on_final = k.get("reasons_on") == "final"
+        out.problem = _template(k.get("problem", ""))
+        out.remedies = tuple((req, forb, (_template(r["fix"]), r.get("reason", k.get("remedied", "Remedied")), r.get("source", k.get("source", ""))))
+                             for (req, forb, _), r in remedies)
+        out.final_checks = tuple(self._final_checks[out.name])
+        out.deps = {m.group(1) for r in k.get("remedies", ()) for part in r["when"].split("&")
+                    for m in [_KOOTA_LITERAL.match(part.strip().lstrip("!").strip())] if m and m.group(2) == "final"}
+        return out
+
+    def _resolve_order(self):
+        # Earliest koota (display order) whose "final" references are resolved; keeps remedy logs in display order
+        done, order = set(), []
+        while len(order) < len(self.kootas):
+            ready = next((i for i, k in enumerate(self.kootas) if i not in order and k.deps <= done), None)
+            if ready is None: raise ValueError(f"{self.name}: koota remedies reference each other in a cycle")
+            order.append(ready); done.add(self.kootas[ready].name)
+        return tuple(order)
+
+    # -- pair tables --
+    def _class(self, domain, raws):
+        # Raw score vectors are interned: a class id stands for one combination of the domain's koota points
+        classes = self._classes[domain]
+        if raws not in classes: classes[raws] = len(classes); self._class_raws[domain].append(raws)
+        return classes[raws]
+
+    def _pair_entry(self, domain, b, g, overridden=None):
+        on_nak = domain == "nak"
+        bits = (self.nak_bits if on_nak else self.rashi_bits)[b][g]; raws = []
+        for k in self.kootas:
+            if k.on_nak != on_nak: continue
+            raw, raw_bits = (overridden or {}).get(k.name) or k.table[b][g]
+            raws.append(raw); bits |= raw_bits
+        return bits, self._class(domain, tuple(raws))
+
+    def _pair_table(self, domain):
+        n = DOMAINS[domain]
+        special = {key for k in self.kootas for key in k.overrides}
+        return tuple(tuple(self._pair_entry(domain, b, g) + (((b, g) in special),) * (domain == "nak") for g in range(n)) for b in range(n))
+
+    def _overridden(self, b_nak, g_nak, b_rashi, g_rashi):
+        entries = {}
+        for k in self.kootas:
+            for o_b, o_g, entry in k.overrides.get((b_nak, g_nak), ()):
+                if o_b in (None, b_rashi) and o_g in (None, g_rashi): entries[k.name] = entry; break
+        return self._pair_entry("nak", b_nak, g_nak, entries)
+
+    # -- scoring --
+    def _resolve(self, n_class, r_class, bits):
+        """Everything about a couple that follows from its raw points and condition bits; cached per combination."""
+        n_raws = iter(self._class_raws["nak"][n_class]); r_raws = iter(self._class_raws["rashi"][r_class])
+        raws = [next(n_raws) if k.on_nak else next(r_raws) for k in self.kootas]
+        finals = list(raws); reasons = [None] * len(raws); logs = []
+        for i in self.order:
+            k = self.kootas[i]; raw = raws[i]
+            if raw < k.max:
+                for req, forb, (fix, reason, source) in k.remedies:
+                    if bits & req != req or bits & forb: continue
+                    finals[i] = k.max; reasons[i] = reason
+                    logs.append((k.name, k.problem, fix, source))
+                    break
+            for bit, op, value in k.final_checks:
+                if op(finals[i], value): bits |= bit
+            if reasons[i] is None or k.on_final: reasons[i] = _label(k.reasons, finals[i] if k.on_final else raw)
+
+        score = 0; bd = []
+        for k, raw, final, reason in zip(self.kootas, raws, finals, reasons):
+            score += final; bd.append((k.name, raw, final, k.max, reason))
+
+        rajju = ("Pass", None)
+        if bits & self._rajju_same:
+            rajju = ("Fail", None)
+            for (req, forb, _), c_type in self.rajju_cancel:
+                if bits & req != req or bits & forb: continue
+                rajju = ("Cancelled", c_type)
+                logs.append(("Rajju", _template("Same Rajju ({b_rajju})"), _template(f"Neutralized by {c_type}"), self.rajju_source))
+                break
+            if rajju[0] == "Fail": bits |= self._rajju_fail
+        vedha_status = "Fail" if bits & self._vedha else "Pass"
+
+        safety = None
+        for (req, forb, checks), label in self.safety:
+            if bits & req == req and not bits & forb and all(op(score, v) for op, v in checks):
+                safety = label; break
+        return score, tuple(bd), tuple(logs), rajju, vedha_status, safety
+
+    def evaluate(self, b_nak, b_rashi, g_nak, g_rashi, b_d9_rashi=None, g_d9_rashi=None):
+        n_bits, n_class, special = self.nak_pairs[b_nak][g_nak]
+        if special: n_bits, n_class = self._overridden(b_nak, g_nak, b_rashi, g_rashi)
+        r_bits, r_class = self.rashi_pairs[b_rashi][g_rashi]
+        bits = n_bits | r_bits
+        if b_d9_rashi is not None and g_d9_rashi is not None: bits |= self.d9_bits[b_d9_rashi][g_d9_rashi]
+        key = (n_class, r_class, bits)
+        outcome = self._outcomes.get(key)
+        if outcome is None: outcome = self._outcomes[key] = self._resolve(n_class, r_class, bits)
+        score, bd, log_specs, (rajju_status, c_type), vedha_status, safety = outcome
+
+        b_rajju_name = self._rajju_names[self._rajju_col[b_nak]]; g_rajju_name = self._rajju_names[self._rajju_col[g_nak]]
+        if rajju_status == "Pass": rajju_reason = "No Rajju Dosha detected."
+        elif rajju_status == "Fail": rajju_reason = f"Both stars belong to {b_rajju_name}."
+        else: rajju_reason = f"Initial clash found ({b_rajju_name}), but it is **Cancelled due to {c_type}**."
+        logs = []
+        if log_specs:
+            fields = _Fields(self.attributes, b_nak, b_rashi, g_nak, g_rashi, b_d9_rashi, g_d9_rashi)
+            for attr, (problem, p_tpl), (fix, f_tpl), source in log_specs:
+                logs.append({"Attribute": attr, "Problem": problem.format_map(fields) if p_tpl else problem,
+                             "Fix": fix.format_map(fields) if f_tpl else fix, "Source": source})
+        return score, list(bd), logs, rajju_status, vedha_status, safety, b_rajju_name, g_rajju_name, rajju_reason
+
+    # -- vectorized --
+    def _np_tables(self):
+        if getattr(self, "_np", None) is None:
+            import numpy as np
+            if len(self._bits) > 62: raise ValueError(f"{self.name}: too many distinct conditions for grid()")
+            self._np = {"nak": np.array(self.nak_bits, dtype=np.int64), "rashi": np.array(self.rashi_bits, dtype=np.int64),
+                        "d9": np.array(self.d9_bits, dtype=np.int64),
+                        "kootas": [(np.array([[e[0] for e in row] for row in k.table], dtype=float),
+                                    np.array([[e[1] for e in row] for row in k.table], dtype=np.int64)) for k in self.kootas]}
+        return self._np
+
+    def grid(self, b_nak, b_rashi, g_nak, g_rashi, b_d9_rashi=None, g_d9_rashi=None):
+        """evaluate() over broadcast index arrays in one pass: {"raw", "score"} totals, Rajju / Vedha failure masks,
+        "verdicts" (one mask per safety verdict, each tested on its own) and "safety" (first verdict index, -1 none)."""
+        import numpy as np
+        t = self._np_tables()
+        b_nak, b_rashi, g_nak, g_rashi = np.broadcast_arrays(*(np.asarray(x, dtype=np.int64) for x in (b_nak, b_rashi, g_nak, g_rashi)))
+        bits = t["nak"][b_nak, g_nak] | t["rashi"][b_rashi, g_rashi]
+        if b_d9_rashi is not None and g_d9_rashi is not None:
+            bits = bits | t["d9"][np.asarray(b_d9_rashi, dtype=np.int64), np.asarray(g_d9_rashi, dtype=np.int64)]
+        raws = []
+        for k, (raw_t, bits_t) in zip(self.kootas, t["kootas"]):
+            idx = (b_nak, g_nak) if k.on_nak else (b_rashi, g_rashi)
+            raw = raw_t[idx]; raw_bits = bits_t[idx]
+            for (o_nak_b, o_nak_g), entries in k.overrides.items():
+                for o_b, o_g, (o_raw, o_bits) in reversed(entries):   # the first matching override wins
+                    hit = (b_nak == o_nak_b) & (g_nak == o_nak_g)
+                    if o_b is not None: hit &= b_rashi == o_b
+                    if o_g is not None: hit &= g_rashi == o_g
+                    raw = np.where(hit, o_raw, raw); raw_bits = np.where(hit, o_bits, raw_bits)
+            raws.append(raw); bits = bits | raw_bits
+
+        holds = lambda req, forb: ((bits & req) == req) & ((bits & forb) == 0)
+        finals = list(raws)
+        for i in self.order:
+            k = self.kootas[i]; pending = raws[i] < k.max
+            for req, forb, _ in k.remedies:
+                hit = pending & holds(req, forb)
+                finals[i] = np.where(hit, k.max, finals[i]); pending &= ~hit
+            for bit, op, value in k.final_checks: bits = bits | np.where(op(finals[i], value), bit, 0)
+        raw_total = sum(raws); score = sum(finals)
+
+        cancelled = np.zeros(bits.shape, dtype=bool)
+        for (req, forb, _), _ in self.rajju_cancel: cancelled |= holds(req, forb)
+        rajju = ((bits & self._rajju_same) != 0) & ~cancelled
+        bits = bits | np.where(rajju, self._rajju_fail, 0)
+        vedha = (bits & self._vedha) != 0
+        verdicts = []
+        for (req, forb, checks), _ in self.safety:
+            v = holds(req, forb)
+            for op, value in checks: v &= op(score, value)
+            verdicts.append(v)
+        safety = np.full(bits.shape, -1, dtype=np.int8)
+        for j in reversed(range(len(verdicts))): safety = np.where(verdicts[j], j, safety).astype(np.int8)
+        return {"raw": raw_total, "score": score, "rajju": rajju, "vedha": vedha, "verdicts": verdicts, "safety": safety}
+
+class _Fields(dict):
+    """Template fields resolved on use: b_star, g_nadi, b_d9_lord, ... (names of the couple's attribute values)."""
+    def __init__(self, attributes, b_nak, b_rashi, g_nak, g_rashi, b_d9, g_d9):
+        super().__init__()
+        self.attributes = attributes; self.index = {"b": (b_nak, b_rashi, b_d9), "g": (g_nak, g_rashi, g_d9)}
+
+    def __missing__(self, key):
+        side, _, col = key.partition("_")
+        nak, rashi, d9 = self.index[side]
+        if col.startswith("d9_"): col = col[3:]; domain, idx = "rashi", d9
+        elif col in self.attributes["nak"]: domain, idx = "nak", nak
+        else: domain, idx = "rashi", rashi
+        value = self[key] = self.attributes["names"][col][self.attributes[domain][col][idx]]
+        return value
+
+def compile_profile(spec, attributes):
+    return Profile(spec, attributes)
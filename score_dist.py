@@ -0,0 +1,82 @@
+"""Where a score sits among all couples: the distribution of raw and remedied scores over every pada pairing.
+
+Scores move in half points, so the whole distribution is a 73-bin histogram per score kind, built once
+from the 108 x 108 pada grid of the active rules. Every question about one couple is then a table read:
+
+    dist = app.get_score_distribution()
+    dist.percentile(24.5)                  # percentile rank among all couples (ties count half)
+    dist.better_slots("Boy", slot, 24.5)   # girl padas (of 108) that would score higher with this boy pada
+    dist.rank(score, raw, b_slot, g_slot)  # both of the above for a match, as a dict
+
+Pairings count equally by default. Real profiles are not spread evenly over the 108 padas, so the
+pairings can be weighted by how often each pada occurs: pass slot_counts() of a chart store, or point
+VEDIC_SCORE_WEIGHTS at one for the app (`python cli.py distribution` exports the table).
+"""
+import numpy as np
+
+STEP = 0.5   # every koota / porutham awards half points
+SLOTS = 108  # nak * 4 + pada - 1
+KINDS = ("score", "raw")
+
+def to_bin(score):
+    return int(round(float(score) / STEP))
+
+def slot_of(nak, d9_rashi):
+    """Pada slot from a nakshatra and its navamsa sign (the 4 padas of a star fall in 4 distinct signs); None if unknown."""
+    if d9_rashi is None: return None
+    p = (int(d9_rashi) - 4 * int(nak)) % 12
+    return int(nak) * 4 + p if p < 4 else None
+
+def slot_counts(store):
+    """(boy counts, girl counts) per pada slot in a chart_store.ChartStore (match: both sides, finder: by gender)."""
+    def counts(nak, pada, keep=None):
+        slots = np.asarray(nak, dtype=int) * 4 + np.asarray(pada, dtype=int) - 1
+        ok = (slots >= 0) & (slots < SLOTS) & (True if keep is None else keep)
+        return np.bincount(slots[ok], minlength=SLOTS)
+    if store.kind == "match":
+        return counts(store["b_nak"], store["b_pada"]), counts(store["g_nak"], store["g_pada"])
+    gender = np.asarray(store["gender"])
+    return counts(store["nak"], store["pada"], gender == 0), counts(store["nak"], store["pada"], gender == 1)
+
+class Distribution:
+    def __init__(self, raw, score, max_score=36, boy_weights=None, girl_weights=None):
+        raw, score = np.asarray(raw, dtype=float), np.asarray(score, dtype=float)
+        self.max_score = max_score; self.bins = to_bin(max_score) + 1
+        self.weighted = boy_weights is not None or girl_weights is not None
+        w = np.outer(_weights(boy_weights), _weights(girl_weights))
+        self.hist, self.share, self._rank = {}, {}, {}
+        for kind, grid in (("score", score), ("raw", raw)):
+            b = np.rint(grid / STEP).astype(int)
+            hist = np.bincount(b.ravel(), weights=w.ravel(), minlength=self.bins)
+            self.hist[kind] = hist; self.share[kind] = hist / hist.sum() * 100
+            self._rank[kind] = (np.cumsum(self.share[kind]) - self.share[kind] / 2).round(1)  # below + half the ties
+        # better[gender][source slot, bin]: partner slots whose remedied score with that source beats the bin
+        b = np.rint(score / STEP).astype(int)
+        self.better = {gender: _above_counts(rows, self.bins) for gender, rows in (("Boy", b), ("Girl", b.T))}
+
+    def percentile(self, score, kind="score"):
+        return float(self._rank[kind][to_bin(score)])
+
+    def better_slots(self, gender, slot, score):
+        return int(self.better[gender][slot, to_bin(score)])
+
+    def rank(self, score, raw_score, b_slot=None, g_slot=None):
+        return {"percentile": self.percentile(score), "raw_percentile": self.percentile(raw_score, "raw"),
+                "better_for_boy": None if b_slot is None else self.better_slots("Boy", b_slot, score),
+                "better_for_girl": None if g_slot is None else self.better_slots("Girl", g_slot, score)}
+
+    def table(self):
+        """One row per half-point score: share of couples (%) at that raw / remedied score and its percentile rank."""
+        return [{"Score": i * STEP, "Raw Share %": round(float(self.share["raw"][i]), 4), "Raw Percentile": float(self._rank["raw"][i]),
+                 "Remedied Share %": round(float(self.share["score"][i]), 4), "Remedied Percentile": float(self._rank["score"][i])}
+                for i in range(self.bins)]
+
+def _weights(counts):
+    if counts is None: return np.ones(SLOTS)
+    w = np.asarray(counts, dtype=float)
+    return w if w.sum() > 0 else np.ones(SLOTS)  # a side with no profiles counts every pada equally
+
+def _above_counts(rows, bins):
+    # per row: how many entries exceed each bin = total - cumulative count up to and including it
+    counts = np.apply_along_axis(np.bincount, 1, rows, minlength=bins)
+    return rows.shape[1] - np.cumsum(counts, axis=1)
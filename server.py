@@ -0,0 +1,298 @@
+"""Local HTTP/JSON scoring service (stdlib asyncio only, no web framework).
+
+Usage:
+    python server.py serve --port 8600
+    python server.py loadtest --url http://127.0.0.1:8600 --concurrency 64 --requests 20000
+
+Endpoints (JSON bodies, same fields as cli.py rows):
+    POST /match        {"b_star": "Ashwini", "b_pada": 1, "g_star": "Hasta", "g_pada": 3}
+    POST /match/batch  {"couples": [{...}, {...}]}   (at most MAX_BATCH_COUPLES couples)
+    POST /finder       {"gender": "Girl", "star": "Hasta", "pada": 3, "show_risky": false, "sort": "..."}
+    POST /chart        {"date": "1995-01-01", "time": "10:00", "city": "Hyderabad", "country": "India", "detailed": true}
+    GET  /health
+    GET  /metrics      Prometheus text (stage timings, cache hits) -- start with --metrics or VEDIC_METRICS=1
+    GET  /metrics.json same data as JSON
+Concurrent /match calls are coalesced into one batch per event-loop tick. Couples whose rashis are the
+ones their padas fall in (every birth-detail and star-only request) are scored against a memo of the
+finite 108 x 108 pada-pair space, so steady-state matching never re-runs the kootas; a request that
+overrides a rashi against its star is scored directly and never enters the memo.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import sys
+import time
+from functools import lru_cache
+from urllib.parse import urlsplit
+
+from app import (
+    NAKSHATRAS, RASHIS, FINDER_SORT_OPTIONS,
+    calculate_all, is_risky, lookup_best_matches, get_finder_index, filter_and_sort_matches, match_rank, get_score_distribution,
+    get_planetary_positions, get_nak_rashi_pada, calculate_d9_position, get_rashi_from_pada, get_d9_rashi_from_pada
+)
+from cli import resolve_person, parse_star, parse_pada, parse_rashi, person_label
+import metrics
+
+# --- 1. SCORING (memoized on the finite pada-pair space) ---
+def _person(slot):
+    nak, pada = divmod(slot, 4); pada += 1
+    return nak, get_rashi_from_pada(nak, pada), pada, get_d9_rashi_from_pada(nak, pada)
+
+def _slot(nak, rashi, pada, d9):
+    """Pada slot when rashi / d9 are the ones the pada falls in, else None (a caller-overridden rashi)."""
+    slot = nak * 4 + pada - 1
+    return slot if 0 <= slot < 108 and _person(slot) == (nak, rashi, pada, d9) else None
+
+@lru_cache(maxsize=108 * 108)
+def score_slots(b_slot, g_slot):
+    return _score(_person(b_slot) + _person(g_slot))
+
+def score_key(key):
+    b_slot, g_slot = _slot(*key[:4]), _slot(*key[4:])
+    if b_slot is None or g_slot is None: return _score(key)
+    return score_slots(b_slot, g_slot)
+
+def _score(key):
+    b_nak, b_rashi, b_pada, b_d9, g_nak, g_rashi, g_pada, g_d9 = key
+    score, bd, logs, rajju, vedha, safety, b_rajju, g_rajju, rajju_reason = calculate_all(b_nak, b_rashi, g_nak, g_rashi, b_d9, g_d9)
+    raw_score = sum(item[1] for item in bd)
+    return {
+        "boy": person_label(b_nak, b_rashi, b_pada), "girl": person_label(g_nak, g_rashi, g_pada),
+        "score": score, "raw_score": raw_score, "rank": match_rank(score, raw_score, b_nak, b_d9, g_nak, g_d9),
+        "breakdown": [{"attribute": a, "raw": r, "final": f, "max": m, "reason": why} for a, r, f, m, why in bd],
+        "remedies": logs,
+        "rajju": rajju, "vedha": vedha, "rajju_reason": rajju_reason, "b_rajju": b_rajju, "g_rajju": g_rajju,
+        "safety": safety, "is_risky": is_risky(safety)
+    }
+
+def couple_key(body):
+    b_nak, b_rashi, b_pada, b_d9 = resolve_person(body, "b_")
+    g_nak, g_rashi, g_pada, g_d9 = resolve_person(body, "g_")
+    return (b_nak, b_rashi, b_pada, b_d9, g_nak, g_rashi, g_pada, g_d9)
+
+def score_batch(keys):
+    """Scores a batch of couple keys; duplicates inside the batch are computed once."""
+    uniq = {k: score_key(k) for k in set(keys)}
+    return [uniq[k] for k in keys]
+
+def _needs_ephemeris(body):
+    return bool(body.get("b_date") or body.get("g_date"))
+
+MAX_BATCH_COUPLES = 2048  # one /match/batch body; larger jobs belong to `cli.py match`
+
+class MatchBatcher:
+    """Coalesces concurrent single /match requests into one score_batch call."""
+    def __init__(self, max_batch=512, max_wait=0.001):
+        self.max_batch = max_batch; self.max_wait = max_wait
+        self._pending = []; self._timer = None
+        self.batches = 0; self.coalesced = 0
+
+    async def submit(self, key):
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((key, fut))
+        if len(self._pending) >= self.max_batch: self._flush()
+        elif self._timer is None: self._timer = loop.call_later(self.max_wait, self._flush)
+        return await fut
+
+    def _flush(self):
+        if self._timer is not None: self._timer.cancel(); self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch: return
+        self.batches += 1; self.coalesced += len(batch)
+        try: results = score_batch([k for k, _ in batch])
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done(): fut.set_exception(e)
+            return
+        for (_, fut), res in zip(batch, results):
+            if not fut.done(): fut.set_result(res)
+
+# --- 2. HANDLERS ---
+class BadRequest(Exception): pass
+
+class PlainText(str):
+    """Handler return type for non-JSON bodies (Prometheus exposition)."""
+
+def _json_safe_chart(chart):
+    return {RASHIS[k].split(" ")[0]: v for k, v in sorted(chart.items())} if chart else None
+
+def _chart_sync(body):
+    date_obj = datetime.date.fromisoformat(str(body["date"]))
+    time_obj = datetime.time.fromisoformat(str(body.get("time") or "00:00"))
+    detailed = bool(body.get("detailed", False))
+    moon, mars, sun, loc_msg, d1, d9 = get_planetary_positions(date_obj, time_obj, body.get("city", ""), body.get("country", ""), detailed=detailed)
+    nak, rashi, pada = get_nak_rashi_pada(moon)
+    return {
+        "moon": moon, "mars": mars, "sun": sun, "location": loc_msg,
+        "nakshatra": NAKSHATRAS[nak], "nak_idx": nak, "rashi": RASHIS[rashi], "rashi_idx": rashi, "pada": pada,
+        "d9_rashi_idx": calculate_d9_position(moon), "d1": _json_safe_chart(d1), "d9": _json_safe_chart(d9)
+    }
+
+class ScoringApp:
+    def __init__(self, batcher):
+        self.batcher = batcher
+        self.routes = {
+            ("POST", "/match"): self.match, ("POST", "/match/batch"): self.match_batch,
+            ("POST", "/finder"): self.finder, ("POST", "/chart"): self.chart,
+            ("GET", "/health"): self.health,
+            ("GET", "/metrics"): self.metrics_text, ("GET", "/metrics.json"): self.metrics_json,
+        }
+        self.requests = 0; self.started = time.time()
+
+    async def match(self, body):
+        if _needs_ephemeris(body):
+            # Birth details hit ephem + geocoding: keep that off the event loop
+            key = await asyncio.get_running_loop().run_in_executor(None, couple_key, body)
+        else: key = couple_key(body)
+        return await self.batcher.submit(key)
+
+    async def match_batch(self, body):
+        couples = body.get("couples")
+        if not isinstance(couples, list): raise BadRequest("'couples' must be a list")
+        if len(couples) > MAX_BATCH_COUPLES: raise BadRequest(f"at most {MAX_BATCH_COUPLES} couples per batch (got {len(couples)})")
+        loop = asyncio.get_running_loop()
+        # Birth-detail couples resolve side by side on the executor (geocoding / ephemeris), star-only ones inline
+        async def key_of(c): return await loop.run_in_executor(None, couple_key, c) if _needs_ephemeris(c) else couple_key(c)
+        keys = await asyncio.gather(*(key_of(c) for c in couples))
+        # Rashi overrides miss the memo: score off the event loop so other connections keep flowing
+        return {"results": await loop.run_in_executor(None, score_batch, keys)}
+
+    async def finder(self, body):
+        gender = str(body.get("gender", "")).strip().capitalize()
+        if gender not in ("Boy", "Girl"): raise BadRequest("gender must be Boy or Girl")
+        nak = parse_star(body["star"]); pada = parse_pada(body["pada"])
+        sort_order = body.get("sort", "Raw Score (Highest First)")
+        if sort_order not in FINDER_SORT_OPTIONS: raise BadRequest(f"sort must be one of {FINDER_SORT_OPTIONS}")
+        matches = lookup_best_matches(gender, nak, parse_rashi(body.get("rashi"), nak, pada), pada)
+        return {"matches": filter_and_sort_matches(matches, bool(body.get("show_risky", False)), sort_order)}
+
+    async def chart(self, body):
+        if "date" not in body: raise BadRequest("'date' is required")
+        return await asyncio.get_running_loop().run_in_executor(None, _chart_sync, body)
+
+    async def health(self, body):
+        return {"status": "ok", "uptime_s": round(time.time() - self.started, 1), "requests": self.requests,
+                "match_batches": self.batcher.batches, "match_coalesced": self.batcher.coalesced,
+                "score_cache": score_slots.cache_info()._asdict()}
+
+    async def metrics_text(self, body):
+        return PlainText(metrics.render_prometheus())
+
+    async def metrics_json(self, body):
+        return metrics.snapshot()
+
+    async def dispatch(self, method, path, raw_body):
+        handler = self.routes.get((method, path))
+        if handler is None:
+            allowed = [m for (m, p) in self.routes if p == path]
+            return (405, {"error": f"Use {allowed[0]}"}) if allowed else (404, {"error": f"No route {path}"})
+        self.requests += 1
+        try:
+            body = json.loads(raw_body) if raw_body else {}
+            if not isinstance(body, dict): raise BadRequest("JSON body must be an object")
+            return 200, await handler(body)
+        except (BadRequest, KeyError, ValueError, TypeError) as e:
+            return 400, {"error": f"{type(e).__name__}: {e}"}
+        except Exception as e:
+            return 500, {"error": f"{type(e).__name__}: {e}"}
+
+# --- 3. MINIMAL HTTP/1.1 (keep-alive) ---
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error"}
+MAX_BODY = 8 * 1024 * 1024
+
+def _response(status, payload, keep_alive):
+    if isinstance(payload, PlainText):
+        body = payload.encode("utf-8"); ctype = "text/plain; version=0.0.4; charset=utf-8"
+    else:
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8"); ctype = "application/json; charset=utf-8"
+    head = (f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: {ctype}\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode("latin-1") + body
+
+async def handle_connection(app, reader, writer):
+    try:
+        while True:
+            try: head = await reader.readuntil(b"\r\n\r\n")
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError): break
+            lines = head.decode("latin-1").split("\r\n")
+            try: method, target, version = lines[0].split(" ", 2)
+            except ValueError: break
+            headers = {}
+            for line in lines[1:]:
+                if ":" in line:
+                    k, v = line.split(":", 1); headers[k.strip().lower()] = v.strip()
+            keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+            length = int(headers.get("content-length", 0) or 0)
+            if length > MAX_BODY:
+                writer.write(_response(413, {"error": "Body too large"}, False)); await writer.drain(); break
+            raw = await reader.readexactly(length) if length else b""
+            status, payload = await app.dispatch(method.upper(), urlsplit(target).path.rstrip("/") or "/", raw)
+            writer.write(_response(status, payload, keep_alive)); await writer.drain()
+            if not keep_alive: break
+    except (asyncio.IncompleteReadError, ConnectionError): pass
+    finally:
+        writer.close()
+
+async def serve(host, port, max_batch, max_wait_ms):
+    app = ScoringApp(MatchBatcher(max_batch=max_batch, max_wait=max_wait_ms / 1000.0))
+    get_finder_index()  # warm the 288-seeker finder index before taking traffic
+    get_score_distribution()  # and the percentile tables
+    server = await asyncio.start_server(lambda r, w: handle_connection(app, r, w), host, port, backlog=1024)
+    print(f"[SERVER] Vedic scoring service on http://{host}:{port} (batch<={max_batch}, wait {max_wait_ms}ms)", file=sys.stderr)
+    async with server: await server.serve_forever()
+
+# --- 4. LOCAL LOAD GENERATOR ---
+async def _client(host, port, path, payloads, latencies, errors, counter, total):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while counter[0] < total:
+            body = json.dumps(payloads[counter[0] % len(payloads)]).encode("utf-8"); counter[0] += 1
+            t = time.perf_counter()
+            writer.write(f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+            await writer.drain()
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = next(int(l.split(b":")[1]) for l in head.split(b"\r\n") if l.lower().startswith(b"content-length"))
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - t)
+            if not head.startswith(b"HTTP/1.1 200"): errors[0] += 1
+    finally:
+        writer.close()
+
+async def loadtest(url, path, concurrency, total):
+    parts = urlsplit(url)
+    payloads = [{"b_star": b, "b_pada": bp, "g_star": g, "g_pada": gp}
+                for b in range(0, 27, 2) for g in range(1, 27, 3) for bp in (1, 3) for gp in (2, 4)]
+    if path == "/finder": payloads = [{"gender": "Girl", "star": s, "pada": p} for s in range(27) for p in range(1, 5)]
+    latencies, errors, counter = [], [0], [0]
+    t0 = time.perf_counter()
+    await asyncio.gather(*(_client(parts.hostname, parts.port or 80, path, payloads, latencies, errors, counter, total) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    pct = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+    print(f"[LOADTEST] {path}: {len(latencies)} requests, {concurrency} connections, {errors[0]} errors")
+    print(f"[LOADTEST] {len(latencies) / elapsed:,.0f} req/s | p50 {pct(0.50):.2f}ms | p95 {pct(0.95):.2f}ms | p99 {pct(0.99):.2f}ms | max {latencies[-1] * 1000:.2f}ms")
+
+def main(argv=None):
+    p = argparse.ArgumentParser(prog="server.py", description="Local HTTP/JSON scoring service.")
+    sub = p.add_subparsers(dest="command", required=True)
+    sp = sub.add_parser("serve", help="Run the service")
+    sp.add_argument("--host", default="127.0.0.1"); sp.add_argument("--port", type=int, default=8600)
+    sp.add_argument("--max-batch", type=int, default=512, help="Flush a /match batch at this size")
+    sp.add_argument("--max-wait-ms", type=float, default=1.0, help="Longest a /match call waits for batch-mates")
+    sp.add_argument("--metrics", action="store_true", help="Record stage timings for /metrics (same as VEDIC_METRICS=1)")
+    lp = sub.add_parser("loadtest", help="Hammer a running service and report latency percentiles")
+    lp.add_argument("--url", default="http://127.0.0.1:8600"); lp.add_argument("--path", default="/match", choices=["/match", "/finder"])
+    lp.add_argument("--concurrency", type=int, default=64); lp.add_argument("--requests", type=int, default=20000)
+    args = p.parse_args(argv)
+    try:
+        if args.command == "serve":
+            if args.metrics: metrics.enable()
+            asyncio.run(serve(args.host, args.port, args.max_batch, args.max_wait_ms))
+        else: asyncio.run(loadtest(args.url, args.path, args.concurrency, args.requests))
+    except KeyboardInterrupt: pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""Per-session memory bounds: capped Guru AI chat history and a footprint report.
+
+Chat history keeps the newest turns within CHAT_MAX_MESSAGES / CHAT_MAX_CHARS; older turns are folded
+into one leading "compacted" note that remembers how many were dropped and the last few questions.
+Match results live in the session only as a compact record (see app.get_match_results).
+
+Limits (env): VEDIC_CHAT_MAX_MESSAGES (40), VEDIC_CHAT_MAX_CHARS (24000), VEDIC_CHAT_MAX_MESSAGE_CHARS (4000),
+VEDIC_RESULTS_CACHE (256 rebuilt result sets shared by all sessions).
+"""
+import os
+import sys
+
+def _env_int(name, default):
+    try: return int(os.environ.get(name, default))
+    except ValueError: return default
+
+CHAT_MAX_MESSAGES = _env_int("VEDIC_CHAT_MAX_MESSAGES", 40)
+CHAT_MAX_CHARS = _env_int("VEDIC_CHAT_MAX_CHARS", 24000)
+CHAT_MAX_MESSAGE_CHARS = _env_int("VEDIC_CHAT_MAX_MESSAGE_CHARS", 4000)
+RESULTS_CACHE_SIZE = _env_int("VEDIC_RESULTS_CACHE", 256)
+KEPT_TOPICS = 5
+
+# --- 1. CHAT HISTORY ---
+def _clip(text, limit):
+    text = str(text)
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+def compact_history(messages, max_messages=None, max_chars=None):
+    """Folds the oldest turns into a single leading note until the history fits. Edits `messages` in place."""
+    max_messages = max_messages or CHAT_MAX_MESSAGES; max_chars = max_chars or CHAT_MAX_CHARS
+    note = messages[0] if messages and messages[0].get("compacted") else None
+    turns = messages[1:] if note else list(messages)
+    folded = note["folded"] if note else 0; topics = list(note["topics"]) if note else []
+    size = sum(len(m["content"]) for m in turns)
+    while len(turns) > 1 and (len(turns) + (1 if folded else 0) > max_messages or size > max_chars):
+        old = turns.pop(0); folded += 1; size -= len(old["content"])
+        if old["role"] == "user": topics.append(_clip(old["content"], 60))
+    if not folded: return messages
+    topics = topics[-KEPT_TOPICS:]
+    summary = f"🗜️ {folded} earlier messages were compacted to save memory."
+    if topics: summary += " Earlier questions: " + "; ".join(topics)
+    messages[:] = [{"role": "assistant", "content": summary, "compacted": True, "folded": folded, "topics": topics}] + turns
+    return messages
+
+def append_message(messages, role, content):
+    messages.append({"role": role, "content": _clip(content, CHAT_MAX_MESSAGE_CHARS)})
+    return compact_history(messages)
+
+# --- 2. MEMORY REPORT ---
+def deep_size(obj, _seen=None):
+    """Approximate bytes held by `obj` and everything it contains (each object counted once)."""
+    seen = set() if _seen is None else _seen
+    if id(obj) in seen: return 0
+    seen.add(id(obj)); size = sys.getsizeof(obj)
+    if isinstance(obj, dict): size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)): size += sum(deep_size(v, seen) for v in obj)
+    elif hasattr(obj, "__dict__") and not isinstance(obj, type): size += deep_size(vars(obj), seen)
+    return size
+
+def session_report(state):
+    """{key: bytes} for a session_state-like mapping, largest first, plus totals and chat stats."""
+    items = {}
+    for k in list(state.keys()):
+        try: items[str(k)] = deep_size(state[k])
+        except Exception: items[str(k)] = -1
+    messages = state["messages"] if "messages" in state else []
+    return {
+        "total_bytes": sum(v for v in items.values() if v > 0),
+        "keys": dict(sorted(items.items(), key=lambda kv: -kv[1])),
+        "chat": {"messages": len(messages), "chars": sum(len(m["content"]) for m in messages),
+                 "compacted": messages[0]["folded"] if messages and messages[0].get("compacted") else 0,
+                 "limits": {"messages": CHAT_MAX_MESSAGES, "chars": CHAT_MAX_CHARS, "per_message": CHAT_MAX_MESSAGE_CHARS}},
+    }
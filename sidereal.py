@@ -0,0 +1,67 @@
+"""Sidereal (Lahiri) conversion shared by every chart path: D1/D9 charts, Rahu/Ketu, ascendant and Jupiter years.
+
+Ayanamsa is one formula, evaluated once per UT day and cached, so interactive charts, the bulk CLI
+and the scoring server all subtract exactly the same value for the same moment.
+
+    jd = ephem.julian_date(obs.date)
+    s_moon = sidereal.to_sidereal(sidereal.tropical_longitude(moon), jd)
+    lons = sidereal.to_sidereal_array([...tropical degrees...], jd)   # one vectorized call
+
+numpy is imported on first array use (see app.DEFERRED_IMPORTS).
+
+Thread safety: libastro (inside ephem) memoizes obliquity / nutation / precession in C statics, so every
+ephem computation in the app runs under EPHEM_LOCK. ephem never releases the GIL anyway, so this costs
+nothing on regular builds, and keeps free-threaded builds from racing on those statics.
+"""
+import functools
+import math
+import threading
+
+import ephem
+
+J2000 = 2451545.0
+AYANAMSA_J2000 = 23.85   # Lahiri at J2000, degrees
+AYANAMSA_RATE = 1.4      # degrees per Julian century (simplified rate)
+EPHEM_LOCK = threading.RLock()
+
+# --- 1. AYANAMSA ---
+def day_number(jd):
+    """UT civil day of a Julian date, keyed by that day's noon JD (an integer)."""
+    return math.floor(jd + 0.5)
+
+@functools.lru_cache(maxsize=4096)
+def ayanamsa_for_day(day):
+    return AYANAMSA_J2000 + AYANAMSA_RATE * ((day - J2000) / 36525.0)
+
+def lahiri_ayanamsa(jd):
+    return ayanamsa_for_day(day_number(jd))
+
+# --- 2. CONVERSION ---
+def tropical_longitude(body):
+    """Ecliptic-of-date longitude in degrees of an already computed ephem body."""
+    return math.degrees(ephem.Ecliptic(body).lon)
+
+def to_sidereal(lon, jd):
+    return (lon - lahiri_ayanamsa(jd)) % 360
+
+def to_sidereal_array(lons, jd):
+    """Vectorized to_sidereal: `lons` and `jd` may each be a scalar or an array (broadcast together).
+    Gives bit-for-bit the same values as the scalar path."""
+    import numpy as np
+    lons = np.asarray(lons, dtype=float)
+    if np.ndim(jd) == 0: ayan = lahiri_ayanamsa(float(jd))
+    else:
+        days = np.floor(np.asarray(jd, dtype=float) + 0.5)
+        ayan = AYANAMSA_J2000 + AYANAMSA_RATE * ((days - J2000) / 36525.0)
+    return np.mod(lons - ayan, 360.0)
+
+def compute_sidereal(obs, bodies, extra=()):
+    """Computes `bodies` for `obs` and returns their sidereal longitudes, followed by any `extra`
+    tropical longitudes (nodes, ascendant), as a list of floats from a single conversion."""
+    trop = []
+    with EPHEM_LOCK:
+        for body in bodies:
+            body.compute(obs); trop.append(tropical_longitude(body))
+        jd = ephem.julian_date(obs.date)
+    trop.extend(extra)
+    return to_sidereal_array(trop, jd).tolist()
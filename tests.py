@@ -12,8 +12,53 @@ from app import (
     NAKSHATRAS, 
     RASHIS, 
     SUN_TRANSIT_DATES,
-    get_working_model
+    get_working_model,
+    clean_text,
+    calculate_all as _calc,
+    find_best_matches,
+    filter_and_sort_matches
 )
+from cli import score_couples, scan_profiles, store_rows, score_store, scan_store
+import asyncio
+import json
+from server import ScoringApp, MatchBatcher
+from bench import compare as bench_compare
+import metrics
+import sidereal
+import varga
+import arcsec
+import ephem_cache
+import ai_scheduler
+import ai_backends
+import session_memory
+import kuja
+import chart_store
+import pickle
+import io
+import loadtest
+import parallel
+import rules
+import profiler
+import gazetteer
+import score_dist
+import types
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+import sqlite3
+import tempfile
+import os
+from app import generate_pdf, render_south_indian_chart, render_gauge_html, render_quick_scan
+from app import finder_seekers, get_finder_index, lookup_best_matches, get_planetary_positions, get_nak_rashi_pada, handle_ai_query, stream_ai_query, get_match_results, get_d9_rashi_from_pada
+
+# Charts computed by any test land in a throwaway ephemeris cache, never in ~/.cache/vedic-matcher
+_EPHEM_TMP = tempfile.TemporaryDirectory(); _EPHEM_PREVIOUS = ephem_cache.STATE.path
+
+def setUpModule():
+    ephem_cache.configure(os.path.join(_EPHEM_TMP.name, "ephemeris.sqlite3"))
+
+def tearDownModule():
+    ephem_cache.configure(_EPHEM_PREVIOUS); _EPHEM_TMP.cleanup()
 
 class TestVedicMatcher(unittest.TestCase):
 
@@ -36,7 +81,7 @@ class TestVedicMatcher(unittest.TestCase):
         Scenario: Ashwini (0) vs Krittika (2) -> Different Nadi (0 vs 2) -> Healthy.
         """
         try:
-            score, bd, logs, _, _ = calculate_all(0, 0, 2, 0)
+            score, bd, logs, *_ = calculate_all(0, 0, 2, 0)
             nadi_score = bd[7][2] # Index 7 is Nadi
             nadi_reason = bd[7][4]
             self.assertEqual(nadi_score, 8, "Nadi score should be 8 for different Nadis.")
@@ -48,7 +93,7 @@ class TestVedicMatcher(unittest.TestCase):
     def test_same_nakshatra_exception(self):
         """Test specific exception for Rohini (Index 3). Same star usually bad, but Rohini is allowed."""
         # Rohini is index 3.
-        score, bd, logs, _, _ = calculate_all(3, 1, 3, 1)
+        score, bd, logs, *_ = calculate_all(3, 1, 3, 1)
         nadi_score = bd[7][2]
         self.assertEqual(nadi_score, 8, "Rohini-Rohini match should get 8 points (Exception).")
         self.assertTrue(any(l['Attribute'] == 'Nadi' for l in logs), "Logs should reflect the Nadi exception.")
@@ -59,7 +104,7 @@ class TestVedicMatcher(unittest.TestCase):
         # Case: Mars in 7th from Moon
         is_dosha, msg = check_mars_dosha_smart(0, 180) # Moon at 0, Mars at 180 (7th house)
         self.assertTrue(is_dosha)
-        self.assertIn("Active Energy", msg, "Message should be user-friendly (Active Energy), not panic-inducing.")
+        self.assertIn("High Intensity", msg, "Message should be user-friendly (High Intensity), not panic-inducing.")
 
         # Case: Mars in Own Sign (Aries/Scorpio) cancellation
         # Moon in Cancer (90deg), Mars in Aries (0deg) -> 10th house (Safe)
@@ -87,5 +132,569 @@ class TestVedicMatcher(unittest.TestCase):
         # It should pick the first one in the list that matches our criteria
         self.assertEqual(selected_model, "models/gemini-1.5-flash", "Model Hunter failed to pick the first valid model.")
 
+    # --- TEST 7: PDF SANITIZER (SINGLE TRANSLATION TABLE) ---
+    def test_clean_text_pdf_safe(self):
+        """Known symbols become tags, every other non-ASCII char is dropped (incl. emoji variation selectors)."""
+        self.assertEqual(clean_text("⚠️ Risky ✅"), "[WARN] Risky [PASS]")
+        self.assertEqual(clean_text("🛡️ Safe 🤖"), "[PROTECTED] Safe AI:")
+        self.assertEqual(clean_text("Café ✨"), "Caf *")
+        self.assertEqual(clean_text(7), "7")
+
+    # --- TEST 8: BULK CLI PARITY WITH THE UI ---
+    def test_cli_matches_ui_paths(self):
+        """CLI couple rows score like Direct Star Entry, finder rows equal the filtered Find Matches list."""
+        rows, errors, n = score_couples((0, [{"b_star": "Ashwini", "b_pada": 1, "g_star": 2, "g_pada": 2}, {"b_star": "Nope", "b_pada": 1, "g_star": 0, "g_pada": 1}]), "id")
+        self.assertEqual((len(rows), len(errors), n), (1, 1, 2))
+        score, bd, *_ = _calc(0, 0, 2, 1, 0, 9)
+        self.assertEqual(rows[0]["Final Remedied Score"], score)
+        self.assertEqual(rows[0]["Raw Score"], sum(item[1] for item in bd))
+
+        rows, errors, _ = scan_profiles((0, [{"id": "p1", "gender": "girl", "star": "Hasta", "pada": 3}]), "id", False, "Raw Score (Highest First)")
+        expected = filter_and_sort_matches(find_best_matches("Girl", 12, 5, 3))
+        self.assertEqual([{k: v for k, v in r.items() if k != "id"} for r in rows], expected)
+
+    # --- TEST 9: HTTP SERVICE COALESCES CONCURRENT /match CALLS ---
+    def test_server_match_coalescing(self):
+        """Concurrent single matches land in one batch and agree with /match/batch."""
+        app = ScoringApp(MatchBatcher(max_wait=0.01))
+        body = json.dumps({"b_star": "Ashwini", "b_pada": 1, "g_star": "Hasta", "g_pada": 3})
+
+        async def run():
+            singles = await asyncio.gather(*(app.dispatch("POST", "/match", body) for _ in range(20)))
+            batch = await app.dispatch("POST", "/match/batch", json.dumps({"couples": [json.loads(body)]}))
+            missing = await app.dispatch("GET", "/nope", "")
+            births = [{"b_date": "1990-05-01", "b_time": "06:00", "b_city": "Hyderabad", "b_country": "India", "g_star": "Hasta", "g_pada": i % 4 + 1}
+                      for i in range(4)]
+            with patch("server.couple_key", side_effect=lambda c: (time.sleep(0.2), couple_key(c))[1]):
+                t = time.perf_counter()
+                born = await app.dispatch("POST", "/match/batch", json.dumps({"couples": births}))
+                born_s = time.perf_counter() - t
+            too_big = await app.dispatch("POST", "/match/batch", json.dumps({"couples": [json.loads(body)] * (server.MAX_BATCH_COUPLES + 1)}))
+            return singles, batch, missing, born, born_s, too_big
+
+        import server
+        couple_key = server.couple_key
+        singles, batch, missing, born, born_s, too_big = asyncio.run(run())
+        self.assertEqual(born[0], 200, born)
+        self.assertEqual([r["girl"] for r in born[1]["results"]], [f"Hasta (Virgo, Pada {i % 4 + 1})" for i in range(4)])
+        self.assertLess(born_s, 0.6)  # the four 0.2 s resolutions overlap instead of queueing
+        self.assertEqual(too_big[0], 400)
+        self.assertEqual(app.batcher.batches, 1)
+        self.assertTrue(all(status == 200 for status, _ in singles))
+        self.assertEqual(singles[0][1], batch[1]["results"][0])
+        self.assertEqual(missing[0], 404)
+
+        # The memo is keyed on the pada pair: a rashi overridden against its star is scored but never memoized
+        before = server.score_slots.cache_info().currsize
+        odd = server.couple_key({"b_star": "Ashwini", "b_pada": 1, "b_rashi": 7, "g_star": "Hasta", "g_pada": 3})
+        self.assertEqual(server.score_key(odd)["boy"], "Ashwini (Scorpio, Pada 1)")
+        self.assertEqual(server.score_slots.cache_info().currsize, before)
+        self.assertEqual(server.score_slots.cache_info().maxsize, 108 * 108)
+
+    # --- TEST 10: BENCHMARK REGRESSION GATE ---
+    def test_bench_compare_flags_regressions(self):
+        """Only cases slower than the baseline by more than the threshold are flagged."""
+        baseline = {"calculate_all": {"ops_per_sec": 1000.0}, "finder_all_slots": {"ops_per_sec": 10.0}}
+        current = {"calculate_all": {"ops_per_sec": 900.0}, "finder_all_slots": {"ops_per_sec": 5.0}, "new_case": {"ops_per_sec": 1.0}}
+        flagged = bench_compare(current, baseline, threshold=0.15)
+        self.assertEqual([name for name, *_ in flagged], ["finder_all_slots"])
+
+    # --- TEST 11: STAGE METRICS (OPT-IN) ---
+    def test_metrics_record_only_when_enabled(self):
+        """Disabled metrics record nothing; enabled ones count calls, durations and cache hits/misses."""
+        metrics.reset(); metrics.disable()
+        _calc(0, 0, 2, 0)
+        self.assertEqual(metrics.snapshot()["stages"], {})
+        metrics.enable()
+        try:
+            _calc(0, 0, 2, 0)
+            _, bd, *_ = _calc(5, 2, 9, 4)
+            res = {"b_n": "Ardra", "g_n": "Magha", "bd": bd}
+            generate_pdf(res, pitch="metrics test pitch"); generate_pdf(res, pitch="metrics test pitch")
+            stages = metrics.snapshot()["stages"]
+            self.assertEqual(stages["calculate_all"]["calls"], 2)
+            self.assertEqual((stages["generate_pdf"]["cache_misses"], stages["generate_pdf"]["cache_hits"]), (1, 1))
+            self.assertIn('vedic_stage_seconds_count{stage="calculate_all"} 2', metrics.render_prometheus())
+        finally:
+            metrics.disable(); metrics.reset()
+
+    # --- TEST 12: COLD START STAYS LIGHT ---
+    def test_app_import_defers_heavy_modules(self):
+        """A fresh `import app` must not pull in Gemini, pandas, fpdf or geopy (loaded at first use instead)."""
+        import subprocess, sys, os
+        probe = "import sys, app; print(','.join(m for m in ('google.generativeai', 'pandas', 'fpdf', 'geopy') if m in sys.modules))"
+        out = subprocess.run([sys.executable, "-W", "ignore", "-c", probe], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        self.assertEqual(out.returncode, 0, out.stderr)
+        self.assertEqual(out.stdout.strip(), "", f"Eagerly imported: {out.stdout.strip()}")
+
+    # --- TEST 13: MEMOIZED LIGHTWEIGHT RENDERERS ---
+    def test_cached_renderers(self):
+        """Charts are keyed on placements (not dict identity); SVG gauge clamps and shows the value."""
+        a = render_south_indian_chart({0: ["Su", "Mo"], 11: ["Asc"]}, "Boy D1")
+        b = render_south_indian_chart({11: ["Asc"], 0: ["Su", "Mo"]}, "Boy D1")
+        self.assertIs(a, b)
+        self.assertIn("Su<br>Mo", a)
+        self.assertIn(">24.5<", render_gauge_html(24.5, "#ffa500", "Remedied Score"))
+        self.assertNotIn("stroke='#00cc00'", render_gauge_html(0, "#00cc00", "Base Score"))
+        _, bd, *_ = _calc(0, 0, 2, 0)
+        self.assertEqual(render_quick_scan(tuple(bd)).count("guna-card"), 8)
+
+    # --- TEST 14: PRECOMPUTED FINDER INDEX ---
+    def test_finder_index(self):
+        """Index covers every seeker input and answers exactly like a live scan."""
+        index = get_finder_index()
+        self.assertEqual(len(index), len(list(finder_seekers())))
+        for seeker in [("Girl", 12, 5, 3), ("Boy", 0, 0, 1), ("Boy", 26, 11, 4)]:
+            self.assertIn(seeker, index)
+            self.assertEqual(lookup_best_matches(*seeker), find_best_matches(*seeker))
+        # Off-index input (rashi not valid for the star) falls back to a live scan
+        self.assertEqual(lookup_best_matches("Girl", 0, 7, 1), find_best_matches("Girl", 0, 7, 1))
+
+    # --- TEST 15: SHARED SIDEREAL LAYER ---
+    def test_sidereal_layer(self):
+        """One ayanamsa per UT day; the vectorized path matches the scalar path exactly."""
+        self.assertAlmostEqual(sidereal.lahiri_ayanamsa(2451545.0), 23.85)
+        self.assertEqual(sidereal.lahiri_ayanamsa(2451545.2), sidereal.lahiri_ayanamsa(2451544.6))
+        lons = [0.0, 10.5, 123.456, 359.99]; jds = [2451545.0, 2460000.3, 2440000.9, 2455555.5]
+        self.assertEqual(sidereal.to_sidereal_array(lons, jds).tolist(), [sidereal.to_sidereal(l, j) for l, j in zip(lons, jds)])
+        self.assertEqual(sidereal.to_sidereal_array(lons, jds[1]).tolist(), [sidereal.to_sidereal(l, jds[1]) for l in lons])
+        _, _, _, _, d1, d9 = get_planetary_positions(datetime.date(1990, 5, 17), datetime.time(8, 30), "", "", detailed=True)
+        self.assertEqual(sorted(p for ps in d1.values() for p in ps), sorted(["Su", "Mo", "Ma", "Me", "Ju", "Ve", "Sa", "Ra", "Ke", "Asc"]))
+        self.assertEqual(sum(len(ps) for ps in d9.values()), 10)
+
+    # --- TEST 16: VARGA ENGINE ---
+    def test_varga_engine(self):
+        """Table lookups follow the classical starting signs; scalar and array paths agree."""
+        self.assertEqual(varga.varga_sign(15.5, 9), 4)            # Aries 5th navamsa: Leo
+        self.assertEqual(varga.varga_sign(10 / 3 * 11, 9), 11)    # pada boundary goes to the later pada
+        self.assertEqual([varga.varga_sign(l, 2) for l in (10, 20, 40, 50)], [4, 3, 3, 4])      # Sun/Moon horas
+        self.assertEqual(varga.varga_sign(31, 10), 9)    # Taurus D10 starts from Capricorn
+        self.assertEqual(varga.varga_sign(31, 30), 1)    # even sign, first 5 degrees: Taurus
+        self.assertEqual(varga.varga_sign(359.99, 60), 10)
+        lons = [[0.0, 47.3, 199.9], [359.999, 123.4, 271.0]]
+        out = varga.varga_signs(lons)
+        self.assertEqual((out.shape, str(out.dtype)), ((len(varga.VARGAS), 2, 3), "int8"))
+        for i, n in enumerate(varga.VARGAS):
+            self.assertEqual(out[i].tolist(), [[varga.varga_sign(l, n) for l in row] for row in lons])
+
+    # --- TEST 17: FIXED-POINT NAKSHATRA / PADA ---
+    def test_fixed_point_boundaries(self):
+        """Exact integer spans; every pada boundary lands in the later pada in scalar and array form."""
+        self.assertEqual((arcsec.NAK_SPAN * 27, arcsec.PADA_SPAN * 108), (arcsec.FULL_CIRCLE, arcsec.FULL_CIRCLE))
+        bounds = [i * 10 / 3 for i in range(108)]
+        scalar = [arcsec.nak_rashi_pada(arcsec.to_mas(l)) for l in bounds]
+        self.assertEqual(scalar, [(i // 4, int(i * 10 / 3 // 30), i % 4 + 1) for i in range(108)])
+        naks, rashis, padas = arcsec.nak_rashi_pada_array(arcsec.to_mas_array(bounds))
+        self.assertEqual(list(zip(naks.tolist(), rashis.tolist(), padas.tolist())), scalar)
+        self.assertEqual(arcsec.navamsa_array(arcsec.to_mas_array(bounds)).tolist(), [i % 12 for i in range(108)])
+        self.assertEqual(get_nak_rashi_pada(359.9999999999), (0, 0, 1))  # wraps instead of nakshatra 27
+
+    # --- TEST 18: PERSISTENT EPHEMERIS CACHE ---
+    def test_ephemeris_disk_cache(self):
+        """Charts are stored once per normalized key, served from disk, and dropped on a version change."""
+        path = os.path.join(tempfile.mkdtemp(), "ephemeris.sqlite3"); previous = ephem_cache.STATE.path
+        ephem_cache.configure(path)
+        try:
+            birth = (datetime.date(1988, 2, 29), datetime.time(23, 45), "", "")
+            fresh = get_planetary_positions(*birth, detailed=True, use_cache=False)
+            first = get_planetary_positions(*birth, detailed=True)
+            with patch("app.compute_chart", side_effect=AssertionError("recomputed")):
+                again = get_planetary_positions(*birth, detailed=True)
+                basic = get_planetary_positions(*birth)
+            self.assertEqual(first, fresh); self.assertEqual(again, fresh)
+            self.assertEqual(basic[:3], fresh[:3]); self.assertIsNone(basic[4])
+            self.assertEqual(ephem_cache.size(), 1)
+            with sqlite3.connect(path) as db: db.execute("UPDATE meta SET v = 'stale' WHERE k = 'version'")
+            ephem_cache.configure(path)
+            self.assertEqual(ephem_cache.size(), 0)
+        finally: ephem_cache.configure(previous)
+
+    # --- TEST 19: AI REQUEST SCHEDULER ---
+    def test_ai_scheduler(self):
+        """Rate-limited slots queue with a bounded wait, transient errors retry, duplicate prompts coalesce."""
+        now = [0.0]; slept = []
+        def sleep(s): slept.append(s); now[0] += s
+        sched = ai_scheduler.AIScheduler(rpm=60, tpm=10**9, max_wait=2.5, retries=2, backoff=0.1, clock=lambda: now[0], sleep=sleep)
+        # 60 rpm = 1/s with a 5-request burst; a sequential caller sleeps 1s per request after the burst
+        for _ in range(7): sched.run("k", lambda: "ok")
+        self.assertEqual(slept, [1.0, 1.0])
+        # Concurrent reservations queue up behind each other until the wait would pass max_wait
+        self.assertEqual([sched.admit("q", 1) for _ in range(7)], [0, 0, 0, 0, 0, 1.0, 2.0])
+        with self.assertRaises(ai_scheduler.QueueFull): sched.admit("q", 1)
+        self.assertEqual(sched.admit("other-key", 1), 0)  # buckets are per key
+
+        calls = []
+        def flaky():
+            calls.append(1)
+            if len(calls) < 3: raise RuntimeError("429 Resource has been exhausted")
+            return "answer"
+        now[0] += 60
+        self.assertEqual(sched.run("k", flaky), "answer")
+        self.assertEqual((len(calls), sched.stats["retries"]), (3, 2))
+        with self.assertRaises(ValueError): sched.run("k", lambda: (_ for _ in ()).throw(ValueError("bad prompt")))
+
+        live = ai_scheduler.AIScheduler(rpm=6000, tpm=10**9)
+        gate = threading.Event(); upstream = []
+        def slow(): upstream.append(1); gate.wait(2); return "shared"
+        out = []
+        threads = [threading.Thread(target=lambda: out.append(live.run("k", slow, dedupe=("ctx", "same prompt")))) for _ in range(4)]
+        for th in threads: th.start()
+        time.sleep(0.05); gate.set()
+        for th in threads: th.join()
+        self.assertEqual((out, len(upstream), live.stats["coalesced"]), (["shared"] * 4, 1, 3))
+
+        with patch.object(ai_scheduler.SCHEDULER, "run", side_effect=ai_scheduler.QueueFull(12.4)):
+            self.assertIn("12 seconds", handle_ai_query("q", "ctx", "key"))
+
+    # --- TEST 20: OFFLINE AI STAND-IN ---
+    def test_ai_standin_backend(self):
+        """Deterministic answers, simulated 429s, and the chat/pitch paths running with no key or network."""
+        fake = ai_backends.StandInBackend(latency=0, token_delay=0, fail_every=3)
+        self.assertEqual(fake.reply("Remedies?", "ctx"), fake.reply("Remedies?", "ctx"))
+        self.assertNotEqual(fake.answer("Remedies?", "ctx"), fake.answer("Remedies?", "other ctx"))
+        with self.assertRaises(ai_backends.StandInQuotaError): fake.reply("Remedies?", "ctx")
+        now = [0.0]
+        quota = ai_backends.StandInBackend(latency=0, token_delay=0, rpm=2, clock=lambda: now[0])
+        quota.reply("a", ""); quota.reply("b", "")
+        with self.assertRaisesRegex(ai_backends.StandInQuotaError, "429"): quota.reply("c", "")
+        now[0] = 61; quota.reply("c", "")
+
+        previous = ai_backends.STATE.backend
+        try:
+            backend = ai_backends.use(ai_backends.StandInBackend(latency=0, token_delay=0))
+            self.assertFalse(backend.needs_key)
+            answer = handle_ai_query("Is this good for marriage?", "Match Context", "standin")
+            self.assertEqual(answer, backend.answer("Is this good for marriage?", "Match Context"))
+            self.assertEqual("".join(stream_ai_query("Is this good for marriage?", "Match Context", "standin")), answer)
+
+            server = ai_backends.make_standin_server(port=0, backend=ai_backends.StandInBackend(latency=0, token_delay=0, fail_every=2))
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            try:
+                http = ai_backends.HTTPBackend(f"http://127.0.0.1:{server.server_address[1]}")
+                self.assertEqual("".join(http.stream("Remedies?", "ctx")), backend.answer("Remedies?", "ctx"))
+                with self.assertRaisesRegex(RuntimeError, "429"): http.reply("Remedies?", "ctx")
+            finally: server.shutdown(); server.server_close()
+        finally: ai_backends.STATE.backend = previous
+
+    # --- TEST 21: BOUNDED SESSION MEMORY ---
+    def test_bounded_session_memory(self):
+        """Chat history stays within its caps; results are a small record rebuilt from a shared cache."""
+        messages = []
+        with patch.object(session_memory, "CHAT_MAX_MESSAGES", 6), patch.object(session_memory, "CHAT_MAX_MESSAGE_CHARS", 50):
+            for i in range(20):
+                session_memory.append_message(messages, "user", f"question {i}")
+                session_memory.append_message(messages, "assistant", "x" * 500)
+        self.assertEqual(len(messages), 6)
+        self.assertTrue(messages[0]["compacted"]); self.assertEqual(messages[0]["folded"], 35)
+        self.assertIn("question 17", messages[0]["content"]); self.assertNotIn("question 12", messages[0]["content"]); self.assertEqual(messages[-2]["content"], "question 19")
+        self.assertTrue(all(len(m["content"]) <= 50 for m in messages[1:]))
+        with patch.object(session_memory, "CHAT_MAX_CHARS", 120):
+            big = [{"role": "user", "content": "y" * 100} for _ in range(3)]
+            session_memory.compact_history(big)
+            self.assertEqual([m.get("folded") for m in big], [2, None])
+
+        record = ("direct", True, (0, 0, 1), (12, 5, 3))
+        res = get_match_results(record)
+        self.assertIs(get_match_results(record), res)
+        self.assertEqual(res["score"], _calc(0, 0, 12, 5, 0, get_d9_rashi_from_pada(12, 3))[0])
+        self.assertEqual(get_match_results(None), {})
+        with self.assertRaises(TypeError): res["score"] = 0   # one shared object: sessions only get a read-only view
+        self.assertIsInstance(res["bd"], tuple)
+
+        import app
+        born = ("birth", False, (datetime.date(1991, 3, 3), datetime.time(7, 30), "Chennai", "India"),
+                (datetime.date(1992, 4, 4), datetime.time(8, 45), "Nowhereville", "India"))
+        with patch("app.get_cached_coords", side_effect=lambda city, country: None if city == "Nowhereville" else gazetteer.resolve(city, country)):
+            cached = app._cached_match_results.cache_info().currsize
+            degraded = get_match_results(born)
+            self.assertIsNot(get_match_results(born), degraded)  # the Delhi / manual-TZ fallback is rebuilt, never shared
+            self.assertEqual(app._cached_match_results.cache_info().currsize, cached)
+        report = session_memory.session_report({"match_record": record, "messages": messages})
+        self.assertLess(report["keys"]["match_record"], 2000)
+        self.assertEqual(report["chat"]["messages"], 6)
+
+    # --- TEST 22: VECTORIZED KUJA SCREENING ---
+    def test_vectorized_kuja_screening(self):
+        """Batch Kuja codes agree with check_mars_dosha_smart, and --kuja drops couples before scoring."""
+        import numpy as np
+        moons = np.repeat(np.arange(12), 36); mars = np.tile(np.arange(36) * 10 + 5.0, 12)
+        codes = kuja.kuja_status_array(moons, mars)
+        for moon, lon, code in zip(moons, mars, codes):
+            self.assertEqual(code, kuja.kuja_status(int(moon), lon))
+            self.assertEqual(code == kuja.DOSHA, check_mars_dosha_smart(int(moon), lon)[0])
+        self.assertEqual(kuja.kuja_status(0, 185.0), kuja.DOSHA)             # Libra: 7th from Aries
+        self.assertEqual(kuja.kuja_status(3, 275.0), kuja.CANCELLED_EXALTED)  # Capricorn: 7th from Cancer
+        self.assertEqual(kuja.kuja_status(1, 275.0), kuja.NO_DOSHA)           # 9th from Taurus
+        self.assertEqual(kuja.kuja_status_array([0], [float("nan")])[0], kuja.UNKNOWN)
+
+        a = np.array([kuja.DOSHA, kuja.DOSHA, kuja.NO_DOSHA, kuja.UNKNOWN, kuja.CANCELLED_OWN_SIGN])
+        b = np.array([kuja.DOSHA, kuja.NO_DOSHA, kuja.CANCELLED_EXALTED, kuja.DOSHA, kuja.DOSHA])
+        self.assertEqual(kuja.compatible_mask(a, b).tolist(), [True, False, True, True, False])
+        self.assertEqual(kuja.compatible_mask(a, b, "strict").tolist(), [True, False, True, False, False])
+
+        # Birth details carry both Mars placements: a one-sided Kuja Dosha makes the match risky
+        def chart(date, time, city, country, detailed=False):
+            return {"Boy": (5.0, 185.0), "Girl": (100.0, 160.0), "Both": (100.0, 130.0)}[city] + (None, None, None, None)
+        with patch("app.get_planetary_positions", side_effect=chart):
+            when = (datetime.date(1990, 5, 1), datetime.time(6, 0))
+            res = get_match_results(("birth", False, (*when, "Boy", "India"), (*when, "Girl", "India")))
+            self.assertTrue(res["safety"].endswith("Risky Match (Boy has Kuja Dosha) ❌"), res["safety"])
+            self.assertTrue(res["b_mars"][0]); self.assertFalse(res["g_mars"][0])
+            res = get_match_results(("birth", False, (*when, "Boy", "India"), (*when, "Both", "India")))
+            self.assertNotIn("Kuja", res["safety"] or "")
+
+        couples = [{"id": 1, "b_star": 0, "b_pada": 1, "g_star": 12, "g_pada": 3, "b_manglik": "yes", "g_manglik": "no"},
+                   {"id": 2, "b_star": 0, "b_pada": 1, "g_star": 12, "g_pada": 3, "b_mars": 185.0, "g_mars": 5.0 + 30 * 6},
+                   {"id": 3, "b_star": 0, "b_pada": 1, "g_star": 12, "g_pada": 3}]
+        rows, errors, n = score_couples((0, couples), "id")
+        self.assertEqual(([r["id"] for r in rows], errors, n), ([1, 2, 3], [], 3))
+        rows, errors, n = score_couples((0, couples), "id", kuja_policy="compatible")
+        self.assertEqual([r["id"] for r in rows], [2, 3])
+        rows, _, _ = score_couples((0, couples), "id", kuja_policy="strict")
+        self.assertEqual([r["id"] for r in rows], [2])
+
+    # --- TEST 23: MEMORY-MAPPED CHART STORE ---
+    def test_chart_store(self):
+        """Store-backed range tasks reproduce the record-based bulk results; tasks pickle to a few bytes."""
+        couples = [{"id": f"c{i}", "b_star": i % 27, "b_pada": 1 + i % 4, "g_star": (i * 7) % 27, "g_pada": 1 + (i // 3) % 4,
+                    "b_manglik": ("yes", "no", None)[i % 3], "g_mars": (i * 37.5) % 360} for i in range(120)]
+        couples.append({"id": "bad", "b_star": "Nope", "b_pada": 1, "g_star": 0, "g_pada": 1})
+        profiles = [{"id": i, "gender": ("Boy", "Girl")[i % 2], "star": i % 27, "pada": 1 + i % 4} for i in range(10)]
+        with tempfile.TemporaryDirectory() as tmp:
+            with chart_store.StoreWriter(os.path.join(tmp, "c.vstore"), "match") as w:
+                for start in (0, 50, 100):
+                    rows, errors, _ = store_rows((start, couples[start:start + 50]), "match", "id"); w.write(rows)
+            self.assertEqual(errors, [("bad", "KeyError('nope')")])
+            store = chart_store.attach(os.path.join(tmp, "c.vstore"))
+            self.assertEqual((len(store), store.ids(48, 52)), (120, ["c48", "c49", "c50", "c51"]))
+            self.assertIsInstance(store["b_nak"], chart_store.np.memmap)
+            self.assertEqual(store["b_planets"].shape, (120, len(chart_store.PLANETS)))
+            for policy in ("any", "compatible", "strict"):
+                expected, _, _ = score_couples((0, couples[:120]), "id", kuja_policy=policy)
+                got = [r for task in store.ranges(32) for r in score_store(task, os.path.join(tmp, "c.vstore"), "id", policy)[0]]
+                self.assertEqual(got, expected)
+            self.assertLess(len(pickle.dumps((0, 32))), 20)
+
+            with chart_store.StoreWriter(os.path.join(tmp, "p.vstore"), "finder") as w:
+                w.write(store_rows((0, profiles), "finder", "id")[0])
+            rows, _, n = scan_store((0, 10), os.path.join(tmp, "p.vstore"), "id", False, "Raw Score (Highest First)")
+            expected, _, _ = scan_profiles((0, profiles), "id", False, "Raw Score (Highest First)")
+            self.assertEqual(n, 10)
+            self.assertEqual([{**r, "id": str(r["id"])} for r in expected], rows)
+
+    # --- TEST 24: CONCURRENT SESSION LOAD HARNESS ---
+    def test_load_harness(self):
+        """Two AppTest sessions run the direct + PDF flows side by side and the level report adds up."""
+        if loadtest.streamlit_version() < loadtest.MIN_STREAMLIT: self.skipTest("the load harness needs a newer streamlit")
+        self.addCleanup(loadtest.share_runtime())  # put Streamlit's patched globals back for the other tests
+        report = loadtest.run_level(2, ["direct", "pdf"], 1)
+        self.assertEqual((report["sessions"], report["errors"], report["flows"]), (2, 0, 4), report["error_samples"])
+        self.assertEqual(set(report["per_step"]), {"page_load", "switch_mode", "select_stars", "match_direct", "pdf"})
+        self.assertEqual(report["steps"], sum(s["count"] for s in report["per_step"].values()))
+        self.assertLessEqual(report["latency"]["p50_ms"], report["latency"]["p99_ms"])
+        self.assertGreater(report["rss_mb"], 0)
+
+    # --- TEST 25: THREAD-SAFE CORE ---
+    def test_concurrent_core_matches_serial(self):
+        """Charts and matches computed on the thread pool equal the serial results; shared tables are read-only."""
+        import app
+        places = {"Hyderabad": (17.385, 78.4867), "Chennai": (13.0827, 80.2707), "Delhi": (28.6139, 77.209), "Pune": (18.5204, 73.8567)}
+        births = [(datetime.date(1960 + i % 45, 1 + i % 12, 1 + i % 28), datetime.time(i % 24, (7 * i) % 60), city, "India")
+                  for i in range(200) for city in [list(places)[i % 4]]]
+        with patch("app.get_cached_coords", side_effect=lambda city, country: types.SimpleNamespace(latitude=places[city][0], longitude=places[city][1])):
+            serial = [app.get_planetary_positions(*b, detailed=True, use_cache=False) for b in births]
+            self.assertEqual(parallel.map_charts(births, detailed=True, use_cache=False), serial)
+            # raw threads hammering the unlocked entry point too
+            keys = [ephem_cache.normalize(datetime.datetime.combine(d, t), *places[c]) for d, t, c, _ in births]
+            with ThreadPoolExecutor(16) as pool:
+                hammered = list(pool.map(lambda k: app.compute_chart(k, True), keys * 3))
+            self.assertEqual(hammered, [app.compute_chart(k, True) for k in keys] * 3)
+
+        couples = [(b, bi % 12, g, (g * 3) % 12) for b in range(27) for bi in [b * 5] for g in range(27)]
+        self.assertEqual(parallel.map_matches(couples), [calculate_all(*c) for c in couples])
+        self.assertEqual(parallel.submit(calculate_all, 0, 0, 11, 4).result(), calculate_all(0, 0, 11, 4))
+
+        for table in (app.NAKSHATRAS, app.MAITRI_TABLE, app.RAJJU_MAPPING, app.NAK_TO_RASHI_MAP, app.SPECIAL_ASPECTS):
+            with self.assertRaises(TypeError): table[0] = None
+
+    # --- TEST 26: COMPILED RULE PROFILES ---
+    def test_rule_profiles(self):
+        """The north profile keeps the Gana exception; south scores Das Porutham; JSON profiles compile alike; bad ones fail at load."""
+        import app
+        self.assertEqual(app.RULE_PROFILE.name, "north")
+        _, bd, _, _, _, _, _, _, _ = calculate_all(24, 10, 17, 7)   # Purva Bhadrapada (Aquarius) boy, Jyeshtha girl
+        self.assertEqual(bd[5][:2], ("Gana", 6))
+        self.assertEqual(calculate_all(24, 11, 17, 7)[1][5][:2], ("Gana", 0))
+
+        score, bd, logs, rajju, vedha, safety, *_ = calculate_all(0, 0, 11, 4, 0, 3, profile="south")
+        self.assertEqual([row[0] for row in bd], ["Dina", "Gana", "Mahendra", "Stree Deergha", "Yoni", "Rasi", "Rasi Adhipathi", "Vasya", "Rajju", "Vedha"])
+        self.assertEqual(sum(row[3] for row in bd), 36)
+        self.assertEqual(score, sum(row[2] for row in bd))
+        self.assertEqual(calculate_all(0, 0, 17, 7, profile="south")[4:6], ("Fail", "Risky Match (Vedha Dosha) ❌"))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "north.json")
+            with open(path, "w", encoding="utf-8") as fh: json.dump(rules.NORTH, fh)
+            couples = [(b, b % 12, g, (g * 5) % 12, b % 12, g % 12) for b in range(27) for g in range(27)]
+            self.assertEqual([calculate_all(*c, profile=path) for c in couples], [calculate_all(*c) for c in couples])
+
+        broken = json.loads(json.dumps(rules.NORTH)); broken["kootas"][0]["max"] = 2
+        with self.assertRaises(ValueError): rules.compile_profile(broken, app.RULE_ATTRIBUTES)
+        broken = json.loads(json.dumps(rules.NORTH)); broken["kootas"][3]["remedies"][0]["when"] = "Yoni.final==4"
+        with self.assertRaises(ValueError): rules.compile_profile(broken, app.RULE_ATTRIBUTES)
+        with self.assertRaises(ValueError): rules.load_profile("east")
+
+    # --- TEST 27: COMPATIBILITY HEATMAP MATRIX ---
+    def test_compat_matrix(self):
+        """The vectorized 108 x 108 matrix agrees with calculate_all cell by cell; the 27 x 27 view aggregates it."""
+        import app
+        labels, m = app.get_compat_matrix()[app.HEATMAP_LEVELS[1]]
+        self.assertEqual((len(labels), m["Remedied"].shape), (108, (108, 108)))
+        for b_slot, g_slot in [(0, 0), (11, 47), (70, 97), (99, 68), (107, 3)] + [(s, (s * 37) % 108) for s in range(108)]:
+            (b_nak, b_p), (g_nak, g_p) = divmod(b_slot, 4), divmod(g_slot, 4)
+            b_rashi, g_rashi = app.get_rashi_from_pada(b_nak, b_p + 1), app.get_rashi_from_pada(g_nak, g_p + 1)
+            score, bd, _, rajju, vedha, safety, *_ = calculate_all(b_nak, b_rashi, g_nak, g_rashi, app.get_d9_rashi_from_pada(b_nak, b_p + 1), app.get_d9_rashi_from_pada(g_nak, g_p + 1))
+            self.assertEqual((m["Remedied"][b_slot, g_slot], m["Raw"][b_slot, g_slot]), (score, sum(r[1] for r in bd)))
+            self.assertEqual((m["Rajju"][b_slot, g_slot], m["Vedha"][b_slot, g_slot]), (rajju == "Fail", vedha == "Fail"))
+            if safety == "Risky Match (Double Dosha) ❌": self.assertTrue(m["Double Dosha"][b_slot, g_slot])
+
+        stars, s = app.get_compat_matrix()[app.HEATMAP_LEVELS[0]]
+        self.assertEqual(s["Raw"].shape, (27, 27))
+        self.assertAlmostEqual(s["Remedied"][11, 17], round(m["Remedied"][44:48, 68:72].mean(), 1))
+        self.assertEqual(s["Vedha"][0, 17], True)
+        fig = app.build_heatmap_figure(app.HEATMAP_LEVELS[0], "Raw", ("Rajju", "Vedha"))
+        self.assertEqual([tr.type for tr in fig.data], ["heatmap", "scatter", "scatter"])
+        self.assertEqual(len(fig.data[2].x), int(s["Vedha"].sum()))
+
+    # --- TEST 28: ON-DEMAND PROFILER ---
+    def test_profiler_capture(self):
+        """Both modes record the block and the pool work it submits, resumed stretches included; output loads in pstats / speedscope."""
+        import marshal, pstats, tempfile, os
+        with profiler.capture("unit", "cprofile") as cap:
+            calculate_all(3, 1, 11, 5)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, cap.filename)
+            with open(path, "wb") as fh: fh.write(cap.data)
+            funcs = {key[2] for key in pstats.Stats(path).stats}
+        self.assertIn("calculate_all", funcs)
+        self.assertIn("calculate_all", cap.summary)
+        self.assertIs(profiler.recent()[0], cap)
+        self.assertIsNone(profiler.active())
+
+        def busy(n): return sum(_calc(i % 27, i % 12, (i * 7) % 27, (i * 5) % 12)[0] for i in range(n))
+        def pooled(n): return busy(n)
+        # one cProfile per process (3.12+): a capture that cannot get it samples instead of failing, and pool
+        # work that cannot hold it is sampled and folded into the .pstats
+        with profiler.capture("unit", "cprofile", interval=0.001) as cap:
+            with profiler.capture("second", "cprofile", interval=0.001) as second: busy(3000)
+            parallel.submit(pooled, 3000).result()
+        self.assertEqual((second.requested, second.mode), ("cprofile", "sample"))
+        self.assertIn("busy", {f["name"] for f in json.loads(second.data)["shared"]["frames"]})
+        self.assertEqual(cap.mode, "cprofile")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, cap.filename)
+            with open(path, "wb") as fh: fh.write(cap.data)
+            self.assertIn("pooled", {key[2] for key in pstats.Stats(path).stats})
+        with profiler.capture("unit", "sample", interval=0.001, finish=False) as cap:
+            busy(3000)
+        with cap.resume(): parallel.submit(busy, 3000).result()
+        self.assertFalse(cap.finished)
+        cap.finish()
+        doc = json.loads(cap.data)
+        self.assertEqual(doc["$schema"], "https://www.speedscope.app/file-format-schema.json")
+        self.assertGreaterEqual(len(doc["profiles"]), 2)  # the script thread and the pool thread
+        names = {f["name"] for f in doc["shared"]["frames"]}
+        self.assertIn("busy", names)
+        for p in doc["profiles"]:
+            self.assertEqual(len(p["samples"]), len(p["weights"]))
+            self.assertTrue(all(0 <= i < len(doc["shared"]["frames"]) for stack in p["samples"] for i in stack))
+        with self.assertRaises(RuntimeError):
+            with cap.resume(): pass
+        with self.assertRaises(ValueError): profiler.Capture("unit", "perf")
+
+    # --- TEST 29: OFFLINE CITY GAZETTEER ---
+    def test_gazetteer(self):
+        """Names, old names and country variants resolve locally with a timezone; typos and unknown places go online."""
+        import app
+        self.assertEqual(gazetteer.resolve("Hyderabad", "India")[4:7], (17.385, 78.4867, "Asia/Kolkata"))
+        self.assertEqual(gazetteer.resolve("Hyderabad", "Pakistan").tz, "Asia/Karachi")
+        for typed, country, name in [("Bombay", "india", "Mumbai"), ("bangalore", "", "Bengaluru"), ("Calcutta", "Inida", "Kolkata"),
+                                     ("new york city", "USA", "New York"), ("São Paulo", "Brazil", "Sao Paulo")]:
+            self.assertEqual(gazetteer.resolve(typed, country).name, name, typed)
+        for typed, country, name in [("Hyderbad", "India", "Hyderabad"), ("Calcuta", "India", "Kolkata")]:
+            self.assertIsNone(gazetteer.resolve(typed, country), typed)
+            self.assertEqual(gazetteer.closest(typed, country).name, name, typed)
+        # real towns missing from cities.csv must not borrow a similar-looking city's coordinates
+        for town, country in [("Naperville", "USA"), ("Columbia", "USA"), ("Guntakal", "India"), ("Nagari", "India"), ("Xyzzyville", "India")]:
+            self.assertIsNone(gazetteer.resolve(town, country), town)
+        self.assertEqual([p.name for p in gazetteer.suggest("ban", "India")][:2], ["Bengaluru", "Varanasi"])
+        self.assertTrue(all(p.tz for p in gazetteer.get_index().places))
+
+        with patch("app.geocode_online") as online:
+            dt = datetime.datetime(1995, 1, 1, 10, 0)
+            self.assertEqual(app.get_offset_smart("Madras", "India", dt, 0.0), (5.5, "📍 Madras"))
+            self.assertEqual(app.get_offset_smart("Toronto", "Canada", dt, 0.0)[0], -5.0)
+            online.assert_not_called()
+            online.return_value = types.SimpleNamespace(latitude=51.5, longitude=-0.12)  # no tz: timezonefinder fills it in
+            self.assertEqual(app.get_offset_smart("Xyzzyville", "UK", dt, 0.0), (0.0, "📍 Xyzzyville"))
+            online.assert_called_once_with("Xyzzyville", "UK")
+            online.return_value = types.SimpleNamespace(latitude=41.7508, longitude=-88.1535)
+            self.assertEqual(app.get_offset_smart("Naperville", "USA", dt, 0.0), (-6.0, "📍 Naperville"))
+            self.assertEqual(app.get_cached_coords("Naperville", "USA"), online.return_value)
+
+    # --- TEST 30: SCORE DISTRIBUTION & PERCENTILE RANKS ---
+    def test_score_distribution(self):
+        """The precomputed tables agree with brute force over the 108 x 108 grid, weighted or not, and reach the result views."""
+        import app
+        import numpy as np
+        dist, g = app.get_score_distribution(), app.pada_grid()
+        score, raw = np.asarray(g["score"]), np.asarray(g["raw"])
+        self.assertAlmostEqual(sum(r["Remedied Share %"] for r in dist.table()), 100, places=2)
+        for s in (0, 14, 24.5, 28, 36):
+            self.assertAlmostEqual(dist.percentile(s), round(((score < s).mean() + (score == s).mean() / 2) * 100, 1))
+            self.assertAlmostEqual(dist.percentile(s, "raw"), round(((raw < s).mean() + (raw == s).mean() / 2) * 100, 1))
+        for b_slot, g_slot in [(0, 0), (11, 47), (70, 97), (107, 3)]:
+            s = score[b_slot, g_slot]
+            self.assertEqual(dist.better_slots("Boy", b_slot, s), int((score[b_slot] > s).sum()))
+            self.assertEqual(dist.better_slots("Girl", g_slot, s), int((score[:, g_slot] > s).sum()))
+        self.assertEqual([score_dist.slot_of(n, app.get_d9_rashi_from_pada(n, p)) for n, p in [(0, 1), (11, 3), (26, 4)]], [0, 46, 107])
+        self.assertIsNone(score_dist.slot_of(3, None))
+
+        boys, girls = np.zeros(108), np.zeros(108); boys[11] = 5; girls[47] = 2   # every profile is one pada pair
+        weighted = score_dist.Distribution(raw, score, 36, boys, girls)
+        self.assertEqual(weighted.percentile(score[11, 47]), 50.0)
+        class Store(dict): kind = "finder"
+        counts = score_dist.slot_counts(Store(gender=[0, 0, 1], nak=[2, 2, 5], pada=[1, 1, 4]))
+        self.assertEqual((counts[0][8], counts[1][23], counts[0].sum() + counts[1].sum()), (2, 1, 3))
+
+        rows = app.lookup_best_matches("Girl", 11, 5, 3)
+        self.assertEqual(rows, find_best_matches("Girl", 11, 5, 3))
+        for row in rows:
+            self.assertEqual(row["Percentile"], dist.percentile(row["Final Remedied Score"]))
+            self.assertEqual(row["Slots Scoring Higher"], int((score[:, 46] > row["Final Remedied Score"]).sum()))
+        res = app._build_match_results(("direct", False, (3, 1, 2), (11, 5, 3)), datetime.date(2026, 1, 1))
+        self.assertEqual(res["rank"], dist.rank(res["score"], res["raw_score"], 13, 46))
+
+    # --- TEST 31: ONE RISKY RULE ACROSS FINDER, CLI AND SERVER ---
+    def test_risky_rule_shared(self):
+        """Find Matches, cli.py match and /match flag the same couples: Vedha verdicts only, as the finder always has."""
+        import app, server
+        from cli import couple_row
+        def person(slot):
+            nak, p = divmod(slot, 4)
+            return (nak, app.get_rashi_from_pada(nak, p + 1), p + 1, app.get_d9_rashi_from_pada(nak, p + 1))
+        verdicts = set()
+        for b_slot in range(0, 108, 5):
+            boy = person(b_slot)
+            for g_slot, _, _, risky in app.scan_match_slots("Boy", boy[0], boy[1], boy[2]):
+                girl = person(g_slot)
+                safety = calculate_all(boy[0], boy[1], girl[0], girl[1], boy[3], girl[3])[5]
+                verdicts.add(safety)
+                self.assertEqual(risky, app.is_risky(safety))
+                self.assertEqual(couple_row("id", 0, boy, girl)["IsRisky"], risky)
+                self.assertEqual(server.score_key(boy + girl)["is_risky"], risky)
+                self.assertEqual(risky, safety == "Risky Match (Vedha Dosha) ❌")
+        self.assertGreater(len(verdicts - {None, ""}), 1)  # Rajju / Double Dosha pairings reach the finder, listed
+
 if __name__ == '__main__':
     unittest.main()
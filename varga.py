@@ -0,0 +1,75 @@
+"""Table-driven divisional charts (vargas): D1, D2, D3, D7, D9, D10, D12, D30, D60.
+
+Every varga is a 12 x parts lookup table: the sign of a longitude is TABLES[n][sign][part], where
+part = which of the sign's `parts` equal slices the longitude falls in. D30's unequal Parashari spans
+all end on whole degrees, so it is stored as a 30-part (1 degree) table.
+
+    varga.varga_sign(123.4, 9)                      # scalar, pure Python
+    varga.varga_signs(sid_longitudes)               # int8 array, shape (len(VARGAS),) + lons.shape
+    varga.varga_signs(lons, (1, 9))[1]              # just the D9 row
+
+Longitudes go through arcsec's integer milli-arcseconds, so part boundaries are exact integer
+divisions shared with the nakshatra / pada math. numpy is only imported by the array functions.
+"""
+import functools
+
+import arcsec
+
+VARGAS = (1, 2, 3, 7, 9, 10, 12, 30, 60)
+
+def _equal_parts(n, start):
+    return tuple(tuple((start(s) + k) % 12 for k in range(n)) for s in range(12))
+
+def _hora(s):
+    # Odd signs (Aries, Gemini, ...): Sun's hora (Leo) then Moon's (Cancer); even signs the reverse
+    return (4, 3) if s % 2 == 0 else (3, 4)
+
+# Parashari trimsamsa: (end degree, sign) for odd and even signs
+_TRIMSAMSA_ODD = ((5, 0), (10, 10), (18, 8), (25, 2), (30, 6))    # Mars, Saturn, Jupiter, Mercury, Venus
+_TRIMSAMSA_EVEN = ((5, 1), (12, 5), (20, 11), (25, 9), (30, 7))   # Venus, Mercury, Jupiter, Saturn, Mars
+
+def _trimsamsa(s):
+    spans = _TRIMSAMSA_ODD if s % 2 == 0 else _TRIMSAMSA_EVEN
+    return tuple(next(sign for end, sign in spans if deg < end) for deg in range(30))
+
+TABLES = {
+    1: tuple((s,) for s in range(12)),
+    2: tuple(_hora(s) for s in range(12)),
+    3: tuple(tuple((s + 4 * k) % 12 for k in range(3)) for s in range(12)),   # 1st, 5th, 9th from the sign
+    7: _equal_parts(7, lambda s: s if s % 2 == 0 else s + 6),                  # odd: from itself, even: from the 7th
+    9: _equal_parts(9, lambda s: s * 9),                                       # fire/earth/air/water start Ar/Cp/Li/Cn
+    10: _equal_parts(10, lambda s: s if s % 2 == 0 else s + 8),                # odd: from itself, even: from the 9th
+    12: _equal_parts(12, lambda s: s),
+    30: tuple(_trimsamsa(s) for s in range(12)),
+    60: _equal_parts(60, lambda s: s),
+}
+
+# --- 1. SCALAR ---
+def varga_sign(longitude, n):
+    sign, in_sign = divmod(arcsec.to_mas(longitude), arcsec.RASHI_SPAN)
+    table = TABLES[n]
+    return table[sign][in_sign * len(table[0]) // arcsec.RASHI_SPAN]
+
+# --- 2. VECTORIZED ---
+@functools.lru_cache(maxsize=None)
+def _np_table(n):
+    import numpy as np
+    return np.array(TABLES[n], dtype=np.int8)
+
+def varga_signs(lons, vargas=VARGAS):
+    """Signs of every longitude in each requested varga, in one pass per varga.
+    Returns int8 with shape (len(vargas),) + shape of `lons`; row i is vargas[i]."""
+    import numpy as np
+    mas = arcsec.to_mas_array(lons)
+    sign, in_sign = np.divmod(mas, arcsec.RASHI_SPAN)
+    out = np.empty((len(vargas),) + mas.shape, dtype=np.int8)
+    for i, n in enumerate(vargas):
+        table = _np_table(n)
+        out[i] = table[sign, in_sign * table.shape[1] // arcsec.RASHI_SPAN]
+    return out
+
+def chart_from_signs(signs, names):
+    """{sign: [names...]} in body order, the shape render_south_indian_chart takes."""
+    chart = {}
+    for sign, name in zip(signs, names): chart.setdefault(int(sign), []).append(name)
+    return chart